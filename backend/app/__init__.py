@@ -2,12 +2,13 @@ from flask import Flask
 import os
 
 from .utils.error_handlers import register_jwt_error_handlers, register_error_handlers
-from .extensions import db, bcrypt, ma, jwt, cors, migrate
+from .extensions import db, bcrypt, ma, jwt, cors, migrate, plate_cache, history_writer, password_hasher
 from .routes.auth import auth_bp
 from .routes.users import users_bp
 from .routes.history import history_bp
 from .routes.plates import plates_bp
 from .utils.middleware import middleware
+from .utils.verify_service import VerifyService
 
 from .models.role import Role
 from .models.user import User
@@ -46,9 +47,39 @@ def create_admin():
             db.session.add(new_admin)
             db.session.commit()
 
+def configure_engine(app):
+    """
+    Sets the connection pool of the database engine. Every gunicorn worker process has its own pool,
+    shared by its request threads and the background threads (history writer, plate cache), so
+    DB_POOL_SIZE should be at least GUNICORN_THREADS + 2.
+
+    Config:
+        DB_POOL_SIZE (int): Connections kept open per process. Default 10.
+        DB_MAX_OVERFLOW (int): Extra connections opened under load and closed afterwards. Default 5.
+        DB_POOL_TIMEOUT (int): Seconds a request waits for a free connection. Default 10.
+        DB_POOL_RECYCLE (int): Seconds after which a connection is replaced. Default 1800.
+        DB_POOL_PRE_PING (bool): Test connections before using them, so connections closed by a
+                                 database restart are replaced instead of failing. Default True.
+
+    Options set in SQLALCHEMY_ENGINE_OPTIONS take precedence.
+    """
+    options = {"pool_pre_ping": app.config.get("DB_POOL_PRE_PING", True)}
+
+    # SQLite (development) does not use a queue pool in memory
+    if not app.config.get("SQLALCHEMY_DATABASE_URI", "").startswith("sqlite"):
+        options.update({
+            "pool_size": app.config.get("DB_POOL_SIZE", 10),
+            "max_overflow": app.config.get("DB_MAX_OVERFLOW", 5),
+            "pool_timeout": app.config.get("DB_POOL_TIMEOUT", 10),
+            "pool_recycle": app.config.get("DB_POOL_RECYCLE", 1800),
+        })
+
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {**options, **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})}
+
 def create_app():
     app = Flask(__name__)
     app.config.from_prefixed_env()
+    configure_engine(app)
 
     # Initialize extensions
     db.init_app(app)
@@ -57,6 +88,9 @@ def create_app():
     ma.init_app(app)
     jwt.init_app(app)
     cors.init_app(app)
+    plate_cache.init_app(app)
+    history_writer.init_app(app)
+    password_hasher.init_app(app)
 
     # Register JWT error handlers
     register_jwt_error_handlers(jwt)
@@ -71,4 +105,7 @@ def create_app():
     app.register_blueprint(plates_bp)
     app.register_blueprint(middleware)
 
+    # POST /verify_plate/fast is answered before Flask handles the request
+    app.wsgi_app = VerifyService(app, app.wsgi_app)
+
     return app
@@ -4,6 +4,9 @@ from flask_cors import CORS
 from flask_migrate import Migrate
 from flask_bcrypt import Bcrypt
 from flask_marshmallow import Marshmallow
+from .utils.plate_cache import PlateCache
+from .utils.history_writer import HistoryWriter
+from .utils.password_hashing import PasswordHasher
 
 db = SQLAlchemy()
 cors = CORS()
@@ -11,3 +14,6 @@ bcrypt = Bcrypt()
 ma = Marshmallow()
 migrate = Migrate()
 jwt = JWTManager()
+plate_cache = PlateCache()
+history_writer = HistoryWriter()
+password_hasher = PasswordHasher()
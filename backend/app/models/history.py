@@ -1,14 +1,19 @@
 from ..extensions import db
-from datetime import datetime
+from datetime import datetime, timezone
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from typing import Optional
 
 class History(db.Model):
     __tablename__ = "history"
+    __table_args__ = (
+        db.Index("ix_history_date_id", "date", "id"),
+        db.Index("ix_history_user_id_date", "user_id", "date"),
+        db.Index("ix_history_plate_date", "plate", "date"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     plate: Mapped[str] = mapped_column(db.String(20), nullable=False)
-    date: Mapped[str] = mapped_column(db.String(25), nullable=False, default=lambda: datetime.utcnow().isoformat() + "Z")
+    date: Mapped[datetime] = mapped_column(db.DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
     user_id: Mapped[Optional[int]] = mapped_column(db.ForeignKey('user.id'), nullable=True)
     allowed: Mapped[bool] = mapped_column(nullable=False)
 
@@ -5,6 +5,6 @@ class Plate(db.Model):
     __tablename__ = "plate"
 
     plate: Mapped[str] = mapped_column(db.String(20), primary_key=True)
-    user_id: Mapped[int] = mapped_column(db.ForeignKey('user.id'), nullable=False)
+    user_id: Mapped[int] = mapped_column(db.ForeignKey('user.id'), nullable=False, index=True)
     user: Mapped["User"] = relationship("User", back_populates="plates")
 
@@ -1,4 +1,4 @@
-from ..extensions import db, bcrypt
+from ..extensions import db, password_hasher
 from typing import List
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from .role import Role
@@ -23,11 +23,15 @@ class User(db.Model):
         self.email = email.strip()
         self.first_name = ' '.join(first_name.strip().split())
         self.last_name = ' '.join(last_name.strip().split())
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = password_hasher.hash(password)
         self.role_id = role_id
 
+    # bcrypt runs in the bounded pool of password_hasher, see PasswordHasher
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return password_hasher.check(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return password_hasher.needs_rehash(self.password_hash)
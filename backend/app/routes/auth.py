@@ -1,24 +1,32 @@
 from flask import Blueprint, request, jsonify
 import os
-from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required, set_access_cookies, unset_jwt_cookies
+from flask_jwt_extended import get_jwt_identity, jwt_required, set_access_cookies, unset_jwt_cookies
 from ..models.user import User
-from ..models.role import Role
 from ..schemas.user import user_schema
 from ..schemas.change_password import change_password_schema
-from ..extensions import db
+from ..extensions import db, password_hasher
+from ..utils.auth_utils import get_role_id, get_current_role, create_user_access_token, role_required
 
 auth_bp = Blueprint('auth', __name__)
 
+def rehash_password(user, password):
+    # Hashes made with another cost factor (BCRYPT_LOG_ROUNDS changed) are upgraded on login
+    if user.password_needs_rehash():
+        user.set_password(password)
+        db.session.commit()
+        password_hasher.record_rehash()
+
 @auth_bp.route('/login', methods=['POST'])
 def user_login():
     data = request.get_json()
     user = db.session.query(User).filter_by(email=data['email']).first()
-    user_role_id = db.session.query(Role).filter_by(name=os.getenv("FLASK_USER_ROLE")).first().id
+    user_role_id = get_role_id(os.getenv("FLASK_USER_ROLE"))
 
     if user and user.check_password(data['password']):
         if user.role_id != user_role_id:
             return jsonify({"error": "Access denied"}), 403
-        access_token = create_access_token(identity=str(user.id))
+        rehash_password(user, data['password'])
+        access_token = create_user_access_token(user.id, os.getenv("FLASK_USER_ROLE"))
         response = jsonify(user_schema.dump(user))
         set_access_cookies(response, access_token)
         return response
@@ -30,12 +38,13 @@ def user_login():
 def admin_login():
     data = request.get_json()
     user = db.session.query(User).filter_by(email=data['email']).first()
-    admin_role_id = db.session.query(Role).filter_by(name=os.getenv("FLASK_ADMIN_ROLE")).first().id
+    admin_role_id = get_role_id(os.getenv("FLASK_ADMIN_ROLE"))
 
     if user and user.check_password(data['password']):
         if user.role_id != admin_role_id:
             return jsonify({"error": "Access denied"}), 403
-        access_token = create_access_token(identity=str(user.id))
+        rehash_password(user, data['password'])
+        access_token = create_user_access_token(user.id, os.getenv("FLASK_ADMIN_ROLE"))
         response = jsonify(user_schema.dump(user))
         set_access_cookies(response, access_token)
         return response
@@ -85,17 +94,13 @@ def change_password():
 @auth_bp.route("/check-user-session", methods=["GET"])
 @jwt_required()
 def check_user_session():
-    current_user_id = get_jwt_identity()
-    user = db.session.get(User, current_user_id)
+    # The role comes from the token claims, no query is needed (unless strict role checks are enabled)
+    role_name = get_current_role()
     
-    if not user:
+    if not role_name:
         return jsonify({"error": "User not found"}), 404
 
-    user_role = db.session.query(Role).filter_by(name=os.getenv("FLASK_USER_ROLE")).first()
-    if not user_role:
-        return jsonify({"error": "User role not configured"}), 500
-
-    if user.role_id != user_role.id:
+    if role_name != os.getenv("FLASK_USER_ROLE"):
         return jsonify({"error": "Access denied"}), 403
 
     return jsonify({"msg": "Valid user session"}), 200
@@ -104,18 +109,20 @@ def check_user_session():
 @auth_bp.route("/check-admin-session", methods=["GET"])
 @jwt_required()
 def check_admin_session():
-    current_user_id = get_jwt_identity()
-    user = db.session.get(User, current_user_id)
+    # The role comes from the token claims, no query is needed (unless strict role checks are enabled)
+    role_name = get_current_role()
     
-    if not user:
+    if not role_name:
         return jsonify({"error": "User not found"}), 404
 
-    admin_role = db.session.query(Role).filter_by(name=os.getenv("FLASK_ADMIN_ROLE")).first()
-    if not admin_role:
-        return jsonify({"error": "Admin role not configured"}), 500
-
-    if user.role_id != admin_role.id:
+    if role_name != os.getenv("FLASK_ADMIN_ROLE"):
         return jsonify({"error": "Access denied"}), 403
 
     return jsonify({"msg": "Valid admin session"}), 200
 
+
+@auth_bp.route("/password-hasher-stats", methods=["GET"])
+@jwt_required()
+@role_required(os.getenv("FLASK_ADMIN_ROLE"))
+def get_password_hasher_stats():
+    return jsonify(password_hasher.get_stats()), 200
@@ -1,47 +1,173 @@
-from ..extensions import db
-from ..models.plate import Plate
+from ..extensions import db, plate_cache, history_writer
 from ..models.history import History
-from ..schemas.history import histories_schema
-from flask import Blueprint, request, jsonify
-from ..utils.auth_utils import check_api_key, role_required
-from ..schemas.history import verify_plate_request_schema, verify_plate_response_schema
+from ..schemas.history import history_schema, histories_schema, history_query_schema
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from marshmallow import ValidationError
+from ..utils.auth_utils import api_key_required, role_required, get_current_role
+from ..schemas.history import verify_plate_request_schema, verify_plate_response_schema, upload_history_schema, history_event_schema
+from ..schemas.history import verify_plates_request_schema
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..models.user import User
 
+import base64
+import csv
+from datetime import datetime
+import io
+import json
 import os
 
 history_bp = Blueprint('history', __name__)
 
+HISTORY_COLUMNS = ("id", "plate", "date", "user_id", "allowed")
+# Rows fetched from the database at a time when streaming an export
+EXPORT_CHUNK_SIZE = 1000
+
+
+def encode_cursor(row):
+    return base64.urlsafe_b64encode(json.dumps([row.date.isoformat(), row.id]).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        date, history_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(date), int(history_id)
+    except (ValueError, TypeError):
+        return None
+
+def build_history_query(params, user_id=None):
+    """
+    Builds the query of the history records that match the filters, sorted by date and id.
+
+    Args:
+        params (dict): Parameters loaded with `history_query_schema`.
+        user_id (int, optional): Only the records of this user, overrides the user_id filter.
+
+    Returns:
+        Select: The query, without limit or cursor.
+    """
+    stmt = db.select(*(getattr(History, column) for column in HISTORY_COLUMNS))
+
+    user_id = user_id if user_id is not None else params.get('user_id')
+    if user_id is not None:
+        stmt = stmt.where(History.user_id == user_id)
+    if 'plate' in params:
+        stmt = stmt.where(History.plate == params['plate'])
+    if 'allowed' in params:
+        stmt = stmt.where(History.allowed == params['allowed'])
+    if 'date_from' in params:
+        stmt = stmt.where(History.date >= params['date_from'])
+    if 'date_to' in params:
+        stmt = stmt.where(History.date < params['date_to'])
+
+    if params['order'] == 'asc':
+        return stmt.order_by(History.date.asc(), History.id.asc())
+    return stmt.order_by(History.date.desc(), History.id.desc())
+
+def history_response(params, user_id=None):
+    """
+    Returns a page of the history records that match the filters, or every record streamed as
+    NDJSON or CSV if an export format is requested.
+
+    Pages use keyset pagination: `next_cursor` is the position after the last record of the page,
+    and it is passed as `cursor` to get the next one. It is None in the last page.
+    """
+    stmt = build_history_query(params, user_id)
+
+    if 'cursor' in params:
+        cursor = decode_cursor(params['cursor'])
+        if cursor is None:
+            return jsonify({"error": {"cursor": ["Cursor inválido"]}}), 400
+        position = db.tuple_(History.date, History.id)
+        stmt = stmt.where(position > cursor if params['order'] == 'asc' else position < cursor)
+
+    if params['format'] != 'json':
+        return stream_history(stmt, params['format'])
+
+    rows = db.session.execute(stmt.limit(params['limit'] + 1)).all()
+    has_more = len(rows) > params['limit']
+    rows = rows[:params['limit']]
+
+    return jsonify({
+        "items": histories_schema.dump(rows),
+        "next_cursor": encode_cursor(rows[-1]) if has_more else None
+    }), 200
+
+def legacy_history_response(user_id=None):
+    """
+    Returns the most recent history records as a plain list, for the requests without parameters
+    (the admin frontend). They are capped at HISTORY_LEGACY_LIMIT records (default 1000), newest
+    first: older records are only available with the paginated parameters or an export.
+    """
+    limit = current_app.config.get("HISTORY_LEGACY_LIMIT", 1000)
+    stmt = build_history_query({'order': 'desc'}, user_id).limit(limit)
+    return jsonify(histories_schema.dump(db.session.execute(stmt).all())), 200
+
+def stream_history(stmt, export_format):
+    """
+    Streams the records of the query without loading them all in memory: they are fetched from a
+    server-side cursor in chunks and written as they are read.
+    """
+    def generate_ndjson(result):
+        for row in result:
+            yield json.dumps(history_schema.dump(row)) + "\n"
+
+    def generate_csv(result):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(HISTORY_COLUMNS)
+        for rows in result.partitions():
+            for row in rows:
+                record = history_schema.dump(row)
+                writer.writerow([record[column] for column in HISTORY_COLUMNS])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    result = db.session.execute(stmt.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+
+    if export_format == 'csv':
+        return Response(
+            stream_with_context(generate_csv(result)),
+            mimetype='text/csv',
+            headers={"Content-Disposition": "attachment; filename=history.csv"}
+        )
+    return Response(stream_with_context(generate_ndjson(result)), mimetype='application/x-ndjson')
+
+
 @history_bp.route('/history', methods=['GET'])
 @jwt_required()
 @role_required(os.getenv("FLASK_ADMIN_ROLE"))
 def get_history():
-    history_records = db.session.execute(db.select(History)).scalars().all()
-    return jsonify(histories_schema.dump(history_records)), 200
+    # Without parameters, the most recent records are returned as a plain list (used by the admin frontend)
+    if not request.args:
+        return legacy_history_response()
+
+    params = history_query_schema.load(request.args)
+    return history_response(params)
+
+@history_bp.route('/history/writer_stats', methods=['GET'])
+@jwt_required()
+@role_required(os.getenv("FLASK_ADMIN_ROLE"))
+def get_history_writer_stats():
+    return jsonify(history_writer.get_stats()), 200
 
 @history_bp.route('/verify_plate', methods=['POST'])
+@api_key_required
 def verify_plate():
-    if not check_api_key(request):
-        return jsonify({"error": "Unauthorized. Invalid API_KEY."}), 403
-    
-    # Validate request data
-    verify_plate_request_schema.validate(request.get_json())
-        
+    # Validate request data (load raises ValidationError, answered with a 400)
     data = verify_plate_request_schema.load(request.get_json())
     
-    # Check if plate is registered
-    plate_obj = db.session.execute(db.select(Plate).where(Plate.plate == data['plate'])).scalar_one_or_none()
-    is_registered = bool(plate_obj)
+    # Check if plate is registered, the owner is taken from the plate cache
+    owner = plate_cache.get(data['plate'])
+    is_registered = owner is not None
 
-    # Create history record
-    new_history = History(
+    # Queue history record, it is inserted in the background so the gate does not wait for the commit
+    history_writer.add(
         plate=data['plate'],
         date=data['date'],
         allowed=is_registered,
-        user_id=plate_obj.user_id if plate_obj else None
+        user_id=owner["id"] if owner else None
     )
-    db.session.add(new_history)
-    db.session.commit()
 
     # Prepare response
     response_data = {
@@ -49,29 +175,107 @@ def verify_plate():
         "plate": data['plate']
     }
     
-    if plate_obj:
-        response_data["user"] = plate_obj.user
+    if owner:
+        response_data["user"] = owner
 
     return jsonify(verify_plate_response_schema.dump(response_data)), 200
-            
+
+@history_bp.route('/verify_plates', methods=['POST'])
+@api_key_required
+def verify_plates():
+    """
+    Verifies several plates in one call, for the verifier when several gates send plates at the
+    same time: the owners not cached are looked up with a single query and the history rows are
+    queued together. The results are in the same order as the verifications, with only the plate
+    and the decision as in /verify_plate/fast. An invalid verification gets its validation errors
+    and does not affect the rest.
+
+    Request: {"verifications": [{"plate": "1234BCD", "date": "2024-01-01T10:00:00Z"}, ...]}
+    Response: {"results": [{"plate": "1234BCD", "allowed": true}, {"plate": "12", "error": {...}}, ...]}
+    """
+    verifications = verify_plates_request_schema.load(request.get_json())['verifications']
+
+    loaded = []
+    for verification in verifications:
+        try:
+            loaded.append(verify_plate_request_schema.load(verification))
+        except ValidationError as e:
+            loaded.append({"plate": verification.get("plate"), "error": e.messages})
+
+    owners = plate_cache.get_many(data['plate'] for data in loaded if "error" not in data)
+
+    results = []
+    rows = []
+    for data in loaded:
+        if "error" in data:
+            results.append(data)
+            continue
+        owner = owners[data['plate']]
+        rows.append({
+            "plate": data['plate'],
+            "date": data['date'],
+            "allowed": owner is not None,
+            "user_id": owner["id"] if owner else None
+        })
+        results.append({"plate": data['plate'], "allowed": owner is not None})
+
+    history_writer.add_many(rows)
+
+    return jsonify({"results": results}), 200
+
+@history_bp.route('/history/upload', methods=['POST'])
+@api_key_required
+def upload_history():
+    """
+    Verifications answered by a verifier without calling /verify_plate (from its decision cache, or
+    from the allowlist while the backend was down), uploaded in batches to complete the history.
+
+    Request: {"events": [{"plate": "1234BCD", "date": "2024-01-01T10:00:00Z", "allowed": true}, ...]}
+    Response: {"accepted": 2, "rejected": 0}
+
+    Invalid events are rejected and the rest are added, so the verifier doesn't retry them forever.
+    """
+    events = upload_history_schema.load(request.get_json())['events']
+
+    accepted = []
+    for event in events:
+        try:
+            accepted.append(history_event_schema.load(event))
+        except ValidationError as e:
+            current_app.logger.warning(f"History event rejected: {e.messages}")
+
+    owners = plate_cache.get_many(event['plate'] for event in accepted)
+    history_writer.add_many([
+        {
+            "plate": event['plate'],
+            "date": event['date'],
+            "allowed": event['allowed'],
+            "user_id": owners[event['plate']]["id"] if owners[event['plate']] else None
+        }
+        for event in accepted
+    ])
+
+    return jsonify({"accepted": len(accepted), "rejected": len(events) - len(accepted)}), 200
 
 @history_bp.route('/users/<int:user_id>/history', methods=['GET'])
 @jwt_required()
 def get_user_history(user_id):
         
     # Get current user from JWT
-    current_user_id = get_jwt_identity()
-    current_user = db.session.execute(db.select(User).where(User.id == current_user_id)).scalar_one_or_none()
+    current_user_id = int(get_jwt_identity())
     
     # Check if user exists
-    user = db.session.execute(db.select(User).where(User.id == user_id)).scalar_one_or_none()
+    user = db.session.execute(db.select(User.id).where(User.id == user_id)).scalar_one_or_none()
     if not user:
         return jsonify({"error": "User not found"}), 404
         
     # Only admins can see other users' history
-    if current_user.role.name != "admin" and current_user_id != user_id:
+    if get_current_role() != os.getenv("FLASK_ADMIN_ROLE") and current_user_id != user_id:
         return jsonify({"error": "Unauthorized"}), 403
         
     # Get history records for the user
-    history_records = db.session.execute(db.select(History).where(History.user_id == user_id)).scalars().all()
-    return jsonify(histories_schema.dump(history_records)), 200
+    if not request.args:
+        return legacy_history_response(user_id)
+
+    params = history_query_schema.load(request.args)
+    return history_response(params, user_id=user_id)
@@ -1,10 +1,12 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
+import hashlib
 import os
 from flask_jwt_extended import jwt_required
+from sqlalchemy.orm import raiseload
 from ..extensions import db
 from ..models.plate import Plate
 from ..schemas.plate import plates_schema
-from ..utils.auth_utils import role_required
+from ..utils.auth_utils import role_required, api_key_required
 
 plates_bp = Blueprint('plates', __name__)
 
@@ -13,7 +15,23 @@ plates_bp = Blueprint('plates', __name__)
 @role_required(os.getenv("FLASK_ADMIN_ROLE"))
 def get_plates():
     """Get all plates (admin only)"""
-    plates = db.session.execute(db.select(Plate)).scalars().all()
+    plates = db.session.execute(db.select(Plate).options(raiseload(Plate.user))).scalars().all()
     return jsonify(plates_schema.dump(plates)), 200
 
+@plates_bp.route('/plates/allowlist', methods=['GET'])
+@api_key_required
+def get_allowlist():
+    """
+    Every registered plate, for the allowlist the verifiers use when the backend does not answer.
+    The response has an ETag, so the periodic syncs get a 304 without body while nothing changes.
+    """
+    plates = db.session.execute(db.select(Plate.plate).order_by(Plate.plate)).scalars().all()
+    etag = hashlib.sha1("\n".join(plates).encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = jsonify()
+        response.status_code = 304
+    else:
+        response = jsonify({"plates": plates})
+    response.set_etag(etag)
+    return response
 
@@ -1,12 +1,14 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 import os
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from ..extensions import db
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
+from ..extensions import db, plate_cache, password_hasher
 from ..models.user import User
 from ..models.plate import Plate
-from ..models.role import Role
 from ..schemas.user import user_schema, users_schema, create_user_schema, update_user_schema
-from ..utils.auth_utils import role_required
+from ..utils.auth_utils import role_required, get_role_id, get_current_role
+from ..utils.bulk_import import parse_bulk_users
 
 
 users_bp = Blueprint('users', __name__)
@@ -15,18 +17,14 @@ user_role_name = os.getenv('FLASK_USER_ROLE')
 admin_role_name = os.getenv('FLASK_ADMIN_ROLE')
 
 def get_user_role_id():
-    # Get the user role ID from the database
+    # Get the user role ID, cached after the first query
     # This function assumes that the user role is already present in the database
-    stmt = db.select(Role).where(Role.name == user_role_name)
-    user_role = db.session.execute(stmt).scalar()
-    return user_role.id
+    return get_role_id(user_role_name)
 
 def get_admin_role_id():
-    # Get the admin role ID from the database
+    # Get the admin role ID, cached after the first query
     # This function assumes that the admin role is already present in the database
-    stmt = db.select(Role).where(Role.name == admin_role_name)
-    admin_role = db.session.execute(stmt).scalar()
-    return admin_role.id
+    return get_role_id(admin_role_name)
     
 
 #---------------------------------#
@@ -37,8 +35,10 @@ def get_admin_role_id():
 def get_users():
     # Select users where role_id is not 1 (admin)
     user_role_id = get_user_role_id()
-    stmt = db.select(User).where(User.role_id == user_role_id)
-    users = db.session.execute(stmt).scalars().all()
+    # The plates are loaded in the same query (a JOIN), instead of one query per user.
+    # selectinload would split the user IDs in chunks of 500, one query each
+    stmt = db.select(User).where(User.role_id == user_role_id).options(joinedload(User.plates))
+    users = db.session.execute(stmt).unique().scalars().all()
     return jsonify(users_schema.dump(users)), 200
 
 #---------------------------------#
@@ -72,9 +72,9 @@ def create_user():
             plate_indices_map[plate] = index
 
     # Verificar placas ya registradas en la base de datos
-    existing_plates = db.session.execute(
+    existing_plates = set(db.session.execute(
         db.select(Plate.plate).filter(Plate.plate.in_(plates))
-    ).scalars().all()
+    ).scalars())
 
     # Marcar los índices de las placas existentes
     for index, plate in enumerate(plates):
@@ -109,9 +109,169 @@ def create_user():
 
     db.session.add(new_user)
     db.session.commit()
+    plate_cache.invalidate(plates)
 
     return jsonify(user_schema.dump(new_user)), 201
 
+#---------------------------------#
+
+def select_existing(column, values, chunk_size=1000):
+    # Values of the column already in the database, queried in chunks to keep the IN lists short
+    values = list(values)
+    existing = set()
+    for start in range(0, len(values), chunk_size):
+        existing.update(db.session.execute(
+            db.select(column).where(column.in_(values[start:start + chunk_size]))
+        ).scalars())
+    return existing
+
+def validate_bulk_users(rows):
+    """
+    Validates the users of a bulk import. Every row is validated with the same schema as POST /users,
+    and the emails and plates are checked against the other rows and the database with sets.
+
+    Returns:
+        tuple: The loaded users and the errors by row index, with the same shape as the errors of
+               POST /users (e.g. {"3": {"plates": {"1": ["Duplicado"]}}}).
+    """
+    users = []
+    row_errors = {}
+
+    for index, row in enumerate(rows):
+        errors = create_user_schema.validate(row)
+        if errors:
+            row_errors[str(index)] = errors
+            continue
+        users.append((index, create_user_schema.load(row)))
+
+    def add_error(index, field, message, plate_index=None):
+        errors = row_errors.setdefault(str(index), {})
+        if plate_index is None:
+            errors.setdefault(field, []).append(message)
+        else:
+            errors.setdefault(field, {}).setdefault(str(plate_index), []).append(message)
+
+    # Primera fila de cada email y matrícula del fichero
+    email_rows = {}
+    plate_rows = {}
+    duplicated_plates = set()
+    for index, data in users:
+        email = data['email'].strip()
+        if email in email_rows:
+            add_error(index, "email", f"Email duplicado en la fila {email_rows[email]}")
+        else:
+            email_rows[email] = index
+
+        if len(data['password'].encode('utf-8')) > 72:
+            add_error(index, "password", "La contraseña no puede tener más de 72 bytes")
+
+        for plate_index, plate in enumerate(data.get('plates', [])):
+            if plate not in plate_rows:
+                plate_rows[plate] = (index, plate_index)
+                continue
+            first_row, first_plate_index = plate_rows[plate]
+            if first_row == index:
+                # Como en POST /users, se marcan la primera aparición y las repetidas
+                if (index, plate) not in duplicated_plates:
+                    duplicated_plates.add((index, plate))
+                    add_error(index, "plates", "Duplicado", first_plate_index)
+                add_error(index, "plates", "Duplicado", plate_index)
+            else:
+                add_error(index, "plates", f"Duplicado en la fila {first_row}", plate_index)
+
+    existing_emails = select_existing(User.email, email_rows)
+    existing_plates = select_existing(Plate.plate, plate_rows)
+    for index, data in users:
+        if data['email'].strip() in existing_emails:
+            add_error(index, "email", "Email ya registrado")
+        for plate_index, plate in enumerate(data.get('plates', [])):
+            if plate in existing_plates:
+                add_error(index, "plates", "Ya registrada en la base de datos", plate_index)
+
+    return [data for _, data in users], row_errors
+
+def insert_bulk_users(users, password_hashes, chunk_size):
+    """
+    Inserts the users and their plates with bulk inserts, committing every `chunk_size` users.
+
+    Returns:
+        tuple: The created users ({"id", "email"}) and the error of the chunk that failed, if any.
+    """
+    role_id = get_user_role_id()
+    created = []
+
+    for start in range(0, len(users), chunk_size):
+        chunk = users[start:start + chunk_size]
+        hashes = password_hashes[start:start + chunk_size]
+        try:
+            # Same normalization as User.__init__
+            user_ids = db.session.execute(
+                db.insert(User).returning(User.id, sort_by_parameter_order=True),
+                [
+                    {
+                        "email": data['email'].strip(),
+                        "first_name": ' '.join(data['first_name'].strip().split()),
+                        "last_name": ' '.join(data['last_name'].strip().split()),
+                        "password_hash": password_hash,
+                        "role_id": role_id,
+                    }
+                    for data, password_hash in zip(chunk, hashes)
+                ]
+            ).scalars().all()
+
+            plates = [
+                {"plate": plate, "user_id": user_id}
+                for data, user_id in zip(chunk, user_ids) for plate in data.get('plates', [])
+            ]
+            if plates:
+                db.session.execute(db.insert(Plate), plates)
+            db.session.commit()
+        except IntegrityError:
+            # Registrados por otra petición mientras se importaba
+            db.session.rollback()
+            return created, f"Conflicto al importar las filas {start} a {start + len(chunk) - 1}, ya registradas"
+
+        plate_cache.invalidate(plate["plate"] for plate in plates)
+        created.extend({"id": user_id, "email": data['email'].strip()} for data, user_id in zip(chunk, user_ids))
+
+    return created, None
+
+@users_bp.route('/users/bulk', methods=['POST'])
+@jwt_required()
+@role_required(admin_role_name)
+def bulk_create_users():
+    """
+    Creates many users at once from a CSV, JSON or JSON lines file (see `parse_bulk_users`).
+    Nothing is created if any row is invalid, the errors of every row are returned together.
+
+    Every password is hashed with bcrypt (~0.25 s each at the default cost, at most
+    PASSWORD_HASH_WORKERS at a time) while the request waits, so BULK_IMPORT_MAX_ROWS is kept low
+    (default 100) for an import to finish in seconds; larger files are split by the client.
+    """
+    max_rows = current_app.config.get("BULK_IMPORT_MAX_ROWS", 100)
+    chunk_size = current_app.config.get("BULK_IMPORT_CHUNK_SIZE", 500)
+
+    try:
+        rows = parse_bulk_users(request)
+    except ValueError as e:
+        return jsonify({"error": {"file": [str(e)]}}), 400
+
+    if not rows:
+        return jsonify({"error": {"file": ["No hay usuarios que importar"]}}), 400
+    if len(rows) > max_rows:
+        return jsonify({"error": {"file": [f"Máximo {max_rows} usuarios por importación"]}}), 400
+
+    users, row_errors = validate_bulk_users(rows)
+    if row_errors:
+        return jsonify({"error": {"rows": row_errors}}), 400
+
+    password_hashes = password_hasher.hash_many([data['password'] for data in users])
+    created, error = insert_bulk_users(users, password_hashes, chunk_size)
+    if error:
+        return jsonify({"error": error, "created": created}), 409
+
+    return jsonify({"created": created}), 201
+
 
 #---------------------------------#
 
@@ -119,13 +279,12 @@ def create_user():
 @jwt_required()
 def get_user(user_id):
     
-    current_user_id = get_jwt_identity()
-    current_user = db.session.get(User, current_user_id)
+    current_user_id = int(get_jwt_identity())
 
-    if current_user.role.name == user_role_name and current_user.id != user_id:
+    if get_current_role() == user_role_name and current_user_id != user_id:
         return jsonify({"error": "Unauthorized"}), 403
 
-    user = db.session.get(User, user_id)
+    user = db.session.get(User, user_id, options=[selectinload(User.plates)])
     if not user:
         return jsonify({"error": "User not found"}), 404
 
@@ -146,7 +305,7 @@ def update_user(user_id):
     if not user:
         return jsonify({"error": "User not found"}), 404
 
-    if user.role.id == 1:
+    if user.role_id == get_admin_role_id():
         return jsonify({"error": "Cannot modify admin users"}), 403
 
     error_response = {}
@@ -176,17 +335,15 @@ def update_user(user_id):
         # Placas registradas por otro usuario
         plates_to_check = set(plates)
         if plates_to_check:
-            existing_plates = db.session.execute(
-                db.select(Plate).filter(Plate.plate.in_(plates_to_check))
-            ).scalars().all()
+            other_user_plates = set(db.session.execute(
+                db.select(Plate.plate).filter(Plate.plate.in_(plates_to_check), Plate.user_id != user_id)
+            ).scalars())
 
-            for existing_plate in existing_plates:
-                if existing_plate.user_id != user_id:
-                    for index, plate in enumerate(plates):
-                        if plate == existing_plate.plate:
-                            if str(index) not in plate_errors_by_index:
-                                plate_errors_by_index[str(index)] = []
-                            plate_errors_by_index[str(index)].append("Ya registrada en otro usuario")
+            for index, plate in enumerate(plates):
+                if plate in other_user_plates:
+                    if str(index) not in plate_errors_by_index:
+                        plate_errors_by_index[str(index)] = []
+                    plate_errors_by_index[str(index)].append("Ya registrada en otro usuario")
 
         if plate_errors_by_index:
             error_response["plates"] = plate_errors_by_index
@@ -194,13 +351,20 @@ def update_user(user_id):
     if error_response:
         return jsonify({"error": error_response}), 400
 
+    # Placas afectadas en la caché (el nombre del usuario también está cacheado)
+    changed_plates = set(db.session.execute(
+        db.select(Plate.plate).where(Plate.user_id == user_id)
+    ).scalars())
+
     # Si no hay errores, actualizar placas
     if 'plates' in data:
         db.session.execute(db.delete(Plate).where(Plate.user_id == user_id))
         for plate_number in set(data['plates']):
             db.session.add(Plate(plate=plate_number, user=user))
+        changed_plates.update(data['plates'])
 
     db.session.commit()
+    plate_cache.invalidate(changed_plates)
     return jsonify(user_schema.dump(user)), 200
 
 
@@ -213,9 +377,12 @@ def delete_user(user_id):
     user = db.session.get(User, user_id)
 
     # Check if the user is an admin
-    if user.role.name == admin_role_name:
+    if user.role_id == get_admin_role_id():
         return jsonify({"error": "Cannot delete admin users"}), 403
 
+    user_plates = [plate.plate for plate in user.plates]
+
     db.session.delete(user)
     db.session.commit()
+    plate_cache.invalidate(user_plates)
     return jsonify({"message": "User deleted successfully."}), 200
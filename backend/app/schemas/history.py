@@ -1,8 +1,8 @@
 from ..utils.validators import validate_plate
 from ..extensions import ma
-from marshmallow import Schema, fields, validates
+from marshmallow import Schema, fields, validate, post_load
 from ..models.history import History
-from datetime import datetime
+from datetime import datetime, timezone
 
 class HistorySchema(ma.SQLAlchemyAutoSchema):
 
@@ -10,16 +10,34 @@ class HistorySchema(ma.SQLAlchemyAutoSchema):
         model = History
         include_fk = True
 
+# Format of the dates sent by the gates, always UTC
+VERIFY_PLATE_DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
 class VerifyPlateRequestSchema(Schema):
-    plate = fields.Str(required=True)
+    # Same check as /verify_plate/fast, it also keeps the plate within the length of the history column
+    plate = fields.Str(required=True, validate=validate_plate)
     date = fields.DateTime(
-        format='%Y-%m-%dT%H:%M:%SZ',
-        missing=lambda: datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+        format=VERIFY_PLATE_DATE_FORMAT,
+        load_default=lambda: datetime.now(timezone.utc)
     )
 
-    @validates('plate')
-    def validate_plate_field(self, value):
-        validate_plate(value)
+    @post_load
+    def set_utc_timezone(self, data, **kwargs):
+        # The gates send the date in UTC
+        if data['date'].tzinfo is None:
+            data['date'] = data['date'].replace(tzinfo=timezone.utc)
+        return data
+
+class VerifyPlatesRequestSchema(Schema):
+    # Every verification is validated on its own with VerifyPlateRequestSchema
+    verifications = fields.List(fields.Dict(), required=True, validate=validate.Length(min=1, max=500))
+
+class HistoryEventSchema(VerifyPlateRequestSchema):
+    allowed = fields.Boolean(required=True)
+
+class UploadHistorySchema(Schema):
+    # Every event is validated on its own with HistoryEventSchema, so one wrong event doesn't reject the batch
+    events = fields.List(fields.Dict(), required=True, validate=validate.Length(max=5000))
 
 class VerifyPlateResponseSchema(Schema):
     allowed = fields.Boolean(required=True)
@@ -27,7 +45,22 @@ class VerifyPlateResponseSchema(Schema):
     registered = fields.Boolean(required=True)
     user = fields.Nested('UserSchema', dump_only=True, only=('id', 'email', 'first_name', 'last_name'))
 
+class HistoryQuerySchema(Schema):
+    limit = fields.Int(load_default=100, validate=validate.Range(min=1, max=1000))
+    cursor = fields.Str()
+    date_from = fields.AwareDateTime(default_timezone=timezone.utc)
+    date_to = fields.AwareDateTime(default_timezone=timezone.utc)
+    plate = fields.Str()
+    allowed = fields.Boolean()
+    user_id = fields.Int()
+    order = fields.Str(load_default="desc", validate=validate.OneOf(["asc", "desc"]))
+    format = fields.Str(load_default="json", validate=validate.OneOf(["json", "ndjson", "csv"]))
+
 history_schema = HistorySchema()
 histories_schema = HistorySchema(many=True)
 verify_plate_request_schema = VerifyPlateRequestSchema()
 verify_plate_response_schema = VerifyPlateResponseSchema()
+history_query_schema = HistoryQuerySchema()
+verify_plates_request_schema = VerifyPlatesRequestSchema()
+upload_history_schema = UploadHistorySchema()
+history_event_schema = HistoryEventSchema()
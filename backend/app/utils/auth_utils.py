@@ -1,17 +1,48 @@
 import os
-from flask import jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import jsonify, current_app, request
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt, create_access_token
 from functools import wraps
+from ..extensions import db
 from ..models.user import User
+from ..models.role import Role
+
+# Role IDs by name, resolved once per process (roles are only created at startup)
+role_ids = {}
+
+def get_role_id(role_name):
+    """Returns the ID of a role, querying the database only the first time"""
+    role_id = role_ids.get(role_name)
+    if role_id is None:
+        role_id = db.session.execute(db.select(Role.id).where(Role.name == role_name)).scalar()
+        if role_id is not None:
+            role_ids[role_name] = role_id
+    return role_id
+
+def create_user_access_token(user_id, role_name):
+    """Creates an access token with the role of the user as claim, so it is not queried on every request"""
+    return create_access_token(identity=str(user_id), additional_claims={"role": role_name})
+
+def get_current_role():
+    """
+    Returns the role name of the current user, taken from the JWT claims.
+
+    The role is read from the database instead if AUTH_STRICT_ROLE_CHECK is enabled (so role changes
+    and deleted users take effect before the token expires) or if the token has no role claim.
+    Returns None if the user does not exist.
+    """
+    role_name = get_jwt().get("role")
+    if role_name is None or current_app.config.get("AUTH_STRICT_ROLE_CHECK", False):
+        role_name = db.session.execute(
+            db.select(Role.name).join(User, User.role_id == Role.id).where(User.id == get_jwt_identity())
+        ).scalar()
+    return role_name
 
 def role_required(required_role):
     def decorator(fn):
         @wraps(fn)
         @jwt_required()
         def wrapper(*args, **kwargs):
-            current_user_id = get_jwt_identity()
-            current_user = User.query.get(current_user_id)
-            if not current_user or current_user.role.name != required_role:
+            if get_current_role() != required_role:
                 return jsonify({"error": "Unauthorized"}), 403
             return fn(*args, **kwargs)
         return wrapper
@@ -22,3 +53,16 @@ def check_api_key(request):
     """Validates the API key in the request headers"""
     api_key = request.headers.get('API_KEY')
     return api_key == os.getenv('FLASK_API_KEY')
+
+def api_key_required(fn):
+    """
+    Only allows requests with a valid API key (the gates). The view is marked as API key
+    authenticated, so the JWT refresh middleware skips it.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not check_api_key(request):
+            return jsonify({"error": "Unauthorized. Invalid API_KEY."}), 403
+        return fn(*args, **kwargs)
+    wrapper.api_key_auth = True
+    return wrapper
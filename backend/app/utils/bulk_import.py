@@ -0,0 +1,90 @@
+import csv
+import io
+import json
+
+USER_COLUMNS = ("email", "first_name", "last_name", "password")
+
+JSON_LINES_TYPES = ("application/x-ndjson", "application/jsonl", "application/json-lines")
+
+
+def parse_bulk_users(request):
+    """
+    Reads the users of a bulk import from the request body, or from the `file` field of a
+    multipart form.
+
+    Formats:
+        CSV (text/csv, .csv): Header with email, first_name, last_name, password and optionally
+            plates, separated by spaces or semicolons.
+        JSON lines (application/x-ndjson, .jsonl, .ndjson): One user object per line.
+        JSON (application/json, .json): A list of user objects, or an object with a `users` list.
+
+    Returns:
+        list of dict: The users, with the plates as a list.
+
+    Raises:
+        ValueError: If the format is not supported or the content can not be parsed.
+    """
+    upload = request.files.get("file")
+    if upload is not None:
+        content = upload.read()
+        extension = upload.filename.rsplit(".", 1)[-1].lower() if "." in upload.filename else ""
+        kind = {"csv": "csv", "jsonl": "jsonl", "ndjson": "jsonl", "json": "json"}.get(extension)
+    else:
+        content = request.get_data()
+        mimetype = request.mimetype
+        kind = "csv" if mimetype == "text/csv" else "jsonl" if mimetype in JSON_LINES_TYPES else "json" if mimetype == "application/json" else None
+
+    if kind is None:
+        raise ValueError("Formato no soportado, se acepta CSV, JSON o JSON lines")
+
+    try:
+        text = content.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValueError("El fichero debe estar codificado en UTF-8")
+
+    if kind == "csv":
+        return parse_csv(text)
+    if kind == "jsonl":
+        return parse_json_lines(text)
+    return parse_json(text)
+
+
+def parse_csv(text):
+    reader = csv.DictReader(io.StringIO(text))
+    missing = [column for column in USER_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"Faltan columnas en la cabecera: {', '.join(missing)}")
+
+    users = []
+    for row in reader:
+        user = {column: (row[column] or "") for column in USER_COLUMNS}
+        user["plates"] = (row.get("plates") or "").replace(";", " ").split()
+        users.append(user)
+    return users
+
+
+def parse_json_lines(text):
+    users = []
+    for number, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            user = json.loads(line)
+        except json.JSONDecodeError:
+            raise ValueError(f"Línea {number}: JSON inválido")
+        if not isinstance(user, dict):
+            raise ValueError(f"Línea {number}: se esperaba un objeto")
+        users.append(user)
+    return users
+
+
+def parse_json(text):
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        raise ValueError("JSON inválido")
+
+    users = data.get("users") if isinstance(data, dict) else data
+    if not isinstance(users, list) or not all(isinstance(user, dict) for user in users):
+        raise ValueError("Se esperaba una lista de usuarios")
+    return users
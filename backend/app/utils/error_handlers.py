@@ -3,6 +3,7 @@ from flask_jwt_extended import JWTManager
 from marshmallow import ValidationError
 from sqlalchemy.exc import SQLAlchemyError
 from ..extensions import db
+from .password_hashing import PasswordHasherBusy
 import traceback
 from werkzeug.exceptions import HTTPException
 
@@ -39,7 +40,7 @@ def register_error_handlers(app):
         current_app.logger.warning(
             f"Validation error: {err.messages}\n"
             f"Request: {request.method} {request.path}\n"
-            f"Data: {request.get_json()}"
+            f"Data: {request.get_json(silent=True)}"
         )
         return jsonify({"error": err.messages}), 400
     
@@ -50,11 +51,21 @@ def register_error_handlers(app):
         current_app.logger.error(
             f"SQLAlchemy error: {err}\n"
             f"Request: {request.method} {request.path}\n"
-            f"Data: {request.get_json()}\n"
+            f"Data: {request.get_json(silent=True)}\n"
             f"Traceback: {tb}"
         )
         return jsonify({"error": "Database error"}), 500
 
+    @app.errorhandler(PasswordHasherBusy)
+    def handle_password_hasher_busy(err):
+        current_app.logger.warning(
+            f"Password hasher busy: {err}\n"
+            f"Request: {request.method} {request.path}"
+        )
+        response = jsonify({"error": "Server busy, try again later"})
+        response.headers["Retry-After"] = "1"
+        return response, 503
+
     @app.errorhandler(HTTPException)
     def handle_http_error(err):
         current_app.logger.warning(
@@ -70,7 +81,7 @@ def register_error_handlers(app):
         current_app.logger.error(
             f"Unhandled exception: {err}\n"
             f"Request: {request.method} {request.path}\n"
-            f"Data: {request.get_json()}\n"
+            f"Data: {request.get_json(silent=True)}\n"
             f"Headers: {dict(request.headers)}\n"
             f"Traceback: {tb}"
         )
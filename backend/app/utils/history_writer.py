@@ -0,0 +1,319 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError, OperationalError, SQLAlchemyError
+
+
+class HistoryWriter:
+    """
+    Write-behind queue for the History rows created by /verify_plate, so the gate gets its answer
+    without waiting for a database commit.
+
+    Every row is appended to a local spool file and queued in memory. A background thread inserts
+    the queued rows in one bulk insert when HISTORY_BATCH_SIZE rows are waiting or every
+    HISTORY_FLUSH_INTERVAL seconds, and then deletes their spool files. If the database is
+    unreachable, the rows are kept and retried in the next flush. If the database rejects the batch
+    (e.g. a row of a user deleted meanwhile), the rows are inserted one by one so a bad row does not
+    block the rest: a row whose user does not exist anymore is inserted without user, and a row
+    rejected anyway is moved to the dead-letter file history_dead_letter.jsonl of the spool directory.
+
+    Every worker process writes its own spool files. The spool files left by a process that is not
+    running anymore (e.g. after a crash) are claimed with an atomic rename and inserted by the first
+    process that starts writing.
+
+    Config:
+        HISTORY_WRITER_ENABLED (bool): If False, rows are committed synchronously. Default True.
+        HISTORY_BATCH_SIZE (int): Queued rows that trigger a flush. Default 200.
+        HISTORY_FLUSH_INTERVAL (float): Maximum seconds a row waits to be flushed. Default 1.
+        HISTORY_SPOOL_DIR (str): Directory of the spool files. Default <instance path>/history_spool.
+        HISTORY_SPOOL_FSYNC (bool): fsync every spooled row, to survive power losses and not only
+                                    process crashes. Default False.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.batch_size = 200
+        self.flush_interval = 1.0
+        self.spool_dir = None
+        self.fsync = False
+
+        self.pending = []
+        self.segments = []
+        self.stats = {
+            "queued": 0, "flushed": 0, "flushes": 0, "failed_flushes": 0, "recovered": 0, "dead_lettered": 0,
+            "last_flush_rows": 0, "last_flush_ms": 0.0, "max_flush_ms": 0.0, "last_error": None,
+        }
+        self._condition = threading.Condition()
+        self._spool_file = None
+        self._segment_count = 0
+        self._thread = None
+        self._pid = None
+        self._stopped = False
+        self._app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self._app = app
+        self.enabled = app.config.get("HISTORY_WRITER_ENABLED", True)
+        self.batch_size = app.config.get("HISTORY_BATCH_SIZE", 200)
+        self.flush_interval = app.config.get("HISTORY_FLUSH_INTERVAL", 1.0)
+        self.spool_dir = app.config.get("HISTORY_SPOOL_DIR", os.path.join(app.instance_path, "history_spool"))
+        self.fsync = app.config.get("HISTORY_SPOOL_FSYNC", False)
+        app.extensions["history_writer"] = self
+
+    def add(self, plate, date, allowed, user_id):
+        """
+        Queues a History row.
+
+        Args:
+            plate (str): The verified plate.
+            date (datetime): Date of the verification.
+            allowed (bool): If the plate was allowed.
+            user_id (int): Owner of the plate, None if it is not registered.
+        """
+        self.add_many([{"plate": plate, "date": date, "allowed": allowed, "user_id": user_id}])
+
+    def add_many(self, rows):
+        """
+        Queues several History rows at once, with a single write to the spool file (or a single
+        commit if the writer is disabled).
+
+        Args:
+            rows (list of dict): The rows, with the arguments of `add` as keys.
+        """
+        if not rows:
+            return
+
+        if not self.enabled:
+            from ..extensions import db
+            from ..models.history import History
+
+            db.session.execute(db.insert(History), rows)
+            db.session.commit()
+            return
+
+        lines = "".join(json.dumps({**row, "date": row["date"].isoformat()}) + "\n" for row in rows)
+
+        with self._condition:
+            self._start()
+            self._spool_file.write(lines)
+            self._spool_file.flush()
+            if self.fsync:
+                os.fsync(self._spool_file.fileno())
+
+            self.pending.extend(rows)
+            self.stats["queued"] += len(rows)
+            if len(self.pending) >= self.batch_size:
+                self._condition.notify()
+
+    def get_stats(self):
+        with self._condition:
+            return {**self.stats, "pending": len(self.pending)}
+
+    def flush(self):
+        """
+        Inserts every queued row.
+
+        Returns:
+            bool: True if there was nothing to insert or the rows were inserted.
+        """
+        with self._condition:
+            if not self.pending:
+                return True
+            rows = self.pending
+            self.pending = []
+            # The rows queued from now on go to a new spool file
+            segments = self.segments + [self._rotate_segment()]
+            self.segments = []
+
+        start = time.perf_counter()
+        dead_lettered = 0
+        try:
+            with self._app.app_context():
+                self._insert(rows)
+            remaining, error = [], None
+        except OperationalError as e:
+            # Database unreachable, the whole batch is retried
+            remaining, error = rows, e
+        except SQLAlchemyError as e:
+            self._app.logger.warning(f"History flush of {len(rows)} rows rejected, inserting them one by one: {e}")
+            remaining, error, dead_lettered = self._insert_one_by_one(rows)
+
+        if remaining:
+            with self._condition:
+                # Keep the rows, ahead of the ones queued meanwhile, and their spool files
+                self.pending = remaining + self.pending
+                self.segments = segments + self.segments
+                self.stats["failed_flushes"] += 1
+                self.stats["dead_lettered"] += dead_lettered
+                self.stats["last_error"] = str(error)
+            self._app.logger.error(f"History flush of {len(remaining)} rows failed, retrying later: {error}")
+            return False
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        for segment in segments:
+            try:
+                os.remove(segment)
+            except FileNotFoundError:
+                pass
+
+        with self._condition:
+            self.stats["flushed"] += len(rows) - dead_lettered
+            self.stats["dead_lettered"] += dead_lettered
+            self.stats["flushes"] += 1
+            self.stats["last_flush_rows"] = len(rows)
+            self.stats["last_flush_ms"] = round(elapsed_ms, 2)
+            self.stats["max_flush_ms"] = round(max(self.stats["max_flush_ms"], elapsed_ms), 2)
+        return True
+
+    def _insert(self, rows):
+        # Called inside an app context
+        from ..extensions import db
+        from ..models.history import History
+
+        try:
+            db.session.execute(db.insert(History), rows)
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            raise
+
+    def _insert_one_by_one(self, rows):
+        """
+        Inserts the rows of a rejected batch one at a time.
+
+        Returns:
+            tuple: The rows not inserted because the database became unreachable (retried in the
+                   next flush), that error, and the number of rows moved to the dead-letter file.
+        """
+        dead_lettered = 0
+        with self._app.app_context():
+            for index, row in enumerate(rows):
+                try:
+                    try:
+                        self._insert([row])
+                    except IntegrityError:
+                        if row["user_id"] is None:
+                            raise
+                        # The user was deleted after the verification was queued
+                        self._insert([{**row, "user_id": None}])
+                except OperationalError as e:
+                    return rows[index:], e, dead_lettered
+                except SQLAlchemyError as e:
+                    self._dead_letter(row, e)
+                    dead_lettered += 1
+        return [], None, dead_lettered
+
+    def _dead_letter(self, row, error):
+        date = row.get("date")
+        record = {**row, "date": date.isoformat() if isinstance(date, datetime) else date, "error": str(error)}
+        with open(os.path.join(self.spool_dir, "history_dead_letter.jsonl"), "a") as f:
+            f.write(json.dumps(record) + "\n")
+        self._app.logger.error(f"History row rejected, moved to the dead-letter file: {record}")
+
+    def close(self):
+        """Stops the flush thread and inserts the rows still queued (called when the worker exits)."""
+        with self._condition:
+            if self._thread is None or self._pid != os.getpid():
+                return
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join(timeout=10)
+
+        if self.flush():
+            # Every row is in the database, the spool files are not needed anymore
+            with self._condition:
+                for segment in self.segments + [self._rotate_segment()]:
+                    os.remove(segment)
+                self.segments = []
+                self._spool_file.close()
+                os.remove(self._spool_file.name)
+                # Closed: called again at exit it does nothing
+                self._thread = None
+
+    def _start(self):
+        # Called with the condition held. Started on first use so it runs in the worker process,
+        # after gunicorn forks, and is not started by CLI commands like `flask db upgrade`
+        if self._thread is not None and self._pid == os.getpid():
+            return
+
+        self._pid = os.getpid()
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._recover_orphan_segments()
+        self._spool_file = open(self._segment_path(), "a")
+
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="HistoryWriter", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._stopped or len(self.pending) >= self.batch_size,
+                    timeout=self.flush_interval
+                )
+                if self._stopped:
+                    return
+            if not self.flush():
+                # Database unavailable, do not retry in a tight loop
+                time.sleep(self.flush_interval)
+
+    def _segment_path(self):
+        self._segment_count += 1
+        return os.path.join(self.spool_dir, f"history-{self._pid}-{time.time_ns()}-{self._segment_count}.jsonl")
+
+    def _rotate_segment(self):
+        # Called with the condition held
+        self._spool_file.close()
+        segment = self._spool_file.name
+        self._spool_file = open(self._segment_path(), "a")
+        return segment
+
+    def _recover_orphan_segments(self):
+        # Called with the condition held
+        for segment in sorted(glob.glob(os.path.join(self.spool_dir, "history-*.jsonl"))):
+            pid = int(os.path.basename(segment).split("-")[1])
+            # Files with our own PID are from a previous run that got the same PID
+            if pid != self._pid and self._process_alive(pid):
+                continue
+
+            claimed = self._segment_path()
+            try:
+                os.rename(segment, claimed)
+            except FileNotFoundError:
+                # Claimed by another worker
+                continue
+
+            rows = []
+            with open(claimed) as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Last line cut by the crash
+                        continue
+                    row["date"] = datetime.fromisoformat(row["date"])
+                    rows.append(row)
+
+            self.pending.extend(rows)
+            self.segments.append(claimed)
+            self.stats["recovered"] += len(rows)
+            self._app.logger.info(f"Recovered {len(rows)} history rows from {segment}")
+
+    @staticmethod
+    def _process_alive(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
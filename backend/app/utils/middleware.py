@@ -1,4 +1,4 @@
-from flask import Blueprint
+from flask import Blueprint, current_app, request
 from flask_jwt_extended import get_jwt, create_access_token, get_jwt_identity, set_access_cookies
 from datetime import datetime, timedelta, timezone
 
@@ -6,12 +6,19 @@ middleware = Blueprint('middleware', __name__)
 
 @middleware.after_app_request
 def refresh_expiring_jwts(response):
+    # Requests authenticated with the API key (the gates) have no JWT to refresh
+    if getattr(current_app.view_functions.get(request.endpoint), "api_key_auth", False):
+        return response
     try:
         exp_timestamp = get_jwt()["exp"]
         now = datetime.now(timezone.utc)
         target_timestamp = datetime.timestamp(now + timedelta(minutes=30))
         if target_timestamp > exp_timestamp:
-            access_token = create_access_token(identity=get_jwt_identity())
+            # Keep the role claim, so role checks keep working without queries
+            access_token = create_access_token(
+                identity=get_jwt_identity(),
+                additional_claims={"role": get_jwt().get("role")} if "role" in get_jwt() else None
+            )
             set_access_cookies(response, access_token)
         return response
     except (RuntimeError, KeyError):
@@ -0,0 +1,212 @@
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import bcrypt
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue is full or a hash waited too long, answered with a 503"""
+
+
+class PasswordHasher:
+    """
+    Bounded pool for the bcrypt work of logins, password changes and user creation, so a burst of
+    logins can not take every CPU (or every worker thread) from /verify_plate.
+
+    At most PASSWORD_HASH_WORKERS hashes run at the same time, in a thread pool: bcrypt releases the
+    GIL while hashing, so the request threads waiting for them do not block the rest. At most
+    PASSWORD_HASH_MAX_QUEUE more wait for a free thread; when the queue is full, or a hash is not
+    finished after PASSWORD_HASH_TIMEOUT seconds, PasswordHasherBusy is raised and the request is
+    answered with a 503 instead of waiting.
+
+    Every hash running or queued holds the request thread waiting for it, so the hashes running and
+    queued together are capped at the request threads of the worker process minus one
+    (GUNICORN_THREADS - 1): a burst of logins always leaves a thread free for /verify_plate.
+
+    Hashes have the same format as Flask-Bcrypt's, with BCRYPT_LOG_ROUNDS as cost factor. Hashes
+    made with another cost are upgraded on the next login (see `needs_rehash`).
+
+    Config:
+        BCRYPT_LOG_ROUNDS (int): bcrypt cost factor. Default 12.
+        BCRYPT_HASH_PREFIX, BCRYPT_HANDLE_LONG_PASSWORDS: As in Flask-Bcrypt.
+        PASSWORD_HASH_WORKERS (int): Hashes running at the same time. Default half of the CPUs.
+        PASSWORD_HASH_MAX_QUEUE (int): Hashes waiting for a free worker. Default 32.
+        PASSWORD_HASH_TIMEOUT (float): Maximum seconds a request waits for its hash. Default 10.
+        PASSWORD_HASH_REQUEST_THREADS (int): Request threads of a worker process. Default the
+                                             GUNICORN_THREADS environment variable, or 4.
+    """
+
+    def __init__(self, app=None):
+        self.rounds = 12
+        self.prefix = b"2b"
+        self.handle_long_passwords = False
+        self.workers = 1
+        self.max_queue = 32
+        self.timeout = 10.0
+        self.capacity = self.workers + self.max_queue
+
+        self.stats = {
+            "submitted": 0, "completed": 0, "rejected": 0, "timeouts": 0, "rehashed": 0,
+            "in_flight": 0, "max_in_flight": 0,
+            "total_wait_ms": 0.0, "max_wait_ms": 0.0, "total_run_ms": 0.0,
+        }
+        self._lock = threading.Lock()
+        self._slots = None
+        self._executor = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.rounds = app.config.get("BCRYPT_LOG_ROUNDS", 12)
+        self.prefix = app.config.get("BCRYPT_HASH_PREFIX", "2b").encode()
+        self.handle_long_passwords = app.config.get("BCRYPT_HANDLE_LONG_PASSWORDS", False)
+        self.workers = app.config.get("PASSWORD_HASH_WORKERS") or max(1, (os.cpu_count() or 2) // 2)
+        self.max_queue = app.config.get("PASSWORD_HASH_MAX_QUEUE", 32)
+        self.timeout = app.config.get("PASSWORD_HASH_TIMEOUT", 10.0)
+        request_threads = app.config.get("PASSWORD_HASH_REQUEST_THREADS") or int(os.getenv("GUNICORN_THREADS", 4))
+        self.capacity = max(1, min(self.workers + self.max_queue, request_threads - 1))
+        app.extensions["password_hasher"] = self
+
+    def hash(self, password):
+        """
+        Returns:
+            str: The bcrypt hash of the password.
+
+        Raises:
+            PasswordHasherBusy: If the queue is full or the hash took longer than the timeout.
+        """
+        salt = bcrypt.gensalt(rounds=self.rounds, prefix=self.prefix)
+        return self._run(bcrypt.hashpw, self._encode(password), salt).decode("utf-8")
+
+    def check(self, password_hash, password):
+        """
+        Returns:
+            bool: True if the password matches the hash.
+
+        Raises:
+            PasswordHasherBusy: If the queue is full or the check took longer than the timeout.
+        """
+        return self._run(self._checkpw, self._encode(password), password_hash.encode("utf-8"))
+
+    def hash_many(self, passwords):
+        """
+        Hashes many passwords (e.g. a bulk import). It waits for free slots instead of failing, and
+        leaves at least one slot of `capacity` free (it uses at most min(workers, capacity - 1)
+        slots), so logins can still queue meanwhile.
+
+        Returns:
+            list of str: The hashes, in the same order.
+        """
+        in_flight = max(1, min(self.workers, self.capacity - 1))
+        results = []
+        pending = []
+        for password in passwords:
+            salt = bcrypt.gensalt(rounds=self.rounds, prefix=self.prefix)
+            pending.append(self._submit(bcrypt.hashpw, self._encode(password), salt, block=True))
+            if len(pending) >= in_flight:
+                results.append(pending.pop(0).result())
+        results.extend(future.result() for future in pending)
+        return [password_hash.decode("utf-8") for password_hash in results]
+
+    def needs_rehash(self, password_hash):
+        """
+        Returns:
+            bool: True if the hash was made with a cost factor other than the configured one.
+        """
+        try:
+            return int(password_hash.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def record_rehash(self):
+        with self._lock:
+            self.stats["rehashed"] += 1
+
+    def get_stats(self):
+        with self._lock:
+            finished = self.stats["completed"] or 1
+            return {
+                **self.stats,
+                "total_wait_ms": round(self.stats["total_wait_ms"], 2),
+                "total_run_ms": round(self.stats["total_run_ms"], 2),
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "capacity": self.capacity,
+                "rounds": self.rounds,
+                "avg_wait_ms": round(self.stats["total_wait_ms"] / finished, 2),
+                "avg_run_ms": round(self.stats["total_run_ms"] / finished, 2),
+            }
+
+    def _run(self, fn, *args):
+        future = self._submit(fn, *args, block=False)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # Still queued: it is dropped. Already running: it finishes, but nobody waits for it
+            future.cancel()
+            with self._lock:
+                self.stats["timeouts"] += 1
+            raise PasswordHasherBusy("Password hashing timed out")
+
+    def _submit(self, fn, *args, block):
+        self._start()
+        if not self._slots.acquire(blocking=block):
+            with self._lock:
+                self.stats["rejected"] += 1
+            raise PasswordHasherBusy("Password hashing queue is full")
+
+        submitted = time.perf_counter()
+        with self._lock:
+            self.stats["submitted"] += 1
+            self.stats["in_flight"] += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+
+        def task():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self.stats["completed"] += 1
+                    self.stats["total_wait_ms"] += (started - submitted) * 1000
+                    self.stats["max_wait_ms"] = round(max(self.stats["max_wait_ms"], (started - submitted) * 1000), 2)
+                    self.stats["total_run_ms"] += (finished - started) * 1000
+
+        future = self._executor.submit(task)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self._lock:
+            self.stats["in_flight"] -= 1
+        self._slots.release()
+
+    def _start(self):
+        # Created on first use so the threads belong to the worker process, after gunicorn forks
+        if self._executor is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                return
+            self._slots = threading.BoundedSemaphore(self.capacity)
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="PasswordHasher")
+            self._pid = os.getpid()
+
+    def _encode(self, password):
+        password = password.encode("utf-8")
+        if self.handle_long_passwords:
+            password = hashlib.sha256(password).hexdigest().encode()
+        return password
+
+    @staticmethod
+    def _checkpw(password, password_hash):
+        try:
+            return bcrypt.checkpw(password, password_hash)
+        except ValueError:
+            # Passwords longer than 72 bytes or malformed hashes
+            return False
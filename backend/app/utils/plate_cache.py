@@ -0,0 +1,288 @@
+import json
+import select
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy.exc import SQLAlchemyError
+
+
+class PlateCache:
+    """
+    In-process plate -> user index used by /verify_plate, so the allow/deny decision does not
+    need a database round-trip.
+
+    Registered plates are loaded at startup. Plates looked up and not found are cached as not
+    registered. Entries expire after PLATE_CACHE_TTL seconds, and the least recently used ones are
+    evicted beyond PLATE_CACHE_MAX_SIZE.
+
+    When users or plates change, `invalidate` drops the affected plates. With PostgreSQL it also
+    sends a NOTIFY so every other worker process drops them too; with other databases the other
+    workers rely on the TTL. Every invalidation bumps a generation counter, and the result of a
+    database lookup is not cached if an invalidation arrived while it was running, so a plate
+    changed meanwhile is not served stale until the TTL expires.
+
+    Config:
+        PLATE_CACHE_ENABLED (bool): If False, every lookup goes to the database. Default True.
+        PLATE_CACHE_TTL (int): Seconds an entry is valid. Default 300.
+        PLATE_CACHE_MAX_SIZE (int): Maximum number of cached plates. Default 50000.
+    """
+
+    channel = "plate_cache"
+    # PostgreSQL NOTIFY payloads must be shorter than 8000 bytes
+    max_payload_size = 7500
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.ttl = 300
+        self.max_size = 50000
+        self.entries = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0, "stale_skipped": 0}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._listener = None
+        self._app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self._app = app
+        self.enabled = app.config.get("PLATE_CACHE_ENABLED", True)
+        self.ttl = app.config.get("PLATE_CACHE_TTL", 300)
+        self.max_size = app.config.get("PLATE_CACHE_MAX_SIZE", 50000)
+        app.extensions["plate_cache"] = self
+
+        if self.enabled:
+            with app.app_context():
+                self.load()
+
+    def load(self):
+        """Loads every registered plate, replacing the cached entries."""
+        from ..extensions import db
+        from ..models.plate import Plate
+        from ..models.user import User
+
+        with self._lock:
+            generation = self._generation
+        try:
+            rows = db.session.execute(
+                db.select(Plate.plate, User.id, User.email, User.first_name, User.last_name)
+                .join(User, Plate.user_id == User.id)
+                .limit(self.max_size)
+            ).all()
+        except SQLAlchemyError as e:
+            # The tables may not exist yet (e.g. while running the migrations)
+            db.session.rollback()
+            self._app.logger.warning(f"Plate cache not loaded: {e}")
+            return
+
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            if generation != self._generation:
+                # Invalidated while loading, the plates are looked up on demand instead
+                self.stats["stale_skipped"] += 1
+                self._app.logger.warning("Plate cache not loaded, invalidated while loading")
+                return
+            self.entries.clear()
+            for plate, user_id, email, first_name, last_name in rows:
+                self.entries[plate] = (self._user_dict(user_id, email, first_name, last_name), expires_at)
+        self._app.logger.info(f"Plate cache loaded with {len(rows)} plates")
+
+    def get(self, plate):
+        """
+        Returns the owner of a plate, from the cache or from the database on a miss.
+
+        Returns:
+            dict or None: id, email, first_name and last_name of the owner, or None if the plate
+                          is not registered.
+        """
+        if not self.enabled:
+            return self._query(plate)
+
+        self._start_listener()
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self.entries.get(plate)
+            if entry is not None and entry[1] > now:
+                self.entries.move_to_end(plate)
+                self.stats["hits"] += 1
+                return entry[0]
+            self.stats["misses"] += 1
+            generation = self._generation
+
+        user = self._query(plate)
+
+        with self._lock:
+            if generation != self._generation:
+                # The plate may have changed after it was read, it is not cached
+                self.stats["stale_skipped"] += 1
+                return user
+            self.entries[plate] = (user, now + self.ttl)
+            self.entries.move_to_end(plate)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return user
+
+    def get_many(self, plates):
+        """
+        Returns the owners of several plates, looking up every miss in a single database query.
+
+        Returns:
+            dict: The owner of every plate (see `get`), None for the plates not registered.
+        """
+        plates = set(plates)
+        if not self.enabled:
+            return self._query_many(plates)
+
+        self._start_listener()
+
+        now = time.monotonic()
+        owners = {}
+        misses = []
+        with self._lock:
+            for plate in plates:
+                entry = self.entries.get(plate)
+                if entry is not None and entry[1] > now:
+                    self.entries.move_to_end(plate)
+                    self.stats["hits"] += 1
+                    owners[plate] = entry[0]
+                else:
+                    self.stats["misses"] += 1
+                    misses.append(plate)
+            generation = self._generation
+
+        if not misses:
+            return owners
+
+        found = self._query_many(misses)
+        owners.update(found)
+
+        with self._lock:
+            if generation != self._generation:
+                # Some plate may have changed after it was read, none is cached
+                self.stats["stale_skipped"] += 1
+                return owners
+            for plate, user in found.items():
+                self.entries[plate] = (user, now + self.ttl)
+                self.entries.move_to_end(plate)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return owners
+
+    def invalidate(self, plates=None):
+        """
+        Drops plates from the cache of every worker. Call it after committing the change.
+
+        Args:
+            plates (iterable of str, optional): The changed plates. None drops every plate.
+        """
+        from ..extensions import db
+
+        plates = list(plates) if plates is not None else None
+        self._drop(plates)
+
+        if db.engine.dialect.name != "postgresql":
+            return
+
+        payload = json.dumps(plates)
+        if len(payload) > self.max_payload_size:
+            payload = json.dumps(None)
+        try:
+            db.session.execute(db.text("SELECT pg_notify(:channel, :payload)"), {"channel": self.channel, "payload": payload})
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            self._app.logger.error(f"Plate cache invalidation not sent to other workers: {e}")
+
+    def _drop(self, plates):
+        with self._lock:
+            self.stats["invalidations"] += 1
+            self._generation += 1
+            if plates is None:
+                self.entries.clear()
+                return
+            for plate in plates:
+                self.entries.pop(plate, None)
+
+    def _query(self, plate):
+        from ..extensions import db
+        from ..models.plate import Plate
+        from ..models.user import User
+
+        row = db.session.execute(
+            db.select(User.id, User.email, User.first_name, User.last_name)
+            .join(Plate, Plate.user_id == User.id)
+            .where(Plate.plate == plate)
+        ).one_or_none()
+        return self._user_dict(*row) if row else None
+
+    def _query_many(self, plates):
+        from ..extensions import db
+        from ..models.plate import Plate
+        from ..models.user import User
+
+        owners = dict.fromkeys(plates)
+        rows = db.session.execute(
+            db.select(Plate.plate, User.id, User.email, User.first_name, User.last_name)
+            .join(User, Plate.user_id == User.id)
+            .where(Plate.plate.in_(owners))
+        ).all()
+        for plate, user_id, email, first_name, last_name in rows:
+            owners[plate] = self._user_dict(user_id, email, first_name, last_name)
+        return owners
+
+    @staticmethod
+    def _user_dict(user_id, email, first_name, last_name):
+        return {"id": user_id, "email": email, "first_name": first_name, "last_name": last_name}
+
+    def _start_listener(self):
+        # Started on first use so it runs in the worker process, after gunicorn forks
+        if self._listener is not None:
+            return
+
+        with self._lock:
+            if self._listener is not None:
+                return
+            with self._app.app_context():
+                from ..extensions import db
+                engine = db.engine
+
+            if engine.dialect.name != "postgresql":
+                self._listener = False
+                return
+
+            self._listener = threading.Thread(target=self._listen, args=(engine,), name="PlateCacheListener", daemon=True)
+            self._listener.start()
+
+    def _listen(self, engine):
+        while True:
+            connection = None
+            try:
+                connection = engine.raw_connection()
+                # The connection is kept by the listener, it does not go back to the pool
+                connection.detach()
+                dbapi_connection = connection.driver_connection
+                dbapi_connection.autocommit = True
+                dbapi_connection.cursor().execute(f"LISTEN {self.channel}")
+                self._app.logger.info("Plate cache listening for invalidations")
+
+                # Invalidations may have been missed while not listening
+                with self._app.app_context():
+                    self.load()
+
+                while True:
+                    if select.select([dbapi_connection], [], [], 5) == ([], [], []):
+                        continue
+                    dbapi_connection.poll()
+                    while dbapi_connection.notifies:
+                        notify = dbapi_connection.notifies.pop(0)
+                        self._drop(json.loads(notify.payload))
+            except Exception as e:
+                self._app.logger.error(f"Plate cache listener error, reconnecting: {e}")
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+                time.sleep(5)
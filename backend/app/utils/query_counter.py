@@ -0,0 +1,56 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from ..extensions import db
+
+
+class QueryCounter:
+    """Statements executed while the counter is active"""
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+@contextmanager
+def count_queries():
+    """
+    Counts the SQL statements executed by the app engine inside the block.
+    Must be used inside an app context.
+
+    Example:
+        with count_queries() as counter:
+            client.get('/users')
+        print(counter.count)
+    """
+    counter = QueryCounter()
+    engine = db.engine
+    event.listen(engine, "before_cursor_execute", counter._on_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", counter._on_execute)
+
+
+@contextmanager
+def assert_max_queries(max_queries):
+    """
+    Fails if the block executes more than `max_queries` SQL statements, e.g. to check that a list
+    endpoint runs in a constant number of queries however many rows it returns.
+
+    Raises:
+        AssertionError: With the executed statements, if there are too many.
+    """
+    with count_queries() as counter:
+        yield counter
+
+    if counter.count > max_queries:
+        statements = "\n".join(counter.statements)
+        raise AssertionError(f"Expected at most {max_queries} queries, {counter.count} executed:\n{statements}")
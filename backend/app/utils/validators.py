@@ -1,6 +1,9 @@
 import re
 from marshmallow import ValidationError
 
+# Matrícula: 4 números y 3 letras sin vocales, con C opcional delante
+PLATE_REGEX = re.compile(r'^(C?\d{4}[B-DF-HJ-NP-RSTV-Z]{3})$')
+
 def validate_password(value):
     # Check minimum length
     if len(value) < 8:
@@ -25,5 +28,5 @@ def validate_password(value):
 
 def validate_plate(value):
     # Validar el formato de la matrícula (6-7 caracteres, solo letras mayúsculas y números)
-    if not re.match(r'^(C?\d{4}[B-DF-HJ-NP-RSTV-Z]{3})$', value):
+    if not PLATE_REGEX.match(value):
         raise ValidationError('Formato inválido')
\ No newline at end of file
@@ -0,0 +1,78 @@
+import json
+import os
+from datetime import datetime, timezone
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from .validators import PLATE_REGEX
+
+FAST_VERIFY_PATH = "/verify_plate/fast"
+
+
+class VerifyService:
+    """
+    WSGI middleware that answers POST /verify_plate/fast before the request reaches Flask, for the
+    gates. It does the same verification as /verify_plate without the Flask request handling
+    (routing, CORS and JWT hooks, marshmallow, error handlers): the plate is checked once with the
+    precompiled regex and only the plate and the decision are returned, as the gates only read
+    `allowed`. Every other request is passed to the Flask app.
+
+    Request: {"plate": "1234BCD", "date": "2024-01-01T10:00:00Z"} (date optional, UTC)
+    Response: {"plate": "1234BCD", "allowed": true}
+    """
+
+    def __init__(self, app, wsgi_app):
+        self.app = app
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        if environ.get("PATH_INFO") != FAST_VERIFY_PATH or environ.get("REQUEST_METHOD") != "POST":
+            return self.wsgi_app(environ, start_response)
+
+        try:
+            status, body = self.verify(environ)
+        except SQLAlchemyError as e:
+            self.app.logger.error(f"Fast verification failed: {e}")
+            status, body = "500 INTERNAL SERVER ERROR", {"error": "Database error"}
+        except Exception as e:
+            self.app.logger.exception(f"Fast verification failed: {e}")
+            status, body = "500 INTERNAL SERVER ERROR", {"error": "Internal server error"}
+
+        payload = json.dumps(body).encode()
+        start_response(status, [("Content-Type", "application/json"), ("Content-Length", str(len(payload)))])
+        return [payload]
+
+    def verify(self, environ):
+        from ..extensions import history_writer, plate_cache
+        from ..schemas.history import VERIFY_PLATE_DATE_FORMAT
+
+        # API-KEY header (the WSGI server turns the dash into an underscore)
+        if environ.get("HTTP_API_KEY") != os.getenv("FLASK_API_KEY"):
+            return "403 FORBIDDEN", {"error": "Unauthorized. Invalid API_KEY."}
+
+        try:
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+            data = json.loads(environ["wsgi.input"].read(length)) if length else None
+        except ValueError:
+            data = None
+
+        plate = data.get("plate") if isinstance(data, dict) else None
+        if not isinstance(plate, str) or not PLATE_REGEX.match(plate):
+            return "400 BAD REQUEST", {"error": {"plate": ["Formato inválido"]}}
+
+        date = data.get("date")
+        if date is None:
+            date = datetime.now(timezone.utc)
+        else:
+            try:
+                date = datetime.strptime(date, VERIFY_PLATE_DATE_FORMAT).replace(tzinfo=timezone.utc)
+            except (TypeError, ValueError):
+                return "400 BAD REQUEST", {"error": {"date": ["Not a valid datetime."]}}
+
+        # The app context gives a database session, removed when it is popped, to the plate cache misses
+        # and to the history writer when it commits synchronously (HISTORY_WRITER_ENABLED=false)
+        with self.app.app_context():
+            owner = plate_cache.get(plate)
+            history_writer.add(plate=plate, date=date, allowed=owner is not None, user_id=owner["id"] if owner else None)
+
+        return "200 OK", {"plate": plate, "allowed": owner is not None}
@@ -0,0 +1,181 @@
+"""
+Seeds a database with thousands of users, plates and history records and measures the number of
+SQL queries and the latency of the list endpoints, to check that they run in a constant number of
+queries however many rows they return.
+
+Usage:
+    python bench/bench_queries.py --users 5000 --plates-per-user 2 --history 20000
+
+By default a new SQLite database is created in a temporary directory. Pass --database-uri to use
+another (empty) database, e.g. a local PostgreSQL.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+
+# Add backend directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+PLATE_LETTERS = "BCDFGHJKLMNPRSTVWXYZ"
+
+# Endpoints measured, the <user_id> placeholder is replaced by the id of a seeded user
+ENDPOINTS = [
+    "/users",
+    "/users/<user_id>",
+    "/plates",
+    "/history",
+    "/history?limit=100",
+    "/users/<user_id>/history",
+    "/users/<user_id>/history?limit=100",
+]
+
+
+def plate_number(index):
+    """Returns a unique plate with the format validated by the schemas (4 digits and 3 letters)"""
+    letters = ""
+    rest = index // 10000
+    for _ in range(3):
+        letters += PLATE_LETTERS[rest % len(PLATE_LETTERS)]
+        rest //= len(PLATE_LETTERS)
+    return f"{index % 10000:04d}{letters}"
+
+
+def seed(db, args):
+    """Inserts the users, plates and history records with bulk inserts and returns the seeded user IDs"""
+    from app import create_roles, create_admin
+    from app.extensions import bcrypt
+    from app.models.history import History
+    from app.models.plate import Plate
+    from app.models.role import Role
+    from app.models.user import User
+
+    db.create_all()
+    create_roles()
+    create_admin()
+    user_role_id = db.session.execute(
+        db.select(Role.id).where(Role.name == os.getenv("FLASK_USER_ROLE"))
+    ).scalar_one()
+
+    # Hashing thousands of passwords would take minutes, every user gets the same hash
+    password_hash = bcrypt.generate_password_hash("Password123#").decode('utf-8')
+    db.session.execute(db.insert(User), [
+        {
+            "email": f"user{i}@example.com", "first_name": "Bench", "last_name": f"User {chr(65 + i % 26)}",
+            "password_hash": password_hash, "role_id": user_role_id,
+        }
+        for i in range(args.users)
+    ])
+    user_ids = db.session.execute(
+        db.select(User.id).where(User.role_id == user_role_id).order_by(User.id)
+    ).scalars().all()
+
+    plates = [
+        {"plate": plate_number(i * args.plates_per_user + j), "user_id": user_id}
+        for i, user_id in enumerate(user_ids) for j in range(args.plates_per_user)
+    ]
+    db.session.execute(db.insert(Plate), plates)
+
+    start = datetime.now(timezone.utc) - timedelta(days=30)
+    history = [
+        {
+            "plate": plates[i % len(plates)]["plate"],
+            "date": start + timedelta(seconds=i * 30),
+            "allowed": True,
+            "user_id": plates[i % len(plates)]["user_id"],
+        }
+        for i in range(args.history)
+    ]
+    if history:
+        db.session.execute(db.insert(History), history)
+    db.session.commit()
+    return user_ids
+
+
+def measure(app, client, headers, url, repeat):
+    """Returns the queries of one request and the latencies of `repeat` requests"""
+    from app.utils.query_counter import count_queries
+
+    latencies = []
+    with app.app_context():
+        for _ in range(repeat):
+            with count_queries() as counter:
+                start = time.perf_counter()
+                response = client.get(url, headers=headers)
+                latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise RuntimeError(f"GET {url} returned {response.status_code}: {response.get_data(as_text=True)}")
+
+    return {
+        "status": response.status_code,
+        "queries": counter.count,
+        "bytes": len(response.get_data()),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "max_ms": round(max(latencies), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query count and latency benchmark of the list endpoints')
+    parser.add_argument('--users', type=int, default=5000, help='Users seeded')
+    parser.add_argument('--plates-per-user', type=int, default=2, help='Plates seeded per user')
+    parser.add_argument('--history', type=int, default=20000, help='History records seeded')
+    parser.add_argument('--repeat', type=int, default=5, help='Requests per endpoint')
+    parser.add_argument('--database-uri', help='Database to seed, must be empty (a temporary SQLite database if not given)')
+    parser.add_argument('--output', help='File where the JSON report is written (stdout if not given)')
+    args = parser.parse_args()
+
+    # The environment must be ready before importing the app, the routes read the role names on import
+    load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+    database_uri = args.database_uri or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ["FLASK_SQLALCHEMY_DATABASE_URI"] = database_uri
+    os.environ["FLASK_JWT_TOKEN_LOCATION"] = '["headers"]'
+    os.environ["FLASK_PLATE_CACHE_ENABLED"] = "false"
+
+    from app import create_app
+    from app.extensions import db
+    from app.utils.auth_utils import create_user_access_token
+
+    app = create_app()
+    with app.app_context():
+        start = time.perf_counter()
+        user_ids = seed(db, args)
+        seed_seconds = time.perf_counter() - start
+
+        from app.models.user import User
+        admin_id = db.session.execute(
+            db.select(User.id).where(User.email == os.getenv("FLASK_ADMIN_EMAIL"))
+        ).scalar_one()
+        headers = {"Authorization": f"Bearer {create_user_access_token(admin_id, os.getenv('FLASK_ADMIN_ROLE'))}"}
+
+    client = app.test_client()
+    user_id = user_ids[len(user_ids) // 2]
+    results = {}
+    for endpoint in ENDPOINTS:
+        url = endpoint.replace("<user_id>", str(user_id))
+        results[url] = measure(app, client, headers, url, args.repeat)
+
+    report = {
+        "database": database_uri.split(":")[0],
+        "users": args.users,
+        "plates": args.users * args.plates_per_user,
+        "history": args.history,
+        "seed_seconds": round(seed_seconds, 2),
+        "endpoints": results,
+    }
+    report_json = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report_json)
+    else:
+        print(report_json)
+
+
+if __name__ == '__main__':
+    main()
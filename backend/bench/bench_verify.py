@@ -0,0 +1,134 @@
+"""
+Compares the latency of POST /verify_plate and the lean POST /verify_plate/fast, calling both in
+process with the Flask test client, so only the time spent in the app is measured (no network or
+server). Half of the plates sent are registered, and
+the plate cache is warm for all of them.
+
+It also sends the same plates to POST /verify_plates in batches of --batch-size, and reports the
+time per plate, i.e. what a verifier micro-batching the plates of several gates costs the backend.
+
+Usage:
+    python bench/bench_verify.py --requests 5000 --batch-size 8
+
+For the latency through gunicorn, use load_verify_plate.py with --path.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+# Add backend directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_queries import plate_number, seed
+
+ENDPOINTS = ["/verify_plate", "/verify_plate/fast"]
+
+
+def percentile(samples, percent):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(percent / 100 * (len(samples) - 1))))]
+
+
+def measure(client, url, plates, requests, headers):
+    latencies = []
+    for i in range(requests):
+        body = {"plate": plates[i % len(plates)], "date": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")}
+        start = time.perf_counter()
+        response = client.post(url, json=body, headers=headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f"POST {url} returned {response.status_code}: {response.get_data(as_text=True)}")
+
+    return {
+        "requests": requests,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+        "bytes": len(response.get_data()),
+    }
+
+
+def measure_batch(client, plates, requests, batch_size, headers):
+    date = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    latencies = []
+    for i in range(0, requests, batch_size):
+        body = {"verifications": [
+            {"plate": plates[j % len(plates)], "date": date} for j in range(i, min(i + batch_size, requests))
+        ]}
+        start = time.perf_counter()
+        response = client.post("/verify_plates", json=body, headers=headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f"POST /verify_plates returned {response.status_code}: {response.get_data(as_text=True)}")
+
+    return {
+        "requests": len(latencies),
+        "batch_size": batch_size,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms_per_plate": round(sum(latencies) / requests, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency of /verify_plate against /verify_plate/fast')
+    parser.add_argument('--requests', type=int, default=5000, help='Requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=200, help='Requests per endpoint before measuring')
+    parser.add_argument('--batch-size', type=int, default=8, help='Plates per /verify_plates request')
+    parser.add_argument('--users', type=int, default=1000, help='Users seeded, with 2 plates each')
+    parser.add_argument('--output', help='File where the JSON report is written (stdout if not given)')
+    args = parser.parse_args()
+
+    load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+    workdir = tempfile.mkdtemp()
+    os.environ["FLASK_SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["FLASK_HISTORY_SPOOL_DIR"] = os.path.join(workdir, 'history_spool')
+
+    from app import create_app
+    from app.extensions import db, history_writer, plate_cache
+
+    app = create_app()
+    with app.app_context():
+        seed(db, argparse.Namespace(users=args.users, plates_per_user=2, history=0))
+
+    # Registered and unregistered plates
+    registered = [plate_number(i) for i in range(args.users * 2)]
+    unregistered = [plate_number(args.users * 2 + i) for i in range(args.users * 2)]
+    plates = [plate for pair in zip(registered, unregistered) for plate in pair]
+    random.shuffle(plates)
+
+    client = app.test_client()
+    headers = {"API-KEY": os.getenv("FLASK_API_KEY")}
+    # Both endpoints are measured with the plate cache warm for every plate, as in production
+    with app.app_context():
+        plate_cache.load()
+    measure(client, ENDPOINTS[0], plates, len(plates), headers)
+
+    results = {}
+    for url in ENDPOINTS:
+        measure(client, url, plates, args.warmup, headers)
+        results[url] = measure(client, url, plates, args.requests, headers)
+    measure_batch(client, plates, args.warmup, args.batch_size, headers)
+    results["/verify_plates"] = measure_batch(client, plates, args.requests, args.batch_size, headers)
+    history_writer.close()
+
+    report = {"plates": len(plates), "endpoints": results}
+    report_json = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report_json)
+    else:
+        print(report_json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Load test of POST /verify_plate (or /verify_plate/fast with --path): concurrent clients send verifications with keep-alive connections
+for a fixed time and the throughput and latency percentiles are reported.
+
+Against a running server:
+    python bench/load_verify_plate.py --url http://localhost:5000 --clients 32 --duration 20
+
+Starting gunicorn (gunicorn.conf.py) with a different number of workers per run, to check that the
+throughput scales with the CPU cores:
+    python bench/load_verify_plate.py --spawn-workers 1,2,4 --clients 32 --duration 20
+
+The server uses the database of the environment (FLASK_SQLALCHEMY_DATABASE_URI). The plates sent
+are taken from --plates, or random plates if not given.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.parse
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+PLATE_LETTERS = "BCDFGHJKLMNPRSTVWXYZ"
+
+
+def percentile(samples, percent):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(percent / 100 * (len(samples) - 1))))]
+
+
+def random_plate():
+    return f"{random.randint(0, 9999):04d}" + "".join(random.choice(PLATE_LETTERS) for _ in range(3))
+
+
+def run_client(url, path, api_key, plates, duration, results):
+    """Sends verifications one after the other on a keep-alive connection until the time is up"""
+    parsed = urllib.parse.urlparse(url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+    headers = {"Content-Type": "application/json", "API-KEY": api_key}
+
+    latencies = []
+    errors = 0
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        body = json.dumps({
+            "plate": random.choice(plates) if plates else random_plate(),
+            "date": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        })
+        start = time.perf_counter()
+        try:
+            connection.request("POST", path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+                continue
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    connection.close()
+    results.put((latencies, errors))
+
+
+def run_load(url, path, api_key, plates, clients, duration):
+    # Every client is a process, so the clients themselves are not limited by the GIL
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=run_client, args=(url, path, api_key, plates, duration, results))
+        for _ in range(clients)
+    ]
+    for process in processes:
+        process.start()
+
+    latencies = []
+    errors = 0
+    for _ in processes:
+        client_latencies, client_errors = results.get()
+        latencies.extend(client_latencies)
+        errors += client_errors
+    for process in processes:
+        process.join()
+
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_second": round(len(latencies) / duration, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(max(latencies, default=0.0), 2),
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_ready(port, server, timeout=30):
+    end = time.time() + timeout
+    while time.time() < end:
+        if server.poll() is not None:
+            raise RuntimeError("gunicorn exited before accepting connections")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("gunicorn did not start")
+
+
+def run_with_gunicorn(workers, args, api_key, plates):
+    port = free_port()
+    env = {**os.environ, "GUNICORN_WORKERS": str(workers), "GUNICORN_BIND": f"127.0.0.1:{port}"}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "run:app"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_until_ready(port, server)
+        result = run_load(f"http://127.0.0.1:{port}", args.path, api_key, plates, args.clients, args.duration)
+    finally:
+        # Graceful shutdown, the workers flush the queued history rows
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+    return {"workers": workers, **result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test of POST /verify_plate')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='Base URL of a running server')
+    target.add_argument('--spawn-workers', help='Comma separated numbers of gunicorn workers to start and test, e.g. 1,2,4')
+    parser.add_argument('--path', default='/verify_plate', help='Endpoint tested, e.g. /verify_plate/fast')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent clients')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds of every run')
+    parser.add_argument('--plates', help='File with one plate per line to verify (random plates if not given)')
+    parser.add_argument('--output', help='File where the JSON report is written (stdout if not given)')
+    args = parser.parse_args()
+
+    load_dotenv(os.path.join(BACKEND_DIR, '.env'))
+    api_key = os.getenv("FLASK_API_KEY")
+    plates = []
+    if args.plates:
+        with open(args.plates) as f:
+            plates = [line.strip() for line in f if line.strip()]
+
+    if args.url:
+        report = {"url": args.url + args.path, **run_load(args.url, args.path, api_key, plates, args.clients, args.duration)}
+    else:
+        report = {
+            "cpu_count": os.cpu_count(),
+            "runs": [run_with_gunicorn(int(workers), args, api_key, plates) for workers in args.spawn_workers.split(",")],
+        }
+
+    report_json = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report_json)
+    else:
+        print(report_json)
+
+
+if __name__ == '__main__':
+    main()
@@ -12,4 +12,5 @@ echo "Ejecutando init_app.py..."
 python init_app.py
 
 echo "Iniciando servidor Flask..."
-exec gunicorn -b 0.0.0.0:5000 run:app
+# Workers, threads y apagado ordenado en gunicorn.conf.py
+exec gunicorn -c gunicorn.conf.py run:app
@@ -0,0 +1,34 @@
+"""
+Gunicorn configuration of the backend, used by entrypoint.sh:
+
+    gunicorn -c gunicorn.conf.py run:app
+
+Every worker process serves GUNICORN_THREADS requests at the same time with gthread workers. The
+request threads mostly wait for the database and bcrypt releases the GIL, so threads are enough
+and no monkey patching (gevent) is needed. One worker per CPU core lets /verify_plate scale with
+the cores.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+worker_class = "gthread"
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+
+# Keep-alive connections from the gate verifier and the frontend
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+# On SIGTERM (docker stop) the workers finish the requests in progress within this time
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 20))
+
+accesslog = os.getenv("GUNICORN_ACCESSLOG")
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOGLEVEL", "info")
+
+
+def worker_exit(server, worker):
+    # Insert the history rows still queued by this worker before it exits
+    from app.extensions import history_writer
+
+    history_writer.close()
@@ -4,6 +4,9 @@ from app.models.user import User
 from app.extensions import db
 import os
 
+# Monthly history partitions kept created in advance (see the migration 4b8d2f61a9c3)
+HISTORY_PARTITION_MONTHS_AHEAD = 12
+
 def create_roles():
     if not Role.query.filter_by(name=os.getenv("FLASK_ADMIN_ROLE")).first():
         db.session.add(Role(name=os.getenv("FLASK_ADMIN_ROLE")))
@@ -37,8 +40,24 @@ def create_admin():
             db.session.add(new_admin)
             db.session.commit()
 
+def create_history_partitions():
+    # Only if the history table was partitioned (HISTORY_PARTITIONING=monthly). The rows of the
+    # months that went to the default partition are moved to their new partitions
+    exists = db.session.execute(
+        db.text("SELECT to_regprocedure('create_history_partitions(date, integer)') IS NOT NULL")
+    ).scalar() if db.engine.dialect.name == "postgresql" else False
+    if not exists:
+        return
+
+    db.session.execute(
+        db.text("SELECT create_history_partitions(now()::date, :months_ahead)"),
+        {"months_ahead": HISTORY_PARTITION_MONTHS_AHEAD}
+    )
+    db.session.commit()
+
 if __name__ == "__main__":
     app = create_app()
     with app.app_context():
         create_roles()  # Crea los roles si no existen
         create_admin()  # Crea el admin si no existe
+        create_history_partitions()  # Crea las particiones del historial de los próximos meses
@@ -0,0 +1,172 @@
+"""history timestamp and indexes
+
+Converts history.date from a string to a timestamp with time zone, adds the indexes used by the
+history and plate queries, and, if HISTORY_PARTITIONING=monthly is set when upgrading a
+PostgreSQL database, turns history into a table partitioned by month.
+
+Revision ID: 4b8d2f61a9c3
+Revises: e7b19960cf6c
+Create Date: 2026-10-18 17:45:00.000000
+
+"""
+from datetime import datetime, timezone
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b8d2f61a9c3'
+down_revision = 'e7b19960cf6c'
+branch_labels = None
+depends_on = None
+
+
+HISTORY_INDEXES = [
+    # /history sorted by date, with date range filters
+    ('ix_history_date_id', ['date', 'id']),
+    # /users/<id>/history
+    ('ix_history_user_id_date', ['user_id', 'date']),
+    # /history?plate=
+    ('ix_history_plate_date', ['plate', 'date']),
+]
+
+# Monthly partitions created in advance. Rows of later months go to the default partition until
+# `create_history_partitions` is run again (init_app.py runs it on every start), which moves them
+# to their new partitions
+PARTITION_MONTHS_AHEAD = 12
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'postgresql':
+        # Every date was stored in UTC, with or without the trailing Z
+        op.execute("ALTER TABLE history ALTER COLUMN date TYPE TIMESTAMP WITH TIME ZONE USING (date::timestamp AT TIME ZONE 'UTC')")
+    else:
+        # SQLite columns are not typed (changing the type would CAST the text to a number),
+        # only the dates are rewritten in the format SQLAlchemy reads back
+        backfill_dates(bind)
+
+    if bind.dialect.name == 'postgresql' and os.getenv('HISTORY_PARTITIONING') == 'monthly':
+        partition_history()
+    else:
+        for name, columns in HISTORY_INDEXES:
+            op.create_index(name, 'history', columns)
+
+    op.create_index('ix_plate_user_id', 'plate', ['user_id'])
+
+
+def downgrade():
+    bind = op.get_bind()
+
+    op.drop_index('ix_plate_user_id', table_name='plate')
+
+    if bind.dialect.name == 'postgresql' and is_partitioned(bind):
+        unpartition_history()
+    else:
+        for name, _ in HISTORY_INDEXES:
+            op.drop_index(name, table_name='history')
+
+    if bind.dialect.name == 'postgresql':
+        op.execute("ALTER TABLE history ALTER COLUMN date TYPE VARCHAR(25) USING to_char(date AT TIME ZONE 'UTC', 'YYYY-MM-DD\"T\"HH24:MI:SS\"Z\"')")
+
+
+def backfill_dates(bind):
+    history = sa.table('history', sa.column('id', sa.Integer), sa.column('date', sa.String))
+    for history_id, date in bind.execute(sa.select(history.c.id, history.c.date)).all():
+        parsed = datetime.fromisoformat(date.replace('Z', '+00:00'))
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        bind.execute(
+            history.update().where(history.c.id == history_id),
+            {"date": parsed.strftime('%Y-%m-%d %H:%M:%S.%f')}
+        )
+
+
+def is_partitioned(bind):
+    return bind.execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'history'::regclass)"
+    )).scalar()
+
+
+def partition_history():
+    op.execute("ALTER TABLE history RENAME TO history_unpartitioned")
+    op.execute("ALTER TABLE history_unpartitioned RENAME CONSTRAINT history_pkey TO history_unpartitioned_pkey")
+
+    # The partition key must be part of the primary key
+    op.execute("""
+        CREATE TABLE history (
+            id INTEGER NOT NULL DEFAULT nextval('history_id_seq'),
+            plate VARCHAR(20) NOT NULL,
+            date TIMESTAMP WITH TIME ZONE NOT NULL,
+            user_id INTEGER REFERENCES "user" (id),
+            allowed BOOLEAN NOT NULL,
+            PRIMARY KEY (id, date)
+        ) PARTITION BY RANGE (date)
+    """)
+    op.execute("ALTER SEQUENCE history_id_seq OWNED BY history.id")
+    op.execute("CREATE TABLE history_default PARTITION OF history DEFAULT")
+
+    # Creates the missing monthly partitions from the given month until `months_ahead` months from now.
+    # PostgreSQL refuses to create a partition for a month that already has rows in the default
+    # partition, so every new partition is created as a plain table, the rows of its month are moved
+    # into it from the default partition and then it is attached
+    op.execute("""
+        CREATE OR REPLACE FUNCTION create_history_partitions(start_month DATE, months_ahead INTEGER)
+        RETURNS VOID AS $$
+        DECLARE
+            month DATE := date_trunc('month', start_month);
+            last_month DATE := date_trunc('month', now() + make_interval(months => months_ahead));
+            partition_name TEXT;
+        BEGIN
+            WHILE month <= last_month LOOP
+                partition_name := 'history_' || to_char(month, 'YYYY_MM');
+                IF to_regclass(partition_name) IS NULL THEN
+                    EXECUTE format('CREATE TABLE %I (LIKE history INCLUDING DEFAULTS)', partition_name);
+                    EXECUTE format(
+                        'WITH moved AS (DELETE FROM history_default WHERE date >= %L AND date < %L RETURNING *) ' ||
+                        'INSERT INTO %I SELECT * FROM moved',
+                        month, month + INTERVAL '1 month', partition_name
+                    );
+                    EXECUTE format(
+                        'ALTER TABLE history ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                        partition_name, month, month + INTERVAL '1 month'
+                    );
+                END IF;
+                month := month + INTERVAL '1 month';
+            END LOOP;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute(f"""
+        SELECT create_history_partitions(
+            COALESCE((SELECT min(date) FROM history_unpartitioned), now())::date,
+            {PARTITION_MONTHS_AHEAD}
+        )
+    """)
+
+    op.execute("INSERT INTO history (id, plate, date, user_id, allowed) SELECT id, plate, date, user_id, allowed FROM history_unpartitioned")
+    op.execute("DROP TABLE history_unpartitioned")
+
+    # Indexes on the partitioned table are created on every partition
+    for name, columns in HISTORY_INDEXES:
+        op.create_index(name, 'history', columns)
+
+
+def unpartition_history():
+    op.execute("ALTER TABLE history RENAME TO history_partitioned")
+    op.execute("""
+        CREATE TABLE history (
+            id INTEGER NOT NULL DEFAULT nextval('history_id_seq') PRIMARY KEY,
+            plate VARCHAR(20) NOT NULL,
+            date TIMESTAMP WITH TIME ZONE NOT NULL,
+            user_id INTEGER REFERENCES "user" (id),
+            allowed BOOLEAN NOT NULL
+        )
+    """)
+    op.execute("ALTER SEQUENCE history_id_seq OWNED BY history.id")
+    op.execute("INSERT INTO history (id, plate, date, user_id, allowed) SELECT id, plate, date, user_id, allowed FROM history_partitioned")
+    op.execute("DROP TABLE history_partitioned")
+    op.execute("DROP FUNCTION IF EXISTS create_history_partitions(DATE, INTEGER)")
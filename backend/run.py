@@ -6,6 +6,7 @@ import logging
 load_dotenv()
 app = create_app()
 
+# Development server, in production the app is served by gunicorn (see gunicorn.conf.py)
 if __name__ == '__main__':
     debug_mode = os.getenv("FLASK_DEBUG", "False").lower() in ("true", "1", "yes")
     
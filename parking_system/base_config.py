@@ -20,14 +20,103 @@ class BaseConfig:
     DETECTOR_QUEUE_NAME="detector_queue"
     VERIFIER_QUEUE_NAME="verification_queue"
 
+    # Messages published by a background thread with publisher confirms, so a RabbitMQ outage
+    # doesn't block the detector or the verifier: up to AMQP_PUBLISH_BUFFER_SIZE unsent messages
+    # are kept while it reconnects
+    AMQP_PUBLISHER_CONFIRMS=True
+    # Messages published together, waiting at most AMQP_PUBLISH_BATCH_INTERVAL seconds (1 for no batching)
+    AMQP_PUBLISH_BATCH_SIZE=1
+    AMQP_PUBLISH_BATCH_INTERVAL=0.005
+    AMQP_PUBLISH_BUFFER_SIZE=1000
+    # Seconds a reply waits for its confirm before the received message is requeued
+    AMQP_PUBLISH_TIMEOUT=10
+    # Queues declared durable whose messages survive a broker restart, the rest are transient.
+    # A queue that already exists as non-durable must be deleted before adding it here
+    AMQP_PERSISTENT_QUEUES=()
+
+    # Detector inference backend: "edgetpu", "cpu", "xnnpack" or "cpu_int8"
+    DETECTOR_BACKEND="edgetpu"
+    # Backend used if the configured one can't be started (e.g. no Coral connected), None to fail
+    DETECTOR_FALLBACK_BACKEND="cpu_int8"
+    # CPU threads of the interpreter, None to use every core
+    DETECTOR_NUM_THREADS=None
+    DETECTOR_MODEL_FILES = {
+        "edgetpu": "license-detector_edgetpu.tflite",
+        "cpu": "license-detector_float.tflite",
+        "xnnpack": "license-detector_float.tflite",
+        "cpu_int8": "license-detector.tflite",
+    }
+
     DETECTION_MIN_CONFIDENCE=0.9
+    # One plate per lane seen by the camera
+    DETECTION_MAX_PLATES=2
+    DETECTION_NMS_IOU_THRESHOLD=0.5
     OCR_MIN_CONFIDENCE=0.9
+    OCR_BATCH_SIZE=4
+    # Skip PaddleOCR text detection, the detector already crops the plate
+    OCR_RECOGNITION_ONLY=True
 
-    API_URL="http://localhost:5000/verify_plate"
+    # Verification of a single plate (without micro-batching). /verify_plate/fast answers only plate
+    # and allowed, which is all the gates read, with less latency than /verify_plate
+    API_URL="http://localhost:5000/verify_plate/fast"
     API_KEY="secret-api-key"
+    # Seconds the verifier waits for the backend
+    API_TIMEOUT=5
+    # Verifications in progress at the same time, and messages the broker delivers ahead of them
+    VERIFIER_WORKERS=8
+    VERIFIER_PREFETCH=16
+    # The plates received within VERIFY_BATCH_MAX_DELAY seconds are verified with one call to
+    # /verify_plates. Every verification in progress holds a worker, so batches are at most VERIFIER_WORKERS
+    VERIFY_BATCH_ENABLED=True
+    VERIFY_BATCH_URL="http://localhost:5000/verify_plates"
+    VERIFY_BATCH_MAX_SIZE=8
+    VERIFY_BATCH_MAX_DELAY=0.005
+
+    # Decisions cached by the verifier (seconds), the gates are answered without the backend
+    DECISION_CACHE_ENABLED=True
+    DECISION_POSITIVE_TTL=60
+    DECISION_NEGATIVE_TTL=10
+    DECISION_CACHE_MAX_SIZE=10000
+    # Allowed plates pulled from the backend, used to answer while the backend is down
+    ALLOWLIST_URL="http://localhost:5000/plates/allowlist"
+    ALLOWLIST_SYNC_INTERVAL=60
+    ALLOWLIST_SNAPSHOT_PATH="verifier_allowlist.json"
+    # Verifications answered without the backend, uploaded in batches to its history
+    HISTORY_UPLOAD_URL="http://localhost:5000/history/upload"
+    HISTORY_UPLOAD_INTERVAL=5
+    HISTORY_UPLOAD_BATCH_SIZE=500
+    HISTORY_UPLOAD_SPOOL="verifier_history_spool.jsonl"
+
+    # Detection pipeline
+    VERIFY_QUEUE_SIZE=4
+    VERIFY_TIMEOUT=5
+    NO_PLATE_TIMEOUT_FRAMES=25
+    TIME_LAST_DETECT_THRESHOLD=3
+    TRACKER_IOU_THRESHOLD=0.3
+    TRACKER_MIN_VOTES=3
+    TRACKER_MIN_AGREEMENT=0.6
+    TRACKER_MAX_OCR_CALLS=12
+    PIPELINE_STATS_INTERVAL=10
+
+    # Only run the detector while something moves in front of the camera
+    MOTION_GATE_ENABLED=True
+    # Region checked for motion as (x, y, width, height) fractions of the frame, None for the whole frame
+    MOTION_ROI=None
+    MOTION_DOWNSCALE_WIDTH=160
+    MOTION_PIXEL_THRESHOLD=25
+    MOTION_MIN_CHANGED_FRACTION=0.005
+    MOTION_HOLD_SECONDS=2
+    # Frames per second processed without motion and with motion (None for every captured frame)
+    IDLE_FPS=2
+    ACTIVE_FPS=None
 
     USE_PI_CAMERA=False
+    # Capture RGB frames with the Pi camera, so they are not converted for the detector (the plate
+    # crops are converted back to BGR for the OCR, which only touches the small ROIs)
+    PI_CAMERA_RGB_FRAMES=True
     WEBCAM_INDEX_OR_URL=0
+    # Captured frames waiting for the detector, older ones are dropped if it falls behind
+    CAMERA_BUFFER_SIZE=2
 
     SCREEN_MESSAGES = {
         ScreenMessageKey.DETECTING: "Esperando matrícula",
@@ -0,0 +1,275 @@
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import wait
+
+# Add project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from logging_module.logger_setup import setup_logger
+from parking_system.base_config import BaseConfig
+from parking_system.communication.aio_msg import (
+    AioAMQPTransport, AioMQTTTransport, AioMsgDisp, InMemoryBroker, InMemoryTransport
+)
+
+REQUEST_QUEUE = "bench_requests"
+REPLY_QUEUE = "bench_replies"
+TOPIC = "bench_topic"
+
+
+def percentile(samples, percent):
+    """
+    Args:
+        samples (list of float): The samples.
+        percent (float): Percentile between 0 and 100.
+
+    Returns:
+        float: The value at the given percentile, or 0 if there are no samples.
+    """
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(percent / 100 * (len(samples) - 1))))]
+
+
+def summarize(latencies, elapsed, sent):
+    latencies_ms = [latency * 1000 for latency in latencies]
+    return {
+        "sent": sent,
+        "received": len(latencies_ms),
+        "messages_per_second": round(len(latencies_ms) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies_ms, 50), 3),
+        "p95_ms": round(percentile(latencies_ms, 95), 3),
+        "p99_ms": round(percentile(latencies_ms, 99), 3),
+        "mean_ms": round(sum(latencies_ms) / len(latencies_ms), 3) if latencies_ms else 0.0,
+    }
+
+
+def echo(message):
+    return message
+
+
+async def run_async_requests(make_transport, args):
+    """
+    Request/reply round-trips with `AioMsgDisp`: a responder echoes every request and a requester
+    keeps `concurrency` requests in flight, all on one event loop.
+    """
+    responder = AioMsgDisp(make_transport(), REPLY_QUEUE, REQUEST_QUEUE, echo,
+                           reply_to_received_message=True, handler_concurrency=args.concurrency)
+    requester = AioMsgDisp(make_transport(), REQUEST_QUEUE, REPLY_QUEUE)
+    await responder.connect()
+    await requester.connect()
+    responding = asyncio.create_task(responder.wait_and_receive_msg())
+
+    latencies = []
+    in_flight = asyncio.Semaphore(args.concurrency)
+
+    async def request(index):
+        async with in_flight:
+            start = time.perf_counter()
+            try:
+                await requester.send_request(str(index), timeout=args.timeout)
+            except TimeoutError:
+                return
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(request(index) for index in range(args.messages)))
+    elapsed = time.perf_counter() - start
+
+    responding.cancel()
+    await requester.close()
+    await responder.close()
+    return summarize(latencies, elapsed, args.messages)
+
+
+async def run_async_one_way(make_transport, args):
+    """
+    One-way latency with `AioMsgDisp`: every message carries the time it was sent.
+    """
+    latencies = []
+    done = asyncio.Event()
+
+    def record(body):
+        latencies.append(time.perf_counter() - float(body))
+        if len(latencies) == args.messages:
+            done.set()
+
+    receiver = AioMsgDisp(make_transport(), None, TOPIC, record)
+    sender = AioMsgDisp(make_transport(), TOPIC, None)
+    await receiver.connect()
+    await sender.connect()
+    receiving = asyncio.create_task(receiver.wait_and_receive_msg())
+
+    start = time.perf_counter()
+    for _ in range(args.messages):
+        await sender.send_msg(repr(time.perf_counter()))
+        if args.interval:
+            await asyncio.sleep(args.interval)
+    try:
+        await asyncio.wait_for(done.wait(), args.timeout)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - start
+
+    receiving.cancel()
+    await sender.close()
+    await receiver.close()
+    return summarize(latencies, elapsed, args.messages)
+
+
+def run_sync_amqp_requests(args):
+    """
+    The same round-trips with the current `AMQP_Msg_Disp`: the responder consumes in its own
+    thread and the requester uses the non-blocking `send_request` with its I/O thread.
+    """
+    from parking_system.communication.amqp_msg import AMQP_Msg_Disp
+
+    responder = AMQP_Msg_Disp(
+        args.host, args.port, REPLY_QUEUE, REQUEST_QUEUE, echo,
+        stop_consuming_after_received_message=False, reply_to_received_message=True
+    )
+    # The responder consumes until the process exits
+    threading.Thread(target=responder.wait_and_receive_msg, daemon=True).start()
+    requester = AMQP_Msg_Disp(
+        args.host, args.port, REQUEST_QUEUE, REPLY_QUEUE, None,
+        stop_consuming_after_received_message=False, reply_to_received_message=False
+    )
+
+    latencies = []
+    in_flight = threading.BoundedSemaphore(args.concurrency)
+
+    def on_reply(start, future):
+        if future.exception() is None:
+            latencies.append(time.perf_counter() - start)
+        in_flight.release()
+
+    futures = []
+    start = time.perf_counter()
+    for index in range(args.messages):
+        in_flight.acquire()
+        sent = time.perf_counter()
+        future = requester.send_request(str(index), timeout=args.timeout)
+        future.add_done_callback(functools.partial(on_reply, sent))
+        futures.append(future)
+    wait(futures)
+    elapsed = time.perf_counter() - start
+
+    requester.close()
+    return summarize(latencies, elapsed, args.messages)
+
+
+def run_sync_mqtt_one_way(args):
+    """
+    The same one-way messages with the current `MQTT_Msg_Disp`.
+    """
+    from parking_system.communication.mqtt_msg import MQTT_Msg_Disp
+
+    latencies = []
+    done = threading.Event()
+
+    def record(body):
+        latencies.append(time.perf_counter() - float(body))
+        if len(latencies) == args.messages:
+            done.set()
+
+    receiver = MQTT_Msg_Disp(args.host, args.port, sub_topic=TOPIC, on_message_callback=record)
+    sender = MQTT_Msg_Disp(args.host, args.port, publish_topic=TOPIC)
+    # Wait for the subscription before sending
+    time.sleep(0.5)
+
+    start = time.perf_counter()
+    for _ in range(args.messages):
+        sender.send_msg(repr(time.perf_counter()))
+        if args.interval:
+            time.sleep(args.interval)
+    done.wait(args.timeout)
+    elapsed = time.perf_counter() - start
+
+    sender.close()
+    receiver.close()
+    return summarize(latencies, elapsed, args.messages)
+
+
+def run_benchmark(args):
+    if args.broker == "memory":
+        # A broker per run, its queues belong to the event loop of the run
+        results = {}
+        for name, run in (("async_request_reply", run_async_requests), ("async_one_way", run_async_one_way)):
+            broker = InMemoryBroker(latency=args.memory_latency)
+            results[name] = asyncio.run(run(lambda: InMemoryTransport(broker), args))
+        return results
+
+    if args.broker == "amqp":
+        make_transport = lambda: AioAMQPTransport(args.host, args.port, prefetch_count=args.concurrency)
+        return {
+            "sync_request_reply": run_sync_amqp_requests(args),
+            "async_request_reply": asyncio.run(run_async_requests(make_transport, args)),
+        }
+
+    make_transport = lambda: AioMQTTTransport(args.host, args.port)
+    return {
+        "sync_one_way": run_sync_mqtt_one_way(args),
+        "async_one_way": asyncio.run(run_async_one_way(make_transport, args)),
+    }
+
+
+def main():
+    """
+    Latency benchmark of the asyncio messaging layer (`aio_msg`) against the current dispatchers.
+
+    With RabbitMQ it compares request/reply round-trips of `AMQP_Msg_Disp` and `AioMsgDisp`, with
+    MQTT the one-way latency of `MQTT_Msg_Disp` and `AioMsgDisp`. With the in-memory broker only
+    `AioMsgDisp` is measured (the current classes need a broker), which gives the overhead of the
+    layer itself. The results are printed as JSON.
+
+    Example:
+        python parking_system/bench/bench_messaging.py --broker amqp --messages 5000 --concurrency 16
+    """
+    parser = argparse.ArgumentParser(description='Latency benchmark of the messaging dispatchers')
+    parser.add_argument('--broker', choices=['memory', 'amqp', 'mqtt'], default='memory', help='Broker used')
+    parser.add_argument('--host', help='Broker hostname (BaseConfig by default)')
+    parser.add_argument('--port', type=int, help='Broker port (BaseConfig by default)')
+    parser.add_argument('--messages', type=int, default=2000, help='Messages or requests sent')
+    parser.add_argument('--concurrency', type=int, default=1, help='Requests in flight at the same time')
+    parser.add_argument('--interval', type=float, default=0.0, help='Seconds between one-way messages')
+    parser.add_argument('--timeout', type=float, default=10, help='Seconds to wait for a reply or for every message')
+    parser.add_argument('--memory-latency', type=float, default=0.0, help='Seconds of simulated delivery of the in-memory broker')
+    parser.add_argument('--output', help='File where the JSON report is written (stdout if not given)')
+
+    args = parser.parse_args()
+    if args.broker == "amqp":
+        args.host = args.host or BaseConfig.AMQP_BROKER_URL
+        args.port = args.port or BaseConfig.AMQP_BROKER_PORT
+    elif args.broker == "mqtt":
+        args.host = args.host or BaseConfig.MQTT_BROKER_URL
+        args.port = args.port or BaseConfig.MQTT_BROKER_PORT
+
+    setup_logger()
+    # Every dispatcher logs each message at INFO level, which would be measured too
+    logging.disable(logging.INFO)
+
+    report = {
+        "broker": args.broker,
+        "messages": args.messages,
+        "concurrency": args.concurrency,
+        "results": run_benchmark(args),
+    }
+    report_json = json.dumps(report, indent=2)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report_json)
+        print(f"Informe guardado en {args.output}")
+    else:
+        print(report_json)
+
+
+if __name__ == "__main__":
+    main()
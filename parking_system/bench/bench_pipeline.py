@@ -0,0 +1,218 @@
+import argparse
+import json
+import os
+import pathlib
+import sys
+import threading
+import time
+
+# Add project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from logging_module.logger_setup import setup_logger
+from parking_system.base_config import BaseConfig
+from parking_system.bench.sources import ImageDirectorySource, LockstepSource, VideoFileSource
+from parking_system.bench.stubs import (
+    InMemoryScreenDisp, InMemoryVerifierDisp, StubDetector, StubOCRProcessor
+)
+from parking_system.detection_system.detection_pipeline import DetectionState, build_pipeline, create_tracker
+
+
+def percentile(samples, percent):
+    """
+    Args:
+        samples (list of float): The samples.
+        percent (float): Percentile between 0 and 100.
+
+    Returns:
+        float: The value at the given percentile, or 0 if there are no samples.
+    """
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(percent / 100 * (len(samples) - 1))))]
+
+
+def create_source(args):
+    if args.video:
+        source = VideoFileSource(args.video, realtime=args.realtime, max_frames=args.max_frames)
+    else:
+        source = ImageDirectorySource(args.images, fps=args.fps if args.realtime else None, max_frames=args.max_frames)
+
+    # Without realtime pacing, frames are delivered in lockstep with the detector so none is dropped
+    return source if args.realtime else LockstepSource(source)
+
+
+def create_detector(args, source):
+    if args.detector == "stub":
+        return StubDetector(
+            latency=args.stub_detector_latency,
+            vehicle_frames=args.stub_vehicle_frames,
+            gap_frames=args.stub_gap_frames
+        )
+
+    from parking_system.other_util_classes.inference_backends import create_interpreter
+    from parking_system.other_util_classes.license_plate_detector import LicensePlateDetector
+
+    models_dir = pathlib.Path(__file__).parent.absolute() / '../../models/saved_model'
+    interpreter, _ = create_interpreter(
+        args.backend, models_dir,
+        num_threads=args.num_threads,
+        model_files=BaseConfig.DETECTOR_MODEL_FILES
+    )
+    return LicensePlateDetector(
+        None, BaseConfig.DETECTION_MIN_CONFIDENCE,
+        max_detections=BaseConfig.DETECTION_MAX_PLATES,
+        nms_iou_threshold=BaseConfig.DETECTION_NMS_IOU_THRESHOLD,
+        frame_is_rgb=source.color_order == "RGB",
+        interpreter=interpreter
+    )
+
+
+def create_ocr_processor(args):
+    if args.ocr == "stub":
+        return StubOCRProcessor(
+            batch_latency=args.stub_ocr_latency,
+            fail_rate=args.stub_ocr_fail_rate,
+            misread_rate=args.stub_ocr_misread_rate
+        )
+
+    from parking_system.other_util_classes.ocr_processor import OCRProcessor
+
+    return OCRProcessor(min_confidence=BaseConfig.OCR_MIN_CONFIDENCE, rec_batch_num=BaseConfig.OCR_BATCH_SIZE)
+
+
+def run_benchmark(args):
+    """
+    Replays the frames of the source through the detection pipeline, with in-memory dispatchers
+    instead of RabbitMQ and MQTT, until every frame has been processed.
+
+    Returns:
+        dict: The benchmark report.
+    """
+    source = create_source(args)
+    detector = create_detector(args, source)
+    ocr_processor = create_ocr_processor(args)
+    tracker = create_tracker(plate_validator=ocr_processor.is_valid_plate)
+    verifier = InMemoryVerifierDisp(latency=args.verifier_latency)
+    screen = InMemoryScreenDisp()
+
+    decision_latencies = []
+    decisions_lock = threading.Lock()
+
+    def on_decision(plate, allowed, seconds):
+        with decisions_lock:
+            decision_latencies.append(seconds)
+
+    pipeline, display_queue = build_pipeline(
+        source, detector, ocr_processor, tracker, verifier, screen, DetectionState(),
+        decision_callback=on_decision, stats_window=1_000_000
+    )
+    if isinstance(source, LockstepSource):
+        source.frame_queue = pipeline.queues["frames"]
+
+    start = time.perf_counter()
+    pipeline.start()
+
+    # Wait until the source has finished and every stage and verification has been completed
+    displayed_frames = 0
+    while True:
+        while not display_queue.empty():
+            display_queue.get_nowait()
+            displayed_frames += 1
+
+        if source.finished and pipeline.is_idle(skip_stages=("capture",)) and verifier.pending == 0:
+            break
+        time.sleep(0.01)
+
+    duration = time.perf_counter() - start
+    pipeline.stop()
+    source.release()
+
+    stats = pipeline.get_stats()
+    vehicles = tracker.stats["tracks"]
+
+    return {
+        "config": {
+            "source": args.video or args.images,
+            "realtime": args.realtime,
+            "detector": args.detector if args.detector == "stub" else f"tflite-{args.backend}",
+            "ocr": args.ocr,
+            "ocr_batch_size": BaseConfig.OCR_BATCH_SIZE,
+            "verifier_latency_ms": args.verifier_latency * 1000,
+        },
+        "frames": source.frames_read,
+        "displayed_frames": displayed_frames,
+        "duration_s": round(duration, 3),
+        "fps": round(stats["detect"]["processed"] / duration, 2) if duration > 0 else 0.0,
+        "stages": stats,
+        "vehicles": {
+            "tracks": vehicles,
+            "confirmed": tracker.stats["confirmed"],
+            "failed_votes": tracker.stats["failed"],
+            "ocr_readings": tracker.stats["ocr_calls"],
+            "ocr_readings_per_vehicle": round(tracker.stats["ocr_calls"] / vehicles, 2) if vehicles else 0.0,
+            "verifications": verifier.requests,
+        },
+        "plate_to_decision_ms": {
+            "count": len(decision_latencies),
+            "p50": round(percentile(decision_latencies, 50) * 1000, 2),
+            "p95": round(percentile(decision_latencies, 95) * 1000, 2),
+            "p99": round(percentile(decision_latencies, 99) * 1000, 2),
+            "max": round(percentile(decision_latencies, 100) * 1000, 2),
+        },
+    }
+
+
+def main():
+    """
+    Offline benchmark of the detection pipeline.
+
+    It replays a video file or a directory of images through the same pipeline used by
+    `parking_main` (capture, detection, tracking, OCR and verification), using the TFLite detector
+    and PaddleOCR or stubs with simulated latencies, and in-memory dispatchers instead of the
+    brokers. It reports the latency percentiles and FPS of every stage, the OCR readings per
+    vehicle and the time from the first detection of a plate to the verifier decision, as JSON so
+    runs can be compared to track regressions.
+
+    Example:
+        python parking_system/bench/bench_pipeline.py --video entrada.mp4 --detector stub --ocr stub --output bench.json
+    """
+    parser = argparse.ArgumentParser(description='Offline benchmark of the license plate detection pipeline')
+    source_group = parser.add_mutually_exclusive_group(required=True)
+    source_group.add_argument('--video', help='Video file to replay')
+    source_group.add_argument('--images', help='Directory with the images to replay')
+    parser.add_argument('--realtime', action='store_true',
+                help='Deliver frames at the video frame rate (or --fps) and let the pipeline drop them like with a camera')
+    parser.add_argument('--fps', type=float, default=30, help='Frame rate of the images in realtime mode')
+    parser.add_argument('--max-frames', type=int, default=None, help='Maximum number of frames to replay')
+    parser.add_argument('--detector', choices=['tflite', 'stub'], default='tflite', help='Detector implementation')
+    parser.add_argument('--backend', default=BaseConfig.DETECTOR_BACKEND, help='Inference backend of the TFLite detector')
+    parser.add_argument('--num-threads', type=int, default=BaseConfig.DETECTOR_NUM_THREADS, help='CPU threads of the TFLite detector')
+    parser.add_argument('--ocr', choices=['paddle', 'stub'], default='paddle', help='OCR implementation')
+    parser.add_argument('--verifier-latency', type=float, default=0.05, help='Seconds of the simulated verification round-trip')
+    parser.add_argument('--stub-detector-latency', type=float, default=0.01, help='Seconds per frame of the stub detector')
+    parser.add_argument('--stub-vehicle-frames', type=int, default=40, help='Frames in which each simulated vehicle is visible')
+    parser.add_argument('--stub-gap-frames', type=int, default=40, help='Frames between two simulated vehicles')
+    parser.add_argument('--stub-ocr-latency', type=float, default=0.05, help='Seconds per batch of the stub OCR')
+    parser.add_argument('--stub-ocr-fail-rate', type=float, default=0.2, help='Probability of an unreadable plate in the stub OCR')
+    parser.add_argument('--stub-ocr-misread-rate', type=float, default=0.1, help='Probability of a misread character in the stub OCR')
+    parser.add_argument('--output', help='File where the JSON report is written (stdout if not given)')
+
+    args = parser.parse_args()
+
+    setup_logger()
+
+    report = run_benchmark(args)
+    report_json = json.dumps(report, indent=2)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report_json)
+        print(f"Informe guardado en {args.output}")
+    else:
+        print(report_json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import os
+import time
+
+import cv2
+
+from parking_system.other_util_classes.webcam_capture import CapturedFrame
+
+
+class VideoFileSource:
+    """
+    Frame source that replays a recorded video, with the same interface as `WebcamCapture`.
+
+    Args:
+        path (str): Path to the video file.
+        realtime (bool): If True, frames are delivered at the frame rate of the video. Otherwise,
+                         they are delivered as fast as they are requested.
+        max_frames (int, optional): Maximum number of frames to deliver.
+
+    Attributes:
+        color_order (str): Channel order of the frames.
+        frames_read (int): Number of frames delivered.
+        finished (bool): True once every frame has been delivered.
+    """
+
+    def __init__(self, path, realtime=False, max_frames=None):
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"Failed to open video file {path}")
+
+        self.color_order = "BGR"
+        self.frame_interval = 1.0 / (self.cap.get(cv2.CAP_PROP_FPS) or 30)
+        self.realtime = realtime
+        self.max_frames = max_frames
+        self.frames_read = 0
+        self.finished = False
+        self._next_frame_time = None
+
+    def get_frame(self):
+        """
+        Returns:
+            numpy.ndarray or None: The next frame of the video, or None when it has finished.
+        """
+        if self.finished:
+            return None
+
+        if self.realtime:
+            now = time.monotonic()
+            if self._next_frame_time is None:
+                self._next_frame_time = now
+            elif now < self._next_frame_time:
+                time.sleep(self._next_frame_time - now)
+            self._next_frame_time += self.frame_interval
+
+        ret, frame = self.cap.read()
+        if not ret or (self.max_frames is not None and self.frames_read >= self.max_frames):
+            self.finished = True
+            return None
+
+        self.frames_read += 1
+        return frame
+
+    def get_next_frame(self, timeout=None):
+        """
+        Returns:
+            CapturedFrame or None: The next frame of the video, or None when it has finished.
+        """
+        frame = self.get_frame()
+        if frame is None:
+            # Nothing left: wait like a camera without new frames, so the capture stage does not spin
+            time.sleep(timeout if timeout is not None else 0.1)
+            return None
+        return CapturedFrame(frame, self.frames_read, time.monotonic())
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageDirectorySource:
+    """
+    Frame source that delivers the images of a directory in name order, with the same interface
+    as `WebcamCapture`.
+
+    Args:
+        directory (str): Directory with the images.
+        fps (float, optional): If given, frames are delivered at this rate. Otherwise, they are
+                               delivered as fast as they are requested.
+        max_frames (int, optional): Maximum number of frames to deliver.
+
+    Attributes:
+        color_order (str): Channel order of the frames.
+        frames_read (int): Number of frames delivered.
+        finished (bool): True once every image has been delivered.
+    """
+
+    image_extensions = (".jpg", ".jpeg", ".png", ".bmp")
+
+    def __init__(self, directory, fps=None, max_frames=None):
+        self.paths = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.lower().endswith(self.image_extensions)
+        )
+        if not self.paths:
+            raise RuntimeError(f"No images found in {directory}")
+        if max_frames is not None:
+            self.paths = self.paths[:max_frames]
+
+        self.color_order = "BGR"
+        self.frame_interval = 1.0 / fps if fps else None
+        self.frames_read = 0
+        self.finished = False
+        self._next_frame_time = None
+
+    def get_frame(self):
+        """
+        Returns:
+            numpy.ndarray or None: The next image, or None when every image has been delivered.
+        """
+        if self.frames_read >= len(self.paths):
+            self.finished = True
+            return None
+
+        if self.frame_interval is not None:
+            now = time.monotonic()
+            if self._next_frame_time is None:
+                self._next_frame_time = now
+            elif now < self._next_frame_time:
+                time.sleep(self._next_frame_time - now)
+            self._next_frame_time += self.frame_interval
+
+        frame = cv2.imread(self.paths[self.frames_read])
+        self.frames_read += 1
+        return frame
+
+    def get_next_frame(self, timeout=None):
+        """
+        Returns:
+            CapturedFrame or None: The next image, or None when every image has been delivered.
+        """
+        frame = self.get_frame()
+        if frame is None:
+            # Nothing left: wait like a camera without new frames, so the capture stage does not spin
+            time.sleep(timeout if timeout is not None else 0.1)
+            return None
+        return CapturedFrame(frame, self.frames_read, time.monotonic())
+
+    def release(self):
+        pass
+
+
+class LockstepSource:
+    """
+    Wraps a source so that a new frame is only delivered once the previous one has been taken by
+    the detection stage. This way no frame is dropped and runs are repeatable, which is what is
+    needed to compare OCR calls per vehicle between runs.
+
+    Args:
+        source (VideoFileSource or ImageDirectorySource): The wrapped source.
+        frame_queue (queue.Queue, optional): Queue of the pipeline the frames are put in. It can be
+                                             set after the pipeline is built.
+    """
+
+    def __init__(self, source, frame_queue=None):
+        self.source = source
+        self.frame_queue = frame_queue
+        self.color_order = source.color_order
+
+    @property
+    def finished(self):
+        return self.source.finished
+
+    @property
+    def frames_read(self):
+        return self.source.frames_read
+
+    def get_frame(self):
+        self._wait_frame_taken()
+        return self.source.get_frame()
+
+    def get_next_frame(self, timeout=None):
+        self._wait_frame_taken()
+        return self.source.get_next_frame(timeout)
+
+    def _wait_frame_taken(self):
+        while self.frame_queue is not None and not self.frame_queue.empty():
+            time.sleep(0.001)
+
+    def release(self):
+        self.source.release()
@@ -0,0 +1,178 @@
+import json
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+# Same layout as `license_plate_detector.DETECTION_DTYPE`, which is not imported so the stubs
+# can be used where the TFLite runtime is not installed
+DETECTION_DTYPE = np.dtype([
+    ('ymin', np.int32),
+    ('xmin', np.int32),
+    ('ymax', np.int32),
+    ('xmax', np.int32),
+    ('score', np.float32),
+])
+
+
+class StubDetector:
+    """
+    Stand-in for `LicensePlateDetector` that simulates vehicles passing in front of the camera:
+    a plate is detected in the same box during `vehicle_frames` frames, then nothing is detected
+    during `gap_frames` frames, and then the next vehicle arrives.
+
+    The ROI of every detection is a synthetic image filled with the index of the vehicle, which
+    `StubOCRProcessor` uses to know which plate to read.
+
+    Args:
+        latency (float): Seconds spent on every detection, to simulate the inference time.
+        vehicle_frames (int): Frames in which every vehicle is visible.
+        gap_frames (int): Frames without vehicle between two vehicles.
+    """
+
+    def __init__(self, latency=0.01, vehicle_frames=40, gap_frames=40):
+        self.latency = latency
+        self.vehicle_frames = vehicle_frames
+        self.gap_frames = gap_frames
+        self.frame_count = 0
+
+    def detect_license_plates(self, frame):
+        time.sleep(self.latency)
+
+        vehicle, position = divmod(self.frame_count, self.vehicle_frames + self.gap_frames)
+        self.frame_count += 1
+
+        if position >= self.vehicle_frames:
+            return np.empty(0, dtype=DETECTION_DTYPE), []
+
+        imH, imW = frame.shape[:2]
+        detections = np.array(
+            [(int(imH * 0.6), int(imW * 0.4), int(imH * 0.7), int(imW * 0.6), 0.95)],
+            dtype=DETECTION_DTYPE
+        )
+        roi = np.full((48, 160, 3), vehicle % 256, dtype=np.uint8)
+        return detections, [roi]
+
+
+class StubOCRProcessor:
+    """
+    Stand-in for `OCRProcessor` that reads the plate of the vehicle encoded in the ROI by
+    `StubDetector`, failing or misreading some characters with the given rates.
+
+    Args:
+        batch_latency (float): Fixed seconds spent on every batch call.
+        roi_latency (float): Seconds spent on every ROI of a batch.
+        fail_rate (float): Probability of not reading a valid plate.
+        misread_rate (float): Probability of misreading one character of the plate.
+        seed (int): Seed of the random generator, so runs are repeatable.
+    """
+
+    plate_pattern = re.compile(r'^(C?\d{4}[B-DF-HJ-NP-RSTV-Z]{3})$')
+    consonants = "BCDFGHJKLMNPRSTVWXYZ"
+
+    def __init__(self, batch_latency=0.05, roi_latency=0.01, fail_rate=0.2, misread_rate=0.1, seed=0):
+        self.batch_latency = batch_latency
+        self.roi_latency = roi_latency
+        self.fail_rate = fail_rate
+        self.misread_rate = misread_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+
+    @classmethod
+    def plate_of_vehicle(cls, vehicle):
+        letters = ''.join(cls.consonants[(vehicle // 20 ** i) % 20] for i in range(3))
+        return f"{vehicle % 10000:04d}{letters}"
+
+    def is_valid_plate(self, plate):
+        return self.plate_pattern.match(plate) is not None
+
+    def apply_ocr_batch(self, rois, recognition_only=True):
+        self.calls += 1
+        time.sleep(self.batch_latency + self.roi_latency * len(rois))
+
+        plates = []
+        for roi in rois:
+            if self.random.random() < self.fail_rate:
+                plates.append(None)
+                continue
+
+            plate = list(self.plate_of_vehicle(int(roi[0, 0, 0])))
+            if self.random.random() < self.misread_rate:
+                position = self.random.randrange(4)
+                plate[position] = str((int(plate[position]) + 1) % 10)
+            plates.append(''.join(plate))
+
+        return plates
+
+    def apply_ocr(self, roi):
+        return self.apply_ocr_batch([roi])[0]
+
+
+class InMemoryVerifierDisp:
+    """
+    Stand-in for the detector `AMQP_Msg_Disp` that answers the verification requests in memory,
+    after a simulated verifier round-trip.
+
+    Args:
+        latency (float): Seconds until the reply of every request arrives.
+        allowed_plates (set, optional): Plates allowed to enter. If None, every plate is allowed.
+
+    Attributes:
+        requests (int): Number of requests received.
+        pending (int): Number of requests waiting for their reply.
+    """
+
+    def __init__(self, latency=0.05, allowed_plates=None):
+        self.latency = latency
+        self.allowed_plates = allowed_plates
+        self.requests = 0
+        self.pending = 0
+        self._lock = threading.Lock()
+
+    def send_request(self, message, timeout=None):
+        msg_json = json.loads(message)
+        plate = msg_json["plate"]
+        future = Future()
+
+        with self._lock:
+            self.requests += 1
+            self.pending += 1
+
+        def reply():
+            with self._lock:
+                self.pending -= 1
+            allowed = self.allowed_plates is None or plate in self.allowed_plates
+            future.set_result({"plate": plate, "allowed": allowed})
+
+        timer = threading.Timer(self.latency, reply)
+        timer.daemon = True
+        timer.start()
+        return future
+
+    def send_msg(self, message, correlation_id=None, reply_to=None):
+        pass
+
+    def close(self):
+        pass
+
+
+class InMemoryScreenDisp:
+    """
+    Stand-in for the screen `MQTT_Msg_Disp` that keeps the sent messages in memory.
+
+    Attributes:
+        messages (list of str): Messages sent to the screen.
+    """
+
+    def __init__(self):
+        self.messages = []
+
+    def send_msg(self, message):
+        self.messages.append(message)
+
+    def close(self):
+        pass
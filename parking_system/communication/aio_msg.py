@@ -0,0 +1,465 @@
+"""
+asyncio messaging layer, with the same send/receive/request-reply surface as `AMQP_Msg_Disp` and
+`MQTT_Msg_Disp` over RabbitMQ (aio-pika), MQTT (aiomqtt) or an in-memory broker for tests and
+benchmarks. A program runs every dispatcher on a single event loop: there are no I/O or polling
+threads, a receive loop is a task awaiting the next message.
+
+Example:
+    async def main():
+        transport = AioAMQPTransport(BaseConfig.AMQP_BROKER_URL, BaseConfig.AMQP_BROKER_PORT)
+        async with AioMsgDisp(transport, publish_name="out", receive_name="in", msg_handler=handler) as disp:
+            reply = await disp.send_request(message, timeout=5)
+
+The aio-pika and aiomqtt packages are imported when their transport connects, so the in-memory
+broker can be used without them.
+"""
+import asyncio
+import functools
+import inspect
+import logging
+import uuid
+
+
+class AioMessage:
+    """
+    A received message.
+
+    Args:
+        body (bytes): The body of the message.
+        correlation_id (str, optional): Correlation ID of the request the message belongs to.
+        reply_to (str, optional): Queue or topic where the reply should be sent.
+        ack (coroutine function, optional): Acknowledges the message to the broker.
+        nack (coroutine function, optional): Rejects the message.
+    """
+
+    def __init__(self, body, correlation_id=None, reply_to=None, ack=None, nack=None):
+        self.body = body
+        self.correlation_id = correlation_id
+        self.reply_to = reply_to
+        self._ack = ack
+        self._nack = nack
+
+    async def ack(self):
+        if self._ack is not None:
+            await self._ack()
+
+    async def nack(self):
+        if self._nack is not None:
+            await self._nack()
+
+
+def encode(message):
+    return message if isinstance(message, bytes) else str(message).encode("utf-8")
+
+
+class AioAMQPTransport:
+    """
+    RabbitMQ transport over aio-pika. Queues are declared as `AMQP_Msg_Disp` declares them, so both
+    can be used at the same time, and messages are sent through the default exchange.
+
+    The connection is re-established automatically (`connect_robust`) and, with
+    `publisher_confirms`, `publish` returns once the broker has confirmed the message.
+
+    Args:
+        hostname (str): The RabbitMQ server's hostname or IP address.
+        port (int): The RabbitMQ server's port.
+        prefetch_count (int, optional): Maximum unacknowledged messages delivered to the consumers.
+        persistent_queues (iterable of str, optional): Queues declared durable whose messages are
+                                                       persistent. A queue that already exists as
+                                                       non-durable must be deleted first.
+        publisher_confirms (bool): Wait for the broker confirm of every published message.
+    """
+
+    def __init__(self, hostname, port, prefetch_count=None, persistent_queues=None, publisher_confirms=True):
+        self.hostname = hostname
+        self.port = port
+        self.prefetch_count = prefetch_count
+        self.persistent_queues = set(persistent_queues or ())
+        self.publisher_confirms = publisher_confirms
+        self.connection = None
+        self.channel = None
+        self._queues = {}
+
+    async def connect(self):
+        import aio_pika
+
+        self.connection = await aio_pika.connect_robust(host=self.hostname, port=self.port, heartbeat=600)
+        self.channel = await self.connection.channel(publisher_confirms=self.publisher_confirms)
+        if self.prefetch_count:
+            await self.channel.set_qos(prefetch_count=self.prefetch_count)
+
+    async def declare(self, name):
+        if name not in self._queues:
+            self._queues[name] = await self.channel.declare_queue(name, durable=name in self.persistent_queues)
+        return self._queues[name]
+
+    async def publish(self, name, body, correlation_id=None, reply_to=None):
+        import aio_pika
+
+        message = aio_pika.Message(
+            body,
+            correlation_id=correlation_id,
+            reply_to=reply_to,
+            delivery_mode=(
+                aio_pika.DeliveryMode.PERSISTENT if name in self.persistent_queues
+                else aio_pika.DeliveryMode.NOT_PERSISTENT
+            )
+        )
+        await self.channel.default_exchange.publish(message, routing_key=name)
+
+    async def subscribe(self, name):
+        """
+        Yields the messages of a queue as they arrive. They must be acknowledged (or rejected).
+        """
+        queue = await self.declare(name)
+        async with queue.iterator() as messages:
+            async for message in messages:
+                yield AioMessage(
+                    message.body,
+                    correlation_id=message.correlation_id,
+                    reply_to=message.reply_to,
+                    ack=message.ack,
+                    nack=functools.partial(message.nack, requeue=False)
+                )
+
+    async def close(self):
+        if self.connection is not None:
+            await self.connection.close()
+
+
+class AioMQTTTransport:
+    """
+    MQTT transport over aiomqtt. The correlation ID and the reply topic are sent as MQTT 5
+    properties (CorrelationData and ResponseTopic), so request/reply works as with RabbitMQ.
+
+    A single task reads every incoming message and hands it to the subscription of its topic.
+
+    Args:
+        hostname (str): The MQTT broker's hostname or IP address.
+        port (int): The MQTT broker's port.
+        qos (int): Quality of service of the published messages and the subscriptions.
+    """
+
+    def __init__(self, hostname, port, qos=0):
+        self.hostname = hostname
+        self.port = port
+        self.qos = qos
+        self.client = None
+        self._subscriptions = {}
+        self._reader = None
+
+    async def connect(self):
+        import aiomqtt
+
+        self.client = aiomqtt.Client(self.hostname, self.port, keepalive=60, protocol=aiomqtt.ProtocolVersion.V5)
+        await self.client.__aenter__()
+        self._reader = asyncio.create_task(self._read())
+
+    async def declare(self, name):
+        pass
+
+    async def publish(self, name, body, correlation_id=None, reply_to=None):
+        properties = None
+        if correlation_id or reply_to:
+            from paho.mqtt.packettypes import PacketTypes
+            from paho.mqtt.properties import Properties
+
+            properties = Properties(PacketTypes.PUBLISH)
+            if correlation_id:
+                properties.CorrelationData = correlation_id.encode()
+            if reply_to:
+                properties.ResponseTopic = reply_to
+        await self.client.publish(name, payload=body, qos=self.qos, properties=properties)
+
+    async def subscribe(self, name):
+        queue = self._subscriptions.setdefault(name, asyncio.Queue())
+        await self.client.subscribe(name, qos=self.qos)
+        while True:
+            yield await queue.get()
+
+    async def _read(self):
+        async for message in self.client.messages:
+            properties = message.properties
+            correlation_data = getattr(properties, "CorrelationData", None)
+            received = AioMessage(
+                message.payload,
+                correlation_id=correlation_data.decode() if correlation_data else None,
+                reply_to=getattr(properties, "ResponseTopic", None)
+            )
+            for topic, queue in self._subscriptions.items():
+                if message.topic.matches(topic):
+                    queue.put_nowait(received)
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+        if self.client is not None:
+            await self.client.__aexit__(None, None, None)
+
+
+class InMemoryBroker:
+    """
+    Stand-in for RabbitMQ and MQTT in tests and benchmarks. Every name is a queue and each message
+    is delivered to one of its consumers, as with the RabbitMQ queues used by the parking system.
+
+    Args:
+        latency (float): Seconds every message takes to be delivered, to simulate the network.
+
+    Attributes:
+        published (int): Number of messages published.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.published = 0
+        self._queues = {}
+
+    def queue(self, name):
+        if name not in self._queues:
+            self._queues[name] = asyncio.Queue()
+        return self._queues[name]
+
+    def pending(self, name):
+        """
+        Returns:
+            int: Messages of a queue waiting to be consumed.
+        """
+        return self.queue(name).qsize()
+
+    async def publish(self, name, message):
+        self.published += 1
+        if self.latency:
+            asyncio.get_running_loop().call_later(self.latency, self.queue(name).put_nowait, message)
+        else:
+            self.queue(name).put_nowait(message)
+
+
+class InMemoryTransport:
+    """
+    Transport of an `InMemoryBroker`. Several transports (one per simulated program) can share the
+    same broker.
+
+    Args:
+        broker (InMemoryBroker): The broker.
+    """
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    async def connect(self):
+        pass
+
+    async def declare(self, name):
+        self.broker.queue(name)
+
+    async def publish(self, name, body, correlation_id=None, reply_to=None):
+        await self.broker.publish(name, AioMessage(body, correlation_id=correlation_id, reply_to=reply_to))
+
+    async def subscribe(self, name):
+        queue = self.broker.queue(name)
+        while True:
+            yield await queue.get()
+
+    async def close(self):
+        pass
+
+
+class AioMsgDisp:
+    """
+    asyncio version of `AMQP_Msg_Disp` and `MQTT_Msg_Disp`, over any of the transports above.
+
+    `send_request` publishes a message with a new `correlation_id` and the receive queue as
+    `reply_to`, and returns the handled reply with the same `correlation_id`: the replies are read
+    by a task of the dispatcher, so many requests can be awaited at the same time. `receive_msg`
+    handles the next message (what `stop_consuming_after_received_message` did) and
+    `wait_and_receive_msg` handles messages until the dispatcher is closed, up to
+    `handler_concurrency` at the same time. When replying, the `correlation_id` and `reply_to` of
+    the received message are propagated, and the message is acknowledged once its reply is sent.
+
+    As with `AMQP_Msg_Disp`, the replies arrive to the receive queue, so a dispatcher either sends
+    requests or handles messages.
+
+    The message handler can be a coroutine function, or a plain function when it doesn't block
+    (a blocking one can be run with `asyncio.to_thread` inside a coroutine).
+
+    Args:
+        transport: `AioAMQPTransport`, `AioMQTTTransport` or `InMemoryTransport`.
+        publish_name (str): Queue or topic the messages are sent to.
+        receive_name (str): Queue or topic the messages (and replies) are received from.
+        msg_handler (callable, optional): Function applied to the body of the received messages
+                                          and replies. Without it, the body is returned as is.
+        reply_to_received_message (bool): If True, the result of the handler is sent as reply.
+        handler_concurrency (int): Messages handled at the same time by `wait_and_receive_msg`.
+
+    Attributes:
+        pending_requests (dict): Futures of the requests waiting for a reply, by correlation_id.
+        last_reply_result (Any): The last result returned by the msg_handler function.
+    """
+
+    def __init__(
+            self, transport,
+            publish_name=None,
+            receive_name=None,
+            msg_handler=None,
+            reply_to_received_message=False,
+            handler_concurrency=1
+        ):
+        self.transport = transport
+        self.publish_name = publish_name
+        self.receive_name = receive_name
+        self.msg_handler = msg_handler
+        self.reply_to_received_msg = reply_to_received_message
+        self.handler_concurrency = handler_concurrency
+
+        self.pending_requests = {}
+        self.last_reply_result = None
+        self._messages = None
+        self._reply_task = None
+        self._tasks = set()
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    async def connect(self):
+        await self.transport.connect()
+        for name in (self.publish_name, self.receive_name):
+            if name:
+                await self.transport.declare(name)
+        self.logger.info("Dispatcher asíncrono conectado.")
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def send_msg(self, message, correlation_id=None, reply_to=None):
+        """
+        Sends a message to the publish queue or topic.
+
+        Args:
+            message (str or bytes): The message to be sent.
+            correlation_id (str, optional): Correlation ID of the request the message belongs to.
+            reply_to (str, optional): Queue or topic where the reply to this message should be sent.
+        """
+        await self.transport.publish(self.publish_name, encode(message), correlation_id=correlation_id, reply_to=reply_to)
+        self.logger.debug(f"Mensaje enviado: {message}")
+
+    async def send_request(self, message, timeout=None):
+        """
+        Sends a message as a request and waits for its reply.
+
+        Args:
+            message (str or bytes): The message to be sent.
+            timeout (float, optional): Seconds to wait for the reply. A late reply is discarded.
+
+        Returns:
+            Any: The result of `msg_handler` applied to the reply.
+
+        Raises:
+            TimeoutError: If the reply does not arrive within `timeout`.
+        """
+        if self._reply_task is None:
+            self._reply_task = asyncio.create_task(self._receive_replies())
+
+        correlation_id = uuid.uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        self.pending_requests[correlation_id] = future
+        try:
+            await self.send_msg(message, correlation_id=correlation_id, reply_to=self.receive_name)
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning(f"Petición {correlation_id} sin respuesta, tiempo agotado.")
+            raise TimeoutError(f"Sin respuesta para la petición {correlation_id}") from None
+        finally:
+            self.pending_requests.pop(correlation_id, None)
+
+    async def receive_msg(self):
+        """
+        Waits for the next message and handles it (replying to it if configured).
+
+        Returns:
+            Any: The result of the handler.
+        """
+        message = await self._next_message()
+        await self._handle(message)
+        return self.last_reply_result
+
+    async def wait_and_receive_msg(self):
+        """
+        Handles the received messages until the dispatcher is closed.
+        """
+        self.logger.info("Esperando mensajes...")
+        semaphore = asyncio.Semaphore(self.handler_concurrency)
+        while True:
+            message = await self._next_message()
+            await semaphore.acquire()
+            task = asyncio.create_task(self._handle(message))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            task.add_done_callback(lambda _: semaphore.release())
+
+    def get_reply_result(self):
+        return self.last_reply_result
+
+    async def close(self):
+        """
+        Cancels the requests and message handlers in progress and closes the transport. The
+        messages not acknowledged are delivered again by RabbitMQ.
+        """
+        tasks = list(self._tasks) + ([self._reply_task] if self._reply_task is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        for future in self.pending_requests.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Dispatcher cerrado"))
+        self.pending_requests.clear()
+
+        if self._messages is not None:
+            try:
+                await self._messages.aclose()
+            except RuntimeError:
+                # Still awaited by a `wait_and_receive_msg` that was not cancelled
+                pass
+        await self.transport.close()
+        self.logger.info("Dispatcher asíncrono cerrado.")
+
+    async def _next_message(self):
+        if self._messages is None:
+            self._messages = self.transport.subscribe(self.receive_name)
+        return await self._messages.__anext__()
+
+    async def _call_handler(self, body):
+        if self.msg_handler is None:
+            return body
+        result = self.msg_handler(body)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def _handle(self, message):
+        self.logger.info(f"Mensaje recibido: {message.body}")
+        try:
+            self.last_reply_result = await self._call_handler(message.body)
+            if self.reply_to_received_msg:
+                await self.send_msg(self.last_reply_result, correlation_id=message.correlation_id, reply_to=message.reply_to)
+        except Exception as e:
+            self.logger.error(f"Error al procesar el mensaje: {e}")
+            await message.nack()
+            return
+
+        await message.ack()
+
+    async def _receive_replies(self):
+        while True:
+            message = await self._next_message()
+            future = self.pending_requests.get(message.correlation_id)
+            if future is None or future.done():
+                self.logger.warning(f"Respuesta descartada, sin petición pendiente ({message.correlation_id}): {message.body}")
+            else:
+                try:
+                    future.set_result(await self._call_handler(message.body))
+                except Exception as e:
+                    future.set_exception(e)
+            await message.ack()
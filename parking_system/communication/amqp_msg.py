@@ -1,7 +1,13 @@
 import pika
 import logging
 from pika.exchange_type import ExchangeType
+import functools
+import threading
 import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from parking_system.communication.amqp_publisher import AMQP_Publisher
 
 
 class AMQP_Msg_Disp:
@@ -13,6 +19,25 @@ class AMQP_Msg_Disp:
     custom handler. It can also be configured to reply to received messages and stop consuming 
     after receiving a message.
 
+    It also offers a non-blocking request/reply API (`send_request`): every request is sent
+    with a unique `correlation_id` and a `reply_to` queue, and returns a future that is resolved
+    when the reply with the same `correlation_id` arrives to the receive queue. Replies are 
+    consumed by a background I/O thread, so many requests can be in flight at the same time and
+    stale replies are never taken as the answer to a newer request. When replying to a message,
+    the `correlation_id` and `reply_to` of the received message are propagated, so they survive
+    intermediate hops (e.g. detector -> verifier -> gate -> detector).
+
+    With `handler_workers` > 1, received messages are handled concurrently in a thread pool (e.g.
+    the verifier, so the gates are not served one HTTP round-trip at a time). The broker delivers
+    up to `prefetch_count` unacknowledged messages, and each one is acknowledged only after its
+    reply has been published.
+
+    With `publisher_confirms`, messages are published by an `AMQP_Publisher` on its own connection:
+    `send_msg` returns at once with a future resolved when the broker confirms the message, the
+    messages can be batched, and while RabbitMQ is unreachable they are kept in a bounded buffer
+    and the publisher reconnects with exponential backoff, instead of blocking the caller. A
+    received message is acknowledged once its reply is confirmed.
+
     Args:
         hostname (str): The RabbitMQ server's hostname or IP address.
         publish_queue_name (str): The name of the queue or exchange for publishing messages.
@@ -20,6 +45,23 @@ class AMQP_Msg_Disp:
         msg_handler (callable): Function to handle received messages.
         stop_consuming_after_received_message (bool): If True, stops consuming (or waiting for messages) after receiving a message. This is used when some other processing needs to be done before waiting for another message
         reply_to_received_message (bool): If True, replies to the received message.
+        prefetch_count (int, optional): Maximum unacknowledged messages delivered to this consumer.
+                                        None for no limit.
+        handler_workers (int): Threads handling received messages at the same time. Default 1, the
+                               messages are handled one by one in the consuming thread.
+        publisher_confirms (bool): If True, messages are published with an `AMQP_Publisher`.
+        publish_batch_size (int): Messages published together (only with `publisher_confirms`).
+        publish_batch_interval (float): Maximum seconds a message waits for its batch.
+        publish_buffer_size (int): Maximum unsent messages kept while RabbitMQ is unreachable.
+        publish_timeout (float): Seconds the consuming thread waits for the confirm of a reply
+                                 (with `publisher_confirms` and `handler_workers` = 1). If it is
+                                 not confirmed in time, the received message is requeued.
+        persistent_queues (iterable of str, optional): Queues declared durable and whose messages
+                                                       are published as persistent, so they survive
+                                                       a broker restart. A queue that already exists
+                                                       as non-durable must be deleted first (e.g.
+                                                       `rabbitmqctl delete_queue <name>`), RabbitMQ
+                                                       refuses to declare it again as durable.
 
     Attributes:
         connection (pika.BlockingConnection): Connection to RabbitMQ.
@@ -31,6 +73,8 @@ class AMQP_Msg_Disp:
         stop_consuming_after_received_msg (bool): If True, stops consuming (or waiting for messages) after receiving a message.  
         reply_to_received_msg (bool): If True, replies to the received message.
         last_reply_result (Any): The last result returned by the msg_handler function.
+        pending_requests (dict): Futures of the requests waiting for a reply, by correlation_id.
+        publisher (AMQP_Publisher or None): Publisher used with `publisher_confirms`.
     """
 
 
@@ -39,9 +83,20 @@ class AMQP_Msg_Disp:
             publish_queue_name,
             receive_queue_name,
             msg_handler, stop_consuming_after_received_message,
-            reply_to_received_message
+            reply_to_received_message,
+            prefetch_count=None,
+            handler_workers=1,
+            publisher_confirms=False,
+            publish_batch_size=1,
+            publish_batch_interval=0.0,
+            publish_buffer_size=1000,
+            publish_timeout=10.0,
+            persistent_queues=None
         ):
 
+        if handler_workers > 1 and stop_consuming_after_received_message:
+            raise ValueError("stop_consuming_after_received_message requiere handler_workers=1")
+
         self.msg_handler = msg_handler
 
         # This is used
@@ -56,13 +111,36 @@ class AMQP_Msg_Disp:
          # This could be the name of the exchange, if it is of type fanout
         self.publish_queue_name = publish_queue_name
         self.receive_queue_name = receive_queue_name
+
+        self.prefetch_count = prefetch_count
+        self.handler_workers = handler_workers
+        self._handler_executor = None
+        self.persistent_queues = set(persistent_queues or ())
+        self.publish_timeout = publish_timeout
+        self.publisher = None
         
         self.logger = logging.getLogger(self.__class__.__name__)
 
+        # Request/reply state. The I/O thread is started with the first request
+        self.pending_requests = {}
+        self._pending_lock = threading.Lock()
+        self._io_thread = None
+        self._expiry_thread = None
+        self._io_running = False
+
         self.logger.info("Iniciando MsgDispatcher...")
 
         # Establish connection
         self.__reconnect()
+
+        if publisher_confirms:
+            self.publisher = AMQP_Publisher(
+                self.hostname, self.port,
+                batch_size=publish_batch_size,
+                batch_interval=publish_batch_interval,
+                max_buffer=publish_buffer_size,
+                persistent_queues=self.persistent_queues
+            )
         
 
 
@@ -94,23 +172,62 @@ class AMQP_Msg_Disp:
 
     def __setup_queues(self):
         if self.publish_queue_name:
-            self.channel.queue_declare(queue=self.publish_queue_name)
+            self.channel.queue_declare(
+                queue=self.publish_queue_name,
+                durable=self.publish_queue_name in self.persistent_queues
+            )
         if self.receive_queue_name:
-            self.channel.queue_declare(queue=self.receive_queue_name)
+            self.channel.queue_declare(
+                queue=self.receive_queue_name,
+                durable=self.receive_queue_name in self.persistent_queues
+            )
+        if self.prefetch_count:
+            self.channel.basic_qos(prefetch_count=self.prefetch_count)
 
 
 
 
-    def send_msg(self, message):
+    def send_msg(self, message, correlation_id=None, reply_to=None, expiration=None):
         """
         Sends a message to the configured queue or exchange with retries.
 
+        If the request/reply I/O thread is running, the connection belongs to it, so the
+        message is handed to that thread and this method returns without waiting. That thread
+        publishes it only once, a lost connection is recovered by the I/O loop.
+
+        With `publisher_confirms`, the message is handed to the publisher and this method returns
+        without waiting either.
+
         Args:
             message (str): The message to be sent.
+            correlation_id (str, optional): Correlation ID of the request the message belongs to.
+            reply_to (str, optional): Queue where the reply to this message should be sent.
+            expiration (float, optional): Seconds after which the broker discards the message if
+                                          it has not been consumed.
+
+        Returns:
+            concurrent.futures.Future or None: With `publisher_confirms`, future resolved when the
+                                               broker confirms the message (see `AMQP_Publisher.publish`).
+                                               If the I/O thread is running, future resolved when
+                                               the message is published, or failed if it could not be.
 
         Raises:
             Exception: If the message cannot be sent after retries.
         """
+        if self.publisher is not None:
+            return self.publisher.publish(message, self.publish_queue_name, correlation_id, reply_to, expiration)
+
+        if self._io_running and threading.current_thread() is not self._io_thread:
+            published = Future()
+            try:
+                self.connection.add_callback_threadsafe(
+                    functools.partial(self._publish_on_io_thread, published, message, correlation_id, reply_to, expiration)
+                )
+            except Exception as e:
+                # The connection is closed, the I/O thread is reconnecting
+                published.set_exception(ConnectionError(f"Conexión con RabbitMQ no disponible: {e}"))
+            return published
+
         max_retries = 3
         retry_delay = 1  # Seconds to delay to next try
         attempt = 0
@@ -118,13 +235,8 @@ class AMQP_Msg_Disp:
 
         while not sent and attempt <= max_retries:
             try:
-                self.channel.basic_publish(
-                    exchange='',
-                    routing_key=self.publish_queue_name,
-                    body=message)
-                
+                self._basic_publish(message, correlation_id, reply_to, expiration)
                 sent = True
-                self.logger.info(f"Mensaje enviado exitosamente: {message}")
 
             except pika.exceptions.AMQPConnectionError as e:
                 attempt += 1
@@ -138,6 +250,35 @@ class AMQP_Msg_Disp:
                     self.logger.error(f"No se pudo enviar el mensaje después de {max_retries} intentos.")
                     raise Exception("Fallo al enviar el mensaje después de múltiples intentos") from e
 
+    def _basic_publish(self, message, correlation_id, reply_to, expiration=None):
+        properties = None
+        persistent = self.publish_queue_name in self.persistent_queues
+        if correlation_id or reply_to or persistent or expiration is not None:
+            properties = pika.BasicProperties(
+                correlation_id=correlation_id,
+                reply_to=reply_to,
+                delivery_mode=pika.DeliveryMode.Persistent if persistent else None,
+                expiration=str(max(0, int(expiration * 1000))) if expiration is not None else None
+            )
+
+        self.channel.basic_publish(
+            exchange='',
+            routing_key=self.publish_queue_name,
+            body=message,
+            properties=properties)
+        self.logger.info(f"Mensaje enviado exitosamente: {message}")
+
+    def _publish_on_io_thread(self, published, message, correlation_id, reply_to, expiration=None):
+        # Runs on the I/O thread. It never reconnects here (the consumer of the replies would be
+        # lost): a failed publish fails its future and the I/O loop recovers the connection
+        try:
+            self._basic_publish(message, correlation_id, reply_to, expiration)
+        except Exception as e:
+            self.logger.warning(f"Error al enviar mensaje desde el hilo de E/S: {e}")
+            published.set_exception(e)
+            return
+        published.set_result(True)
+
 
 
 
@@ -164,7 +305,20 @@ class AMQP_Msg_Disp:
         self.last_reply_result = self.msg_handler(body)
 
         if self.reply_to_received_msg:
-            self.send_msg(self.last_reply_result)
+            published = self.send_msg(
+                self.last_reply_result,
+                correlation_id=properties.correlation_id,
+                reply_to=properties.reply_to
+            )
+            if published is not None:
+                # Acknowledged once the reply is confirmed, as when it is published on this channel.
+                # The wait is bounded, while RabbitMQ is unreachable the publisher keeps buffering
+                try:
+                    published.result(timeout=self.publish_timeout)
+                except Exception as e:
+                    self.logger.error(f"No se pudo publicar la respuesta, el mensaje se volverá a entregar: {e!r}")
+                    ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+                    return
 
         ch.basic_ack(delivery_tag=method.delivery_tag)
         self.logger.debug("Mensaje procesado y reconocido.")
@@ -176,7 +330,87 @@ class AMQP_Msg_Disp:
             ch.stop_consuming()
             self.logger.info("Consumo detenido tras procesar el mensaje.")
 
-    
+
+    def _on_message_received_concurrent(self, ch, method, properties, body):
+        """
+        Handles the receipt of a message when `handler_workers` > 1: the handler runs in the thread
+        pool and the consuming thread goes on receiving messages.
+
+        Args:
+            ch (BlockingChannel): The communication channel.
+            method (pika.spec.Basic.Deliver): Delivery method.
+            properties (pika.spec.BasicProperties): Message properties.
+            body (bytes): The body of the received message.
+        """
+        self.logger.info(f"Mensaje recibido: {body}")
+        future = self._handler_executor.submit(self.msg_handler, body)
+        future.add_done_callback(functools.partial(self._on_message_handled, ch, method.delivery_tag, properties))
+
+    def _on_message_handled(self, ch, delivery_tag, properties, future):
+        # Runs on the handler thread. The connection can only be used from the consuming thread,
+        # so the reply and the ack are scheduled there
+        try:
+            self.connection.add_callback_threadsafe(
+                functools.partial(self._reply_and_ack, ch, delivery_tag, properties, future)
+            )
+        except (pika.exceptions.ConnectionWrongStateError, pika.exceptions.StreamLostError):
+            self.logger.warning("Conexión cerrada antes de responder, el mensaje se volverá a entregar.")
+
+    def _reply_and_ack(self, ch, delivery_tag, properties, future):
+        """
+        Runs on the consuming thread: publishes the reply of a handled message and then acknowledges
+        it, so a message whose reply was not published is delivered again.
+        """
+        if not ch.is_open:
+            # Delivery tags belong to the channel, the broker redelivers the unacknowledged messages
+            self.logger.warning("Canal cerrado antes de responder, el mensaje se volverá a entregar.")
+            return
+
+        exception = future.exception()
+        if exception is not None:
+            self.logger.error(f"Error al procesar el mensaje: {exception}")
+            ch.basic_nack(delivery_tag=delivery_tag, requeue=False)
+            return
+
+        self.last_reply_result = future.result()
+        if self.reply_to_received_msg:
+            published = self.send_msg(
+                self.last_reply_result,
+                correlation_id=properties.correlation_id,
+                reply_to=properties.reply_to
+            )
+            if published is not None:
+                # Acknowledged when the broker confirms the reply
+                published.add_done_callback(functools.partial(self._on_reply_published, ch, delivery_tag))
+                return
+
+        ch.basic_ack(delivery_tag=delivery_tag)
+        self.logger.debug("Mensaje procesado y reconocido.")
+
+    def _on_reply_published(self, ch, delivery_tag, published):
+        # Runs on the publisher thread, the ack is scheduled on the consuming thread
+        try:
+            self.connection.add_callback_threadsafe(
+                functools.partial(self._ack_published_reply, ch, delivery_tag, published)
+            )
+        except (pika.exceptions.ConnectionWrongStateError, pika.exceptions.StreamLostError):
+            self.logger.warning("Conexión cerrada antes de reconocer, el mensaje se volverá a entregar.")
+
+    def _ack_published_reply(self, ch, delivery_tag, published):
+        if not ch.is_open:
+            self.logger.warning("Canal cerrado antes de reconocer, el mensaje se volverá a entregar.")
+            return
+
+        exception = published.exception()
+        if exception is not None:
+            # The message is delivered again, to publish its reply later
+            self.logger.error(f"No se pudo publicar la respuesta: {exception}")
+            ch.basic_nack(delivery_tag=delivery_tag, requeue=True)
+            return
+
+        ch.basic_ack(delivery_tag=delivery_tag)
+        self.logger.debug("Mensaje procesado y reconocido.")
+
     def get_reply_result(self):
         """
         Retrieves the last result returned by the message handler. This is used when the MsgDispatcher stops consuming,
@@ -199,14 +433,24 @@ class AMQP_Msg_Disp:
         attempt = 0
         received = False
 
-        self.channel.basic_consume(
-            queue=self.receive_queue_name,
-            on_message_callback=self._on_message_received
-        )
+        if self.handler_workers > 1:
+            if self._handler_executor is None:
+                self._handler_executor = ThreadPoolExecutor(max_workers=self.handler_workers, thread_name_prefix="AMQP_Handler")
+            on_message_callback = self._on_message_received_concurrent
+        else:
+            on_message_callback = self._on_message_received
 
+        consume = True
         while not received and attempt <= max_retries:
             try:
                 self.logger.info("Esperando mensajes...")
+                # Registered again after a reconnection, which creates a new channel
+                if consume:
+                    self.channel.basic_consume(
+                        queue=self.receive_queue_name,
+                        on_message_callback=on_message_callback
+                    )
+                    consume = False
                 self.channel.start_consuming()
                 received = True
             except pika.exceptions.AMQPConnectionError as e:
@@ -217,6 +461,7 @@ class AMQP_Msg_Disp:
                         self.logger.info(f"Reintentando en {retry_delay} segundos...")
                         time.sleep(retry_delay)
                         self.__reconnect()  # Intentar reconectar antes del próximo intento
+                        consume = True
                     else:
                         self.logger.error(f"No se pudo enviar el mensaje después de {max_retries} intentos.")
                         raise Exception("Fallo al enviar el mensaje después de múltiples intentos") from e
@@ -224,12 +469,172 @@ class AMQP_Msg_Disp:
                     self.logger.error(f"Error en el canal: {e}")
 
 
+    def send_request(self, message, timeout=None):
+        """
+        Sends a message as a request and returns immediately, without waiting for the reply.
+
+        The message is published with a new `correlation_id` and with the receive queue as
+        `reply_to`. The returned future is resolved with the result of `msg_handler` applied to
+        the reply that carries the same `correlation_id`. Replies to other (or expired) requests
+        are discarded.
+
+        Args:
+            message (str): The message to be sent.
+            timeout (float, optional): Seconds to wait for the reply. When they expire, the future
+                                       fails with `TimeoutError` and a late reply is discarded.
+
+        Returns:
+            concurrent.futures.Future: Future resolved with the handled reply.
+        """
+        self.__start_io_loop()
+
+        correlation_id = uuid.uuid4().hex
+        future = Future()
+        future.deadline = time.monotonic() + timeout if timeout is not None else None
+
+        with self._pending_lock:
+            self.pending_requests[correlation_id] = future
+
+        try:
+            # A request nobody waits for any more is not delivered: dropped from the publisher's
+            # buffer, or discarded by the broker if it is still queued when the timeout expires
+            published = self.send_msg(message, correlation_id=correlation_id, reply_to=self.receive_queue_name, expiration=timeout)
+        except Exception as e:
+            with self._pending_lock:
+                self.pending_requests.pop(correlation_id, None)
+            future.set_exception(e)
+            return future
+
+        if published is not None:
+            published.add_done_callback(functools.partial(self._on_request_published, correlation_id))
+
+        self.logger.debug(f"Petición {correlation_id} enviada.")
+
+        return future
+
+    def _on_request_published(self, correlation_id, published):
+        # A request that could not be published (buffer full, rejected) fails without waiting for its timeout
+        exception = published.exception()
+        if exception is None:
+            return
+
+        with self._pending_lock:
+            future = self.pending_requests.pop(correlation_id, None)
+        if future is not None and not future.done():
+            future.set_exception(exception)
+
+    def __start_io_loop(self):
+        if self._io_running:
+            return
+
+        # The consumer is registered before the thread takes the connection over
+        self.channel.basic_consume(
+            queue=self.receive_queue_name,
+            on_message_callback=self._on_reply_received
+        )
+        self._io_running = True
+        self._io_thread = threading.Thread(target=self.__io_loop, name="AMQP_IO", daemon=True)
+        self._io_thread.start()
+        # Timeouts are enforced by their own thread, so they expire while the I/O thread reconnects
+        self._expiry_thread = threading.Thread(target=self.__expiry_loop, name="AMQP_Expiry", daemon=True)
+        self._expiry_thread.start()
+
+    def __io_loop(self):
+        """
+        Runs on the I/O thread: processes the connection events (replies, scheduled publishes)
+        and reconnects when the connection is lost. It only stops when the dispatcher is closed.
+        """
+        self.logger.info("Hilo de E/S de peticiones iniciado.")
+        while self._io_running:
+            try:
+                self.connection.process_data_events(time_limit=0.05)
+            except Exception as e:
+                if not self._io_running:
+                    break
+                if self.connection.is_open and self.channel.is_open:
+                    self.logger.exception(f"Error en el hilo de E/S: {e}")
+                    continue
+                self.logger.warning(f"Conexión perdida en el hilo de E/S: {e}. Reconectando...")
+                self.__reconnect_io()
+        self.logger.info("Hilo de E/S de peticiones detenido.")
+
+    def __reconnect_io(self):
+        try:
+            self.__reconnect()
+            # The new channel has no consumer, the replies are consumed again
+            self.channel.basic_consume(
+                queue=self.receive_queue_name,
+                on_message_callback=self._on_reply_received
+            )
+        except Exception:
+            # Tried again in the next iteration of the I/O loop
+            self.logger.exception("No se pudo reconectar el hilo de E/S.")
+            self._fail_pending_requests(ConnectionError("Conexión con RabbitMQ perdida"))
+
+    def __expiry_loop(self):
+        while self._io_running:
+            self._expire_pending_requests()
+            time.sleep(0.05)
+
+    def _on_reply_received(self, ch, method, properties, body):
+        """
+        Handles a reply on the I/O thread, resolving the future of the matching request.
+        """
+        with self._pending_lock:
+            future = self.pending_requests.pop(properties.correlation_id, None)
+
+        if future is None:
+            self.logger.warning(f"Respuesta descartada, sin petición pendiente ({properties.correlation_id}): {body}")
+        elif not future.done():
+            try:
+                result = self.msg_handler(body) if self.msg_handler else body
+                future.set_result(result)
+            except Exception as e:
+                future.set_exception(e)
+
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+
+    def _expire_pending_requests(self):
+        now = time.monotonic()
+        with self._pending_lock:
+            expired = [
+                correlation_id for correlation_id, future in self.pending_requests.items()
+                if future.deadline is not None and future.deadline <= now
+            ]
+            futures = [self.pending_requests.pop(correlation_id) for correlation_id in expired]
+
+        for correlation_id, future in zip(expired, futures):
+            self.logger.warning(f"Petición {correlation_id} sin respuesta, tiempo agotado.")
+            if not future.done():
+                future.set_exception(TimeoutError(f"Sin respuesta para la petición {correlation_id}"))
+
+    def _fail_pending_requests(self, exception):
+        with self._pending_lock:
+            futures = list(self.pending_requests.values())
+            self.pending_requests.clear()
+
+        for future in futures:
+            if not future.done():
+                future.set_exception(exception)
+
     def close(self):
         """
 
         Closes the connection to RabbitMQ.
 
         """
+        if self._io_running:
+            self._io_running = False
+            self._io_thread.join()
+            self._expiry_thread.join()
+        if self._handler_executor is not None:
+            # Replies of the messages still being handled are not published, they will be redelivered
+            self._handler_executor.shutdown(wait=False, cancel_futures=True)
+        if self.publisher is not None:
+            self.publisher.close()
+            self.publisher.log_stats()
+        self._fail_pending_requests(ConnectionError("Dispatcher cerrado"))
+
         self.logger.info("Intentando cerrar conexión...")
         if self.connection and self.connection.is_open:
             self.connection.close()
@@ -0,0 +1,336 @@
+import collections
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+import pika
+from pika.adapters.select_connection import IOLoop
+
+
+class PublishBufferFull(Exception):
+    """The message was not accepted because the buffer of unsent messages is full."""
+
+
+class PublishNacked(Exception):
+    """The broker rejected (nack) the message."""
+
+
+class AMQP_Publisher:
+    """
+    High-throughput RabbitMQ publisher with publisher confirms, that never blocks the caller.
+
+    `publish` only appends the message to an in-memory buffer and returns a future. A background
+    I/O thread owns the connection (a pika SelectConnection) and publishes the buffered messages,
+    at once when `batch_size` of them are waiting or every `batch_interval` seconds. Publisher
+    confirms are received asynchronously: the future of a message is resolved when the broker
+    acknowledges it, or fails with `PublishNacked` if the broker rejects it.
+
+    If the connection is lost, the messages sent but not confirmed yet go back to the front of the
+    buffer and are sent again after reconnecting (so a message can be delivered twice), and the
+    reconnection is retried with exponential backoff. Meanwhile new messages are kept in the
+    buffer; once it holds `max_buffer` messages, new ones fail at once with `PublishBufferFull`
+    instead of waiting, so a broker outage never freezes the caller. Messages with an `expiration`
+    that runs out while they are buffered are dropped and their future fails with `TimeoutError`.
+
+    Args:
+        hostname (str): The RabbitMQ server's hostname or IP address.
+        port (int): The RabbitMQ server's port.
+        batch_size (int): Buffered messages that trigger a publish. 1 publishes every message as
+                          soon as it arrives.
+        batch_interval (float): Maximum seconds a message waits in the buffer when `batch_size`
+                                > 1.
+        max_buffer (int): Maximum unsent messages kept in the buffer.
+        persistent_queues (iterable of str, optional): Queues whose messages are published as
+                                                       persistent, the rest are transient.
+        reconnect_delay (float): Seconds before the first reconnection attempt, doubled on every
+                                 failed attempt.
+        max_reconnect_delay (float): Maximum seconds between reconnection attempts.
+
+    Attributes:
+        stats (dict): Number of messages published, confirmed, rejected, dropped because the
+                      buffer was full and expired before being published, and reconnections.
+    """
+
+    def __init__(
+            self, hostname, port,
+            batch_size=1, batch_interval=0.0,
+            max_buffer=1000,
+            persistent_queues=None,
+            reconnect_delay=0.5, max_reconnect_delay=30.0
+        ):
+        if batch_size > 1 and batch_interval <= 0:
+            raise ValueError("batch_size > 1 requiere batch_interval > 0")
+
+        self.hostname = hostname
+        self.port = port
+        self.batch_size = max(1, batch_size)
+        self.batch_interval = batch_interval
+        self.max_buffer = max_buffer
+        self.persistent_queues = set(persistent_queues or ())
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+
+        self.stats = {"published": 0, "confirmed": 0, "nacked": 0, "dropped": 0, "expired": 0, "reconnects": 0}
+        # Messages waiting to be published: (routing_key, body, properties, future, deadline)
+        self._buffer = collections.deque()
+        self._lock = threading.Lock()
+        # Messages published and not confirmed yet, by delivery tag
+        self._unconfirmed = collections.OrderedDict()
+        self._delivery_tag = 0
+        self._connection = None
+        self._channel = None
+        self._ready = False
+        self._stopping = False
+        self._reconnect_attempt = 0
+        self._flush_scheduled = False
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self._ioloop = IOLoop()
+        self._thread = threading.Thread(target=self.__run, name="AMQP_Publisher", daemon=True)
+        self._thread.start()
+
+    def publish(self, message, routing_key, correlation_id=None, reply_to=None, expiration=None):
+        """
+        Queues a message to be published to a queue, without waiting.
+
+        Args:
+            message (str or bytes): The message to be sent.
+            routing_key (str): The queue the message is sent to.
+            correlation_id (str, optional): Correlation ID of the request the message belongs to.
+            reply_to (str, optional): Queue where the reply to this message should be sent.
+            expiration (float, optional): Seconds the message is valid for. It is dropped if it is
+                                          still buffered after them, and the broker discards it
+                                          if it is not consumed in the time left when published.
+
+        Returns:
+            concurrent.futures.Future: Future resolved when the broker confirms the message. It
+                                       fails with `PublishBufferFull`, `PublishNacked`,
+                                       `TimeoutError` or `ConnectionError` if the message could
+                                       not be published.
+        """
+        future = Future()
+        deadline = time.monotonic() + expiration if expiration is not None else None
+        properties = pika.BasicProperties(
+            correlation_id=correlation_id,
+            reply_to=reply_to,
+            delivery_mode=(
+                pika.DeliveryMode.Persistent if routing_key in self.persistent_queues
+                else pika.DeliveryMode.Transient
+            )
+        )
+
+        with self._lock:
+            if self._stopping:
+                future.set_exception(ConnectionError("Publicador cerrado"))
+                return future
+            if len(self._buffer) >= self.max_buffer:
+                self.stats["dropped"] += 1
+                future.set_exception(PublishBufferFull(f"Búfer de mensajes sin enviar lleno ({self.max_buffer})"))
+                return future
+
+            self._buffer.append((routing_key, message, properties, future, deadline))
+            # Only one wake-up of the I/O thread is pending at a time
+            wake_up = len(self._buffer) >= self.batch_size and not self._flush_scheduled
+            if wake_up:
+                self._flush_scheduled = True
+
+        if wake_up:
+            self._ioloop.add_callback_threadsafe(self._flush)
+        return future
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, "buffered": len(self._buffer), "unconfirmed": len(self._unconfirmed), "connected": self._ready}
+
+    def log_stats(self):
+        stats = self.get_stats()
+        self.logger.info(
+            f"Mensajes publicados={stats['published']} confirmados={stats['confirmed']} "
+            f"rechazados={stats['nacked']} descartados={stats['dropped']} caducados={stats['expired']} en búfer={stats['buffered']} "
+            f"sin confirmar={stats['unconfirmed']} reconexiones={stats['reconnects']}"
+        )
+
+    def close(self, timeout=5.0):
+        """
+        Publishes the buffered messages, waits up to `timeout` seconds for their confirms and closes
+        the connection. The futures of the messages not confirmed fail with `ConnectionError`.
+        """
+        with self._lock:
+            if self._stopping:
+                return
+            self._stopping = True
+
+        self._ioloop.add_callback_threadsafe(self._flush)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if self._ready and not self._buffer and not self._unconfirmed:
+                    break
+                if not self._ready and self._connection is None:
+                    break
+            time.sleep(0.01)
+
+        self._ioloop.add_callback_threadsafe(self._shutdown)
+        self._thread.join(timeout)
+        self._fail_all(ConnectionError("Publicador cerrado"))
+
+    def __run(self):
+        self._connect()
+        if self.batch_interval > 0 and self.batch_size > 1:
+            self._ioloop.call_later(self.batch_interval, self._on_batch_timer)
+        self._ioloop.start()
+        self.logger.info("Hilo del publicador detenido.")
+
+    # The methods below run on the I/O thread
+
+    def _connect(self):
+        if self._stopping:
+            self._ioloop.stop()
+            return
+        self._connection = pika.SelectConnection(
+            pika.ConnectionParameters(host=self.hostname, port=self.port, heartbeat=600, blocked_connection_timeout=300),
+            on_open_callback=self._on_connection_open,
+            on_open_error_callback=self._on_connection_open_error,
+            on_close_callback=self._on_connection_closed,
+            custom_ioloop=self._ioloop
+        )
+
+    def _on_connection_open(self, connection):
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_channel_open(self, channel):
+        self._channel = channel
+        channel.add_on_close_callback(self._on_channel_closed)
+        channel.confirm_delivery(self._on_delivery_confirmation, callback=self._on_confirm_selected)
+
+    def _on_confirm_selected(self, _frame):
+        with self._lock:
+            self._ready = True
+            self._delivery_tag = 0
+        self._reconnect_attempt = 0
+        self.logger.info("Publicador conectado a RabbitMQ con confirmaciones.")
+        self._flush()
+
+    def _on_connection_open_error(self, _connection, error):
+        self.logger.warning(f"No se pudo conectar el publicador con RabbitMQ: {error}")
+        self._connection = None
+        self._schedule_reconnect()
+
+    def _on_channel_closed(self, _channel, reason):
+        self.logger.warning(f"Canal del publicador cerrado: {reason}")
+        self._channel = None
+        if self._connection is not None and self._connection.is_open:
+            self._connection.close()
+
+    def _on_connection_closed(self, _connection, reason):
+        with self._lock:
+            self._ready = False
+            # Sent again after reconnecting, ahead of the messages buffered meanwhile
+            self._buffer.extendleft(reversed(list(self._unconfirmed.values())))
+            self._unconfirmed.clear()
+        self._channel = None
+        self._connection = None
+
+        if self._stopping:
+            self._ioloop.stop()
+            return
+        self.logger.warning(f"Conexión del publicador perdida: {reason}")
+        self._schedule_reconnect()
+
+    def _schedule_reconnect(self):
+        if self._stopping:
+            self._ioloop.stop()
+            return
+        # Exponential backoff with jitter, so the clients do not reconnect all at the same time
+        delay = min(self.max_reconnect_delay, self.reconnect_delay * 2 ** self._reconnect_attempt)
+        delay *= random.uniform(0.5, 1.0)
+        self._reconnect_attempt += 1
+        with self._lock:
+            self.stats["reconnects"] += 1
+        self.logger.info(f"Reconectando el publicador en {delay:.1f} segundos (intento {self._reconnect_attempt})...")
+        self._ioloop.call_later(delay, self._connect)
+
+    def _on_batch_timer(self):
+        self._flush()
+        if not self._stopping:
+            self._ioloop.call_later(self.batch_interval, self._on_batch_timer)
+
+    def _flush(self):
+        """Publishes every buffered message, if the channel is ready."""
+        with self._lock:
+            self._flush_scheduled = False
+            if not self._ready:
+                return
+            messages = list(self._buffer)
+            self._buffer.clear()
+
+        channel = self._channel
+        now = time.monotonic()
+        for index, (routing_key, body, properties, future, deadline) in enumerate(messages):
+            if deadline is not None:
+                # The broker counts the expiration from when it receives the message
+                remaining_ms = int((deadline - now) * 1000)
+                if remaining_ms <= 0:
+                    with self._lock:
+                        self.stats["expired"] += 1
+                    if not future.done():
+                        future.set_exception(TimeoutError("Mensaje caducado antes de publicarse"))
+                    continue
+                properties.expiration = str(remaining_ms)
+
+            try:
+                channel.basic_publish(exchange='', routing_key=routing_key, body=body, properties=properties)
+            except Exception as e:
+                # The connection is closing, the rest are sent after reconnecting
+                self.logger.warning(f"Error al publicar: {e}")
+                with self._lock:
+                    self._buffer.extendleft(reversed(messages[index:]))
+                return
+
+            with self._lock:
+                self._delivery_tag += 1
+                self._unconfirmed[self._delivery_tag] = (routing_key, body, properties, future, deadline)
+                self.stats["published"] += 1
+
+    def _on_delivery_confirmation(self, method_frame):
+        method = method_frame.method
+        acked = isinstance(method, pika.spec.Basic.Ack)
+
+        with self._lock:
+            # With `multiple`, every message up to the delivery tag is confirmed
+            if method.multiple:
+                tags = [tag for tag in self._unconfirmed if tag <= method.delivery_tag]
+            else:
+                tags = [method.delivery_tag] if method.delivery_tag in self._unconfirmed else []
+            futures = [self._unconfirmed.pop(tag)[3] for tag in tags]
+            self.stats["confirmed" if acked else "nacked"] += len(futures)
+
+        for future in futures:
+            if future.done():
+                continue
+            if acked:
+                future.set_result(True)
+            else:
+                future.set_exception(PublishNacked("Mensaje rechazado por RabbitMQ"))
+
+    def _shutdown(self):
+        # Closing the connection (also while it is being opened) stops the loop in its close callback
+        if self._connection is None or self._connection.is_closing or self._connection.is_closed:
+            self._ioloop.stop()
+            return
+        try:
+            self._connection.close()
+        except pika.exceptions.ConnectionWrongStateError:
+            self._ioloop.stop()
+
+    def _fail_all(self, exception):
+        with self._lock:
+            futures = [message[3] for message in self._buffer] + [message[3] for message in self._unconfirmed.values()]
+            self._buffer.clear()
+            self._unconfirmed.clear()
+
+        for future in futures:
+            if not future.done():
+                future.set_exception(exception)
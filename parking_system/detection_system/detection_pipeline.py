@@ -0,0 +1,281 @@
+import json
+import functools
+import threading
+import time
+from datetime import datetime, timezone
+
+import cv2
+
+from parking_system.other_util_classes.frame_pipeline import FramePipeline, PipelineStage
+from parking_system.other_util_classes.plate_tracker import PlateTracker
+from parking_system.base_config import BaseConfig, ScreenMessageKey
+
+last_code = None
+last_code_lock = threading.Lock()
+
+def update_screen_state(code, dispatcher, plate=None):
+    """
+    Sends a message to the screen only if it differs from the last sent message.
+    It can be called from any stage of the pipeline.
+    """
+
+    global last_code
+
+    message_dict = {"state_code": code}
+    if plate is not None:
+        message_dict["plate"] = plate
+    message = json.dumps(message_dict)
+    
+    with last_code_lock:
+        if code == last_code:
+            return
+        last_code = code
+
+    dispatcher.send_msg(message)
+    print(f"Screen Message: {message}")
+
+
+
+class DetectionState:
+    """
+    State shared between the pipeline stages of the detection system.
+
+    Attributes:
+        last_detected_plate (str or None): The last plate sent to the verifier.
+        last_detection_time (datetime or None): The time when the last plate was sent to the verifier.
+        opened_gate (bool): Indicates if the gate is open based on the last verification result.
+    """
+
+    def __init__(self):
+        self.last_detected_plate = None
+        self.last_detection_time = None
+        self.opened_gate = False
+        self.lock = threading.Lock()
+
+
+def create_tracker(plate_validator=None):
+    """
+    Creates the plate tracker with the parameters of `BaseConfig`.
+
+    Args:
+        plate_validator (callable, optional): Function that checks if a voted plate is valid.
+
+    Returns:
+        PlateTracker: The tracker.
+    """
+    return PlateTracker(
+        iou_threshold=BaseConfig.TRACKER_IOU_THRESHOLD,
+        max_missed_frames=BaseConfig.NO_PLATE_TIMEOUT_FRAMES,
+        min_votes=BaseConfig.TRACKER_MIN_VOTES,
+        min_agreement=BaseConfig.TRACKER_MIN_AGREEMENT,
+        max_ocr_calls=BaseConfig.TRACKER_MAX_OCR_CALLS,
+        plate_validator=plate_validator
+    )
+
+
+def draw_detection(frame, ymin, xmin, ymax, xmax, confidence):
+    """
+    Draws the bounding box and the confidence label of a detection on the frame.
+    """
+    cv2.rectangle(frame, (xmin, ymin), (xmax, ymax), (0, 255, 0), 2)
+
+    # Draw the detection label
+    label = f'license: {int(confidence * 100)}%'
+    labelSize, baseLine = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)
+    label_ymin = max(ymin, labelSize[1] + 10)
+
+    cv2.rectangle(frame, (xmin, label_ymin - labelSize[1] - 10), 
+                  (xmin + labelSize[0], label_ymin + baseLine - 10), 
+                  (255, 255, 255), cv2.FILLED)
+
+    cv2.putText(frame, label, (xmin, label_ymin - 7), 
+                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 2)
+
+
+def build_pipeline(
+        webcam, detector, ocr_processor, tracker,
+        parking_msg_dispatcher, screen_dispatcher, state,
+        decision_callback=None, stats_window=256, motion_gate=None
+    ):
+    """
+    Builds the detection pipeline. Every stage runs on its own thread and stages are connected
+    by bounded queues that drop the oldest item when full, so the detector keeps running at 
+    full speed while OCR and verification are done in the background:
+
+        capture -> detect -> ocr -> verify
+                     |
+                     +-> display (consumed by the main thread, pygame needs it)
+
+    The detected plates are followed across frames by the tracker. OCR is only applied to the
+    tracks whose plate has not been confirmed yet, and a plate is sent to the verifier once, when
+    the OCR vote of its track is confident.
+
+    If a motion gate is given, frames are sampled at its idle frame rate and only checked for
+    motion while nothing moves in front of the camera, and the detector only runs while there is
+    motion or a tracked plate.
+
+    Args:
+        webcam (WebcamCapture or Pi_WebcamCapture): The frame source.
+        detector (LicensePlateDetector): The license plate detector.
+        ocr_processor (OCRProcessor): The OCR processor.
+        tracker (PlateTracker): The tracker that follows the plates and votes the OCR readings.
+        parking_msg_dispatcher (AMQP_Msg_Disp): Dispatcher used to verify the plates.
+        screen_dispatcher (MQTT_Msg_Disp): Dispatcher used to update the screen.
+        state (DetectionState): State shared between the stages.
+        decision_callback (callable, optional): Called with the plate, the verifier decision and the
+                                                seconds since the plate was first detected, every time
+                                                a verification reply arrives.
+        stats_window (int): Number of samples kept by the statistics of every stage.
+        motion_gate (MotionGate, optional): Change detector that decides which frames are detected.
+
+    Returns:
+        tuple: The pipeline and the queue with the frames to display.
+    """
+    pipeline = FramePipeline(stats_window=stats_window)
+
+    frame_queue = pipeline.add_queue("frames", maxsize=1)
+    display_queue = pipeline.add_queue("display", maxsize=1)
+    # The ROIs of consecutive frames are accumulated while OCR is busy and recognized in one batch
+    ocr_queue = pipeline.add_queue("ocr", maxsize=BaseConfig.OCR_BATCH_SIZE)
+    verify_queue = pipeline.add_queue("verify", maxsize=BaseConfig.VERIFY_QUEUE_SIZE)
+    # RGB frames (Pi camera) are only for the detector tensor, PaddleOCR expects BGR images
+    rgb_frames = getattr(webcam, "color_order", "BGR") == "RGB"
+
+    def capture_stage():
+        # Blocks until the camera delivers a frame that has not been processed yet
+        captured = webcam.get_next_frame(timeout=PipelineStage.poll_timeout)
+        if captured is None:
+            return None
+        if motion_gate is not None and not motion_gate.should_sample(captured.timestamp):
+            return None
+        return captured.frame
+
+    def detect_stage(frame):
+        if motion_gate is not None and not motion_gate.check(frame, keep_active=tracker.has_tracks()):
+            # Static scene, nothing to detect
+            return frame, []
+
+        # Perform license plate detection, there can be a plate in every lane seen by the camera
+        plates, rois = detector.detect_license_plates(frame)
+        detections = [
+            (roi, (int(plate['ymin']), int(plate['xmin']), int(plate['ymax']), int(plate['xmax'])), float(plate['score']))
+            for plate, roi in zip(plates, rois)
+        ]
+
+        had_tracks = tracker.has_tracks()
+        tracks = tracker.update([box for _, box, _ in detections])
+
+        for (roi, _, _), track in zip(detections, tracks):
+            if tracker.needs_ocr(track):
+                # The ROI is copied because the display stage draws over the frame
+                roi = cv2.cvtColor(roi, cv2.COLOR_RGB2BGR) if rgb_frames else roi.copy()
+                ocr_queue.put_drop_oldest((track.track_id, roi))
+
+        if had_tracks and not tracker.has_tracks():
+            # No se detecta matrícula, the vehicle has left
+            with state.lock:
+                state.last_detected_plate = None
+            update_screen_state(ScreenMessageKey.DETECTING, screen_dispatcher)
+
+        return frame, [(*box, confidence) for _, box, confidence in detections]
+
+    def ocr_stage(items):
+        track_ids = [track_id for track_id, _ in items]
+        rois = [roi for _, roi in items]
+
+        # Apply OCR to the detected regions of interest (ROI)
+        plates = ocr_processor.apply_ocr_batch(rois, recognition_only=BaseConfig.OCR_RECOGNITION_ONLY)
+
+        for track_id, plate in zip(track_ids, plates):
+            if tracker.add_reading(track_id, plate) == "failed":
+                update_screen_state(ScreenMessageKey.OCR_FAIL, screen_dispatcher)
+
+        for track in tracker.take_confirmed():
+            send_confirmed_plate(track)
+
+        return None
+
+    def send_confirmed_plate(track):
+        detected_plate = track.confirmed_plate
+        print(f"Detected Plate: {detected_plate}")
+
+        current_time = datetime.now(timezone.utc)
+
+        with state.lock:
+            last_detected_plate = state.last_detected_plate
+            last_detection_time = state.last_detection_time
+            # Update the last detection time
+            state.last_detection_time = current_time
+            state.last_detected_plate = detected_plate
+
+        # Avoid logging the same plate if it was recently detected (e.g. the track was lost and found again)
+        if ((detected_plate != last_detected_plate or last_detected_plate is None)
+            or ((current_time - last_detection_time).total_seconds() > BaseConfig.TIME_LAST_DETECT_THRESHOLD)):
+
+            #Send message that license has been read
+            update_screen_state(ScreenMessageKey.VERIFYING, screen_dispatcher, plate=detected_plate)
+            print(f"{detected_plate} will be sent to verifier")
+            verify_queue.put_drop_oldest((track.track_id, track.created_at, detected_plate, current_time))
+            return
+
+        print(f"Not logging / verifying {detected_plate} again." +
+                f" Gate will remain in same state (Opened = {state.opened_gate})")
+        show_gate_state(state.opened_gate, detected_plate, screen_dispatcher)
+
+    def on_verify_reply(track_id, detected_at, detected_plate, future):
+        # Runs on the dispatcher I/O thread when the reply arrives or the request expires
+        try:
+            response_dict = future.result()
+        except Exception as e:
+            print(f"No se ha podido verificar {detected_plate}: {e}")
+            with state.lock:
+                # Allow the plate to be verified again on the next reading
+                if state.last_detected_plate == detected_plate:
+                    state.last_detected_plate = None
+            tracker.reopen(track_id)
+            return
+
+        with state.lock:
+            state.opened_gate = response_dict["allowed"]
+
+        if decision_callback is not None:
+            decision_callback(detected_plate, response_dict["allowed"], time.monotonic() - detected_at)
+
+        show_gate_state(response_dict["allowed"], detected_plate, screen_dispatcher)
+
+    def verify_stage(item):
+        track_id, detected_at, detected_plate, current_time = item
+
+        timestamp_str = current_time.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+        # Create the message payload
+        msg_dict = {
+            "plate": detected_plate,
+            "date": timestamp_str
+        }
+
+        # Convert the message to JSON
+        message = json.dumps(msg_dict)
+
+        # Send the message to the verifier, the reply is handled when it arrives
+        future = parking_msg_dispatcher.send_request(message, timeout=BaseConfig.VERIFY_TIMEOUT)
+        future.add_done_callback(functools.partial(on_verify_reply, track_id, detected_at, detected_plate))
+        return None
+
+    pipeline.add_stage("capture", capture_stage, output_queue=frame_queue)
+    pipeline.add_stage("detect", detect_stage, input_queue=frame_queue, output_queue=display_queue)
+    pipeline.add_stage("ocr", ocr_stage, input_queue=ocr_queue, batch_size=BaseConfig.OCR_BATCH_SIZE)
+    pipeline.add_stage("verify", verify_stage, input_queue=verify_queue)
+
+    return pipeline, display_queue
+
+
+def show_gate_state(opened_gate, plate, screen_dispatcher):
+    if opened_gate:
+        #Send message that car is allowed
+        update_screen_state(ScreenMessageKey.ALLOWED, screen_dispatcher, plate=plate)
+        print("Allowed to enter")
+    else:
+        print("Denied to enter")
+        #Send message that car is not allowed
+        update_screen_state(ScreenMessageKey.DENIED, screen_dispatcher, plate=plate)
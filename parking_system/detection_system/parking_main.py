@@ -1,5 +1,4 @@
 import argparse
-from datetime import datetime, timezone
 import pathlib
 import cv2
 import json
@@ -7,6 +6,8 @@ import sys
 import os
 import pygame
 import numpy as np
+import queue
+import time
 import traceback
 
 # Add project root directory to sys.path
@@ -16,29 +17,12 @@ from logging_module.logger_setup import setup_logger
 from parking_system.communication.amqp_msg import AMQP_Msg_Disp
 from parking_system.communication.mqtt_msg import MQTT_Msg_Disp
 from parking_system.other_util_classes.license_plate_detector import LicensePlateDetector
+from parking_system.other_util_classes.inference_backends import create_interpreter
 from parking_system.other_util_classes.webcam_capture import WebcamCapture
 from parking_system.other_util_classes.ocr_processor import OCRProcessor
-from parking_system.base_config import BaseConfig, ScreenMessageKey
-
-last_code = None
-
-def update_screen_state(code, dispatcher, plate=None):
-    """
-    Sends a message to the screen only if it differs from the last sent message.
-    """
-
-    global last_code
-
-    message_dict = {"state_code": code}
-    if plate is not None:
-        message_dict["plate"] = plate
-    message = json.dumps(message_dict)
-    
-    if code != last_code:
-        dispatcher.send_msg(message)
-        print(f"Screen Message: {message}")
-        last_code = code
-
+from parking_system.other_util_classes.motion_gate import MotionGate
+from parking_system.detection_system.detection_pipeline import DetectionState, build_pipeline, create_tracker, draw_detection
+from parking_system.base_config import BaseConfig
 
 def detect_msg_handler(message):
     """
@@ -75,18 +59,19 @@ def main():
     performs OCR to recognize the detected plates, and sends the recognized plates to a verifier 
     via message dispatching for further processing (e.g., checking if the vehicle is allowed to enter).
 
+    Capture, detection, OCR and verification run as stages of a pipeline, each one on its own
+    thread (see `build_pipeline`), while the main thread displays the detection results in real-time
+    and periodically logs the FPS and latency of every stage.
+
     It includes mechanisms to avoid logging the same plate multiple times within a short period, 
-    updates the gate state based on the verifier's response, and displays the detection results in real-time.
+    and updates the gate state based on the verifier's response.
 
     Attributes:
         script_dir (Path): The directory where the script is located.
-        model_path (Path): Path to the license plate detector model.
+        models_dir (Path): Directory of the license plate detector models.
         min_detection_confidence (float): Minimum confidence threshold for detecting a license plate.
-        last_detected_plate (str or None): The last detected plate string.
-        last_detection_time (datetime or None): The time when the last plate detection occurred.
-        time_last_detect_threshold (int): Time threshold in seconds for considering a plate as a duplicate detection.
+        state (DetectionState): State shared between the pipeline stages.
         parking_msg_dispatcher (MsgDispatcher): The dispatcher for sending and receiving messages for verification.
-        opened_gate (bool): Indicates if the gate is open based on the last verification result.
     """
 
     # Set up argument parser
@@ -108,20 +93,20 @@ def main():
     
         from parking_system.other_util_classes.pi_webcam_capture import Pi_WebcamCapture
 
-        webcam = Pi_WebcamCapture()
+        webcam = Pi_WebcamCapture(buffer_size=BaseConfig.CAMERA_BUFFER_SIZE)
 
         if args.show_camera_config:
             webcam.show_available_configurations()
             sys.exit(0)
     
-        webcam.start(args.camera_config_index)
+        webcam.start(args.camera_config_index, rgb_frames=BaseConfig.PI_CAMERA_RGB_FRAMES)
 
     else:
-        webcam = WebcamCapture(BaseConfig.WEBCAM_INDEX_OR_URL)
+        webcam = WebcamCapture(BaseConfig.WEBCAM_INDEX_OR_URL, buffer_size=BaseConfig.CAMERA_BUFFER_SIZE)
         print("Parametros de configuración no disponibles para otras camaras distintas a Picamera2. Continuando con ejecución normal")
   
     script_dir = pathlib.Path(__file__).parent.absolute()
-    model_path = script_dir / '../../models/saved_model/license-detector_edgetpu.tflite'
+    models_dir = script_dir / '../../models/saved_model'
     min_detection_confidence = 0.9
     ocr_min_confidence = 0.9
     
@@ -130,16 +115,6 @@ def main():
     
     if BaseConfig.OCR_MIN_CONFIDENCE:
          ocr_min_confidence = BaseConfig.OCR_MIN_CONFIDENCE
-     
-
-    # Variables to avoid logging duplicates
-    last_detected_plate = None
-    last_detection_time = None
-    time_last_detect_threshold = 3
-
-    ocr_locked = False
-    no_plate_counter = 0
-    NO_PLATE_TIMEOUT_FRAMES = 25
 
     setup_logger()
 
@@ -151,7 +126,12 @@ def main():
             receive_queue_name=BaseConfig.DETECTOR_QUEUE_NAME,
             msg_handler=detect_msg_handler,
             reply_to_received_message=False,
-            stop_consuming_after_received_message=True
+            stop_consuming_after_received_message=True,
+            publisher_confirms=BaseConfig.AMQP_PUBLISHER_CONFIRMS,
+            publish_batch_size=BaseConfig.AMQP_PUBLISH_BATCH_SIZE,
+            publish_batch_interval=BaseConfig.AMQP_PUBLISH_BATCH_INTERVAL,
+            publish_buffer_size=BaseConfig.AMQP_PUBLISH_BUFFER_SIZE,
+            persistent_queues=BaseConfig.AMQP_PERSISTENT_QUEUES
         )
 
     # Create the message dispatcher for communication with screen
@@ -164,153 +144,86 @@ def main():
             stop_consuming_after_received_message=True
         )
 
-    opened_gate = False
-
     # Initialize the license plate detector, webcam, and OCR processor
-    detector = LicensePlateDetector(str(model_path), min_detection_confidence)
-    ocr_processor = OCRProcessor(min_confidence=ocr_min_confidence)
+    interpreter, _ = create_interpreter(
+        BaseConfig.DETECTOR_BACKEND, models_dir,
+        num_threads=BaseConfig.DETECTOR_NUM_THREADS,
+        model_files=BaseConfig.DETECTOR_MODEL_FILES,
+        fallback_backend_name=BaseConfig.DETECTOR_FALLBACK_BACKEND
+    )
+    detector = LicensePlateDetector(
+        None, min_detection_confidence,
+        max_detections=BaseConfig.DETECTION_MAX_PLATES,
+        nms_iou_threshold=BaseConfig.DETECTION_NMS_IOU_THRESHOLD,
+        frame_is_rgb=webcam.color_order == "RGB",
+        interpreter=interpreter
+    )
+    ocr_processor = OCRProcessor(min_confidence=ocr_min_confidence, rec_batch_num=BaseConfig.OCR_BATCH_SIZE)
+
+    tracker = create_tracker(plate_validator=ocr_processor.is_valid_plate)
+
+    motion_gate = None
+    if BaseConfig.MOTION_GATE_ENABLED:
+        motion_gate = MotionGate(
+            roi=BaseConfig.MOTION_ROI,
+            downscale_width=BaseConfig.MOTION_DOWNSCALE_WIDTH,
+            pixel_threshold=BaseConfig.MOTION_PIXEL_THRESHOLD,
+            min_changed_fraction=BaseConfig.MOTION_MIN_CHANGED_FRACTION,
+            hold_seconds=BaseConfig.MOTION_HOLD_SECONDS,
+            idle_fps=BaseConfig.IDLE_FPS,
+            active_fps=BaseConfig.ACTIVE_FPS
+        )
+
+    state = DetectionState()
+    pipeline, display_queue = build_pipeline(
+        webcam, detector, ocr_processor, tracker,
+        parking_msg_dispatcher, parking_to_screen_msg_dispatcher, state,
+        motion_gate=motion_gate
+    )
 
     # Initialize pygame for displaying the frames
     pygame.init()
     webcam_feed_window = None
+    last_stats_time = time.monotonic()
 
     try:
-        while True:
-            # Capture a frame from the webcam
-            frame = webcam.get_frame()
-            
-            # Perform license plate detection
-            roi, ymin, xmin, ymax, xmax, confidence = detector.detect_license_plate(frame)
-            
-
-            if roi is not None:
-                cv2.rectangle(frame, (xmin, ymin), (xmax, ymax), (0, 255, 0), 2)
-
-                #Send message that a plate has been detected
-                #update_screen_state(ScreenMessageKey.READING, parking_to_screen_msg_dispatcher)
-
-                # Draw the detection label
-                label = f'license: {int(confidence * 100)}%'
-                labelSize, baseLine = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)
-                label_ymin = max(ymin, labelSize[1] + 10)
-
-                cv2.rectangle(frame, (xmin, label_ymin - labelSize[1] - 10), 
-                              (xmin + labelSize[0], label_ymin + baseLine - 10), 
-                              (255, 255, 255), cv2.FILLED)
-
-                cv2.putText(frame, label, (xmin, label_ymin - 7), 
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 2)
-
-                if not ocr_locked:
-                    # Apply OCR to the detected region of interest (ROI)
-                    detected_plate = ocr_processor.apply_ocr(roi)
-
-                    if detected_plate:
-                        print(f"Detected Plate: {detected_plate}")
-
-                        current_time = datetime.now(timezone.utc)
-
-                        # Avoid logging the same plate if it was recently detected
-                        if ((detected_plate != last_detected_plate or last_detected_plate is None)
-                            or ((current_time - last_detection_time).total_seconds() >  time_last_detect_threshold)):
-                            
-                            #Send message that license has been read
-                            update_screen_state(ScreenMessageKey.VERIFYING, parking_to_screen_msg_dispatcher, plate=detected_plate)
-
-                            # Update the last detected plate
-                            last_detected_plate = detected_plate
-                            print(f"{detected_plate} will be sent to verifier")
-
-                            timestamp_str = current_time.strftime('%Y-%m-%dT%H:%M:%SZ')
-
-                            # Create the message payload
-                            msg_dict = {
-                                "plate": detected_plate,
-                                "date": timestamp_str
-                            }
-
-                            # Convert the message to JSON
-                            message = json.dumps(msg_dict)
-
-                            # Send the message to the verifier and wait for a response
-                            parking_msg_dispatcher.send_msg(message=message)
-
-                            good_response = False
-
-                            while not good_response:
-                                parking_msg_dispatcher.wait_and_receive_msg()
-                                response_dict = parking_msg_dispatcher.get_reply_result()
-                                print(response_dict["plate"])
-                                print(response_dict["allowed"])
-                                print(detected_plate)
-
-                                if response_dict["plate"] == detected_plate:
-                                    opened_gate = response_dict["allowed"]
-                                    good_response = True
-
-                                
-                        else:
-                            print(f"Not logging / verifying {detected_plate} again." +
-                                    f" Gate will remain in same state (Opened = {opened_gate})")
-                            
-                        if opened_gate:
-                                #Send message that car is allowed
-                            update_screen_state(ScreenMessageKey.ALLOWED, parking_to_screen_msg_dispatcher, plate=detected_plate)
-                            print("Allowed to enter")
-                        else:
-                            print("Denied to enter")
-                            #Send message that car is not allowed
-                            update_screen_state(ScreenMessageKey.DENIED, parking_to_screen_msg_dispatcher, plate=detected_plate)
-                        
-                        # Update the last detection time
-                        last_detection_time = current_time
-                        last_detected_plate = detected_plate
-                        
-                    else:
-                        update_screen_state(ScreenMessageKey.OCR_FAIL, parking_to_screen_msg_dispatcher)
-
-                else:
-                     # OCR bloqueado, pero revisamos si cambió la matrícula
-                    plate_text = ocr_processor.apply_ocr(roi)
-                    if plate_text and plate_text != last_detected_plate:
-                        print(f"Nueva matrícula detectada: {plate_text}")
-                        update_screen_state(ScreenMessageKey.READING, parking_to_screen_msg_dispatcher)
-                        update_screen_state(ScreenMessageKey.DETECTING, parking_to_screen_msg_dispatcher)
-                        no_plate_counter = 0  
-            else:
-               # No se detecta matrícula
-                no_plate_counter += 1
-                if no_plate_counter >= NO_PLATE_TIMEOUT_FRAMES:
-                    ocr_locked = False
-                    last_detected_plate = None
-                    no_plate_counter = 0
-                    update_screen_state(ScreenMessageKey.DETECTING, parking_to_screen_msg_dispatcher)
-
-            # Convert frame to RGB for pygame
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frame_surface = pygame.surfarray.make_surface(np.transpose(frame_rgb, (1, 0, 2)))
-            
-            #frame_surface = pygame.surfarray.make_surface(np.transpose(frame, (1, 0, 2)))
-
-            # Initialize screen if not already initialized
-            if webcam_feed_window is None:
-                height, width = frame.shape[:2]
-                webcam_feed_window = pygame.display.set_mode((width, height))
-                pygame.display.set_caption("Detección de Matrículas")
-
-            # Display the frame
-            webcam_feed_window.blit(frame_surface, (0, 0))
-            pygame.display.flip()
+        pipeline.start()
+
+        while pipeline.is_running():
+            try:
+                frame, detections = display_queue.get(timeout=0.1)
+            except queue.Empty:
+                frame = None
+
+            if frame is not None:
+                for detection in detections:
+                    draw_detection(frame, *detection)
+
+                # Convert frame to RGB for pygame
+                frame_rgb = frame if webcam.color_order == "RGB" else cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                frame_surface = pygame.surfarray.make_surface(np.transpose(frame_rgb, (1, 0, 2)))
+
+                # Initialize screen if not already initialized
+                if webcam_feed_window is None:
+                    height, width = frame.shape[:2]
+                    webcam_feed_window = pygame.display.set_mode((width, height))
+                    pygame.display.set_caption("Detección de Matrículas")
+
+                # Display the frame
+                webcam_feed_window.blit(frame_surface, (0, 0))
+                pygame.display.flip()
 
             # Handle events and allow exiting with the 'q' key
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     raise KeyboardInterrupt
 
-            # Display the frame with the drawn detection
-            #cv2.imshow('Frame', frame)
-            #if cv2.waitKey(1) & 0xFF == ord('q'):
-                #break
+            if time.monotonic() - last_stats_time >= BaseConfig.PIPELINE_STATS_INTERVAL:
+                pipeline.log_stats()
+                webcam.log_stats()
+                if motion_gate is not None:
+                    motion_gate.log_stats()
+                last_stats_time = time.monotonic()
 
     except KeyboardInterrupt:
         print("Interrupción manual detectada. Cerrando el programa...")
@@ -320,11 +233,11 @@ def main():
 
     finally:
         # Release resources and close the application
+        pipeline.stop()
         webcam.release()
-        #cv2.destroyAllWindows()
         pygame.quit()
         parking_msg_dispatcher.close()  # Close the RabbitMQ connection when finished
         parking_to_screen_msg_dispatcher.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -61,7 +61,13 @@ def main():
             receive_queue_name=BaseConfig.GATE_QUEUE_NAME,
             reply_to_received_message=True,
             msg_handler=gate_msg_handler,
-            stop_consuming_after_received_message=False
+            stop_consuming_after_received_message=False,
+            publisher_confirms=BaseConfig.AMQP_PUBLISHER_CONFIRMS,
+            publish_batch_size=BaseConfig.AMQP_PUBLISH_BATCH_SIZE,
+            publish_batch_interval=BaseConfig.AMQP_PUBLISH_BATCH_INTERVAL,
+            publish_buffer_size=BaseConfig.AMQP_PUBLISH_BUFFER_SIZE,
+            publish_timeout=BaseConfig.AMQP_PUBLISH_TIMEOUT,
+            persistent_queues=BaseConfig.AMQP_PERSISTENT_QUEUES
         )
 
         
@@ -0,0 +1,200 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class DecisionCache:
+    """
+    Local cache of the verification decisions, so the verifier can answer a gate without calling
+    the backend. Allowed and denied plates are kept with different TTLs: a denied plate is usually
+    being registered right then, so it expires sooner.
+
+    It also keeps a snapshot of every allowed plate (the allowlist), pulled periodically from the
+    backend in a background thread. The snapshot is used to answer when the backend does not
+    answer, and is saved to a file so it is available after a restart while the backend is down.
+
+    It is thread-safe: the handler threads of the verifier use it at the same time.
+
+    Args:
+        positive_ttl (float): Seconds an allowed decision is kept.
+        negative_ttl (float): Seconds a denied decision is kept.
+        max_size (int): Maximum number of cached decisions, the least recently used are removed.
+        snapshot_path (str, optional): JSON file where the allowlist is saved and loaded from.
+
+    Attributes:
+        allowlist (frozenset or None): Plates of the last allowlist pulled, None if never pulled.
+        allowlist_etag (str or None): ETag of the last allowlist, sent to only get it if it changed.
+        stats (dict): Number of hits, misses, expired decisions, fallbacks and allowlist syncs.
+    """
+
+    def __init__(self, positive_ttl=60, negative_ttl=10, max_size=10000, snapshot_path=None):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.snapshot_path = snapshot_path
+
+        self.allowlist = None
+        self.allowlist_etag = None
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "fallbacks": 0, "syncs": 0, "sync_errors": 0}
+        # plate -> (allowed, expiry)
+        self._decisions = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sync_thread = None
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        if snapshot_path:
+            self._load_snapshot()
+
+    def get(self, plate):
+        """
+        Returns:
+            bool or None: The cached decision of the plate, or None if it is not cached or expired.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._decisions.get(plate)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+
+            allowed, expiry = entry
+            if expiry <= now:
+                del self._decisions[plate]
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            self._decisions.move_to_end(plate)
+            self.stats["hits"] += 1
+            return allowed
+
+    def put(self, plate, allowed):
+        """
+        Caches the decision of the backend for a plate.
+
+        Args:
+            plate (str): The license plate.
+            allowed (bool): The decision of the backend.
+        """
+        expiry = time.monotonic() + (self.positive_ttl if allowed else self.negative_ttl)
+        with self._lock:
+            self._decisions[plate] = (allowed, expiry)
+            self._decisions.move_to_end(plate)
+            while len(self._decisions) > self.max_size:
+                self._decisions.popitem(last=False)
+
+    def fallback(self, plate):
+        """
+        Decision used when the backend does not answer: the plate is allowed if it is in the
+        allowlist. Without an allowlist every plate is denied.
+
+        Returns:
+            bool: True if the plate is in the allowlist.
+        """
+        with self._lock:
+            self.stats["fallbacks"] += 1
+            return self.allowlist is not None and plate in self.allowlist
+
+    def update_allowlist(self, plates, etag=None):
+        """
+        Replaces the allowlist. The cached decisions that disagree with it are removed, so a plate
+        registered or deleted in the backend is not answered with the old decision until it expires.
+
+        Args:
+            plates (iterable of str): Every allowed plate.
+            etag (str, optional): ETag of the allowlist returned by the backend.
+        """
+        allowlist = frozenset(plates)
+        with self._lock:
+            self.allowlist = allowlist
+            self.allowlist_etag = etag
+            for plate, (allowed, _) in list(self._decisions.items()):
+                if allowed != (plate in allowlist):
+                    del self._decisions[plate]
+            self.stats["syncs"] += 1
+
+        self.logger.info(f"Lista de matrículas permitidas actualizada: {len(allowlist)} matrículas")
+        if self.snapshot_path:
+            self._save_snapshot(allowlist, etag)
+
+    def sync(self, fetch):
+        """
+        Pulls the allowlist once.
+
+        Args:
+            fetch (callable): Function called with the ETag of the current allowlist (or None). It
+                              returns (plates, etag), or None if the allowlist has not changed.
+        """
+        try:
+            result = fetch(self.allowlist_etag)
+        except Exception as e:
+            with self._lock:
+                self.stats["sync_errors"] += 1
+            self.logger.warning(f"No se ha podido obtener la lista de matrículas permitidas: {e}")
+            return
+
+        if result is not None:
+            plates, etag = result
+            self.update_allowlist(plates, etag)
+
+    def start_sync(self, fetch, interval):
+        """
+        Pulls the allowlist now and then every `interval` seconds in a background thread.
+
+        Args:
+            fetch (callable): See `sync`.
+            interval (float): Seconds between pulls.
+        """
+        def run():
+            while not self._stop.is_set():
+                self.sync(fetch)
+                self._stop.wait(interval)
+
+        self._stop.clear()
+        self._sync_thread = threading.Thread(target=run, name="AllowlistSync", daemon=True)
+        self._sync_thread.start()
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._sync_thread is not None:
+            self._sync_thread.join(timeout)
+            self._sync_thread = None
+
+    def log_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            size = len(self._decisions)
+            allowlist_size = len(self.allowlist) if self.allowlist is not None else None
+        self.logger.info(
+            f"Decisiones en caché={size} aciertos={stats['hits']} fallos={stats['misses']} "
+            f"caducadas={stats['expired']} sin backend={stats['fallbacks']} "
+            f"lista permitidas={allowlist_size} sincronizaciones={stats['syncs']} errores={stats['sync_errors']}"
+        )
+
+    def _load_snapshot(self):
+        try:
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"No se ha podido leer la lista de matrículas permitidas guardada: {e}")
+            return
+
+        # The ETag is not kept, so the first sync gets the allowlist again
+        self.allowlist = frozenset(snapshot.get("plates", []))
+        self.logger.info(f"Lista de matrículas permitidas cargada de {self.snapshot_path}: {len(self.allowlist)} matrículas")
+
+    def _save_snapshot(self, allowlist, etag):
+        # Written to a temporary file and renamed, so a crash never leaves a partial snapshot
+        tmp_path = f"{self.snapshot_path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"plates": sorted(allowlist), "etag": etag, "saved_at": time.time()}, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            self.logger.warning(f"No se ha podido guardar la lista de matrículas permitidas: {e}")
@@ -0,0 +1,343 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+
+class DropOldestQueue(queue.Queue):
+    """
+    Bounded queue that never blocks the producer. When the queue is full, the oldest
+    item is discarded to make room for the new one, so consumers always work on the
+    most recent data (e.g. the latest camera frame instead of a stale one).
+
+    Args:
+        maxsize (int): Maximum number of items kept in the queue.
+
+    Attributes:
+        dropped (int): Number of items discarded because the queue was full.
+    """
+
+    def __init__(self, maxsize=1):
+        super().__init__(maxsize)
+        self.dropped = 0
+
+    def put_drop_oldest(self, item):
+        """
+        Puts an item in the queue, discarding the oldest one if the queue is full.
+
+        Args:
+            item (Any): The item to enqueue.
+        """
+        with self.not_full:
+            if 0 < self.maxsize <= self._qsize():
+                self._get()
+                self.unfinished_tasks -= 1
+                self.dropped += 1
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def get_many(self, max_items, timeout):
+        """
+        Waits up to `timeout` seconds for an item and then drains every item already
+        queued, up to `max_items`. Used by stages that process their input in batches.
+
+        Args:
+            max_items (int): Maximum number of items to return.
+            timeout (float): Seconds to wait for the first item.
+
+        Returns:
+            list: The dequeued items (empty if the timeout expired).
+        """
+        try:
+            items = [self.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+
+        while len(items) < max_items:
+            try:
+                items.append(self.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+
+class StageStats:
+    """
+    Thread-safe throughput and latency counters for a pipeline stage.
+
+    Args:
+        window (int): Number of recent samples used to compute FPS and latency percentiles.
+
+    Attributes:
+        processed (int): Total number of items processed by the stage.
+        errors (int): Number of items whose processing raised an exception.
+    """
+
+    def __init__(self, window=256):
+        self.processed = 0
+        self.errors = 0
+        self._timestamps = deque(maxlen=window)
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency, items=1):
+        """
+        Records the processing of one call of the stage.
+
+        Args:
+            latency (float): Seconds spent processing.
+            items (int): Number of items processed in that call (batched stages).
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.processed += items
+            self._latencies.append(latency)
+            for _ in range(items):
+                self._timestamps.append(now)
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def fps(self):
+        """
+        Returns:
+            float: Items per second over the recent window.
+        """
+        with self._lock:
+            if len(self._timestamps) < 2:
+                return 0.0
+            elapsed = self._timestamps[-1] - self._timestamps[0]
+            return (len(self._timestamps) - 1) / elapsed if elapsed > 0 else 0.0
+
+    def latency_percentile(self, percentile):
+        """
+        Args:
+            percentile (float): Percentile between 0 and 100.
+
+        Returns:
+            float: Latency in seconds at the given percentile over the recent window.
+        """
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not samples:
+            return 0.0
+        index = min(len(samples) - 1, int(round(percentile / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: Current counters, FPS and latency percentiles (in milliseconds).
+        """
+        return {
+            "processed": self.processed,
+            "errors": self.errors,
+            "fps": round(self.fps(), 2),
+            "latency_p50_ms": round(self.latency_percentile(50) * 1000, 2),
+            "latency_p95_ms": round(self.latency_percentile(95) * 1000, 2),
+            "latency_p99_ms": round(self.latency_percentile(99) * 1000, 2),
+            "latency_max_ms": round(self.latency_percentile(100) * 1000, 2),
+        }
+
+
+class PipelineStage(threading.Thread):
+    """
+    Worker thread that runs one stage of the frame pipeline.
+
+    The stage takes items from its input queue, calls `handler` and puts the result
+    (if it is not None) in its output queue. A stage without input queue is a source:
+    its handler is called in a loop with no arguments (e.g. to capture frames).
+
+    Every item taken from the input queue is marked done (`task_done`) once its result is in
+    the output queue, so the unfinished tasks of the queue count both the items waiting and
+    the ones being processed, with no window where an item is in neither.
+
+    Args:
+        name (str): Name of the stage, used in logs and statistics.
+        handler (callable): Function that processes one item (or a list of items when
+                            `batch_size` > 1) and returns the result for the next stage.
+        input_queue (DropOldestQueue, optional): Queue the stage consumes from.
+        output_queue (DropOldestQueue, optional): Queue the results are sent to.
+        batch_size (int): Maximum number of queued items handed to the handler at once.
+        stop_event (threading.Event): Event shared by the pipeline to stop every stage.
+        stats_window (int): Number of samples kept by the statistics of the stage.
+    """
+
+    poll_timeout = 0.1
+
+    def __init__(
+            self, name, handler, input_queue=None, output_queue=None,
+            batch_size=1, stop_event=None, stats_window=256
+        ):
+        super().__init__(name=name, daemon=True)
+        self.handler = handler
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.batch_size = batch_size
+        self.stop_event = stop_event or threading.Event()
+        self.stats = StageStats(stats_window)
+        self.busy = False
+        self.logger = logging.getLogger(f"{self.__class__.__name__}.{name}")
+
+    def run(self):
+        self.logger.info("Etapa iniciada.")
+        while not self.stop_event.is_set():
+            if self.input_queue is None:
+                items = None
+            elif self.batch_size > 1:
+                items = self.input_queue.get_many(self.batch_size, self.poll_timeout)
+                if not items:
+                    continue
+            else:
+                try:
+                    items = self.input_queue.get(timeout=self.poll_timeout)
+                except queue.Empty:
+                    continue
+
+            self.busy = True
+            try:
+                self._process(items)
+            finally:
+                self.busy = False
+                if items is not None:
+                    for _ in range(len(items) if self.batch_size > 1 else 1):
+                        self.input_queue.task_done()
+
+        self.logger.info("Etapa detenida.")
+
+    def _process(self, items):
+        start = time.perf_counter()
+        try:
+            result = self.handler() if items is None else self.handler(items)
+        except Exception:
+            self.stats.record_error()
+            self.logger.exception("Error procesando elemento en la etapa.")
+            return
+
+        if items is None and result is None:
+            # Sources return None when there is nothing new, it is not a processed item
+            return
+
+        self.stats.record(time.perf_counter() - start, len(items) if self.batch_size > 1 else 1)
+
+        if result is not None and self.output_queue is not None:
+            self.output_queue.put_drop_oldest(result)
+
+
+class FramePipeline:
+    """
+    Multi-stage pipeline where every stage runs on its own thread and stages are
+    connected by bounded drop-oldest queues, so a slow stage (OCR, verification)
+    never stalls the faster ones (capture, detection, display).
+
+    Example:
+        pipeline = FramePipeline()
+        frames = pipeline.add_queue("frames", maxsize=1)
+        pipeline.add_stage("capture", capture_fn, output_queue=frames)
+        pipeline.add_stage("detect", detect_fn, input_queue=frames)
+        pipeline.start()
+
+    Args:
+        stats_window (int): Number of samples kept by the statistics of every stage.
+
+    Attributes:
+        stages (list of PipelineStage): Stages in the order they were added.
+        queues (dict): Queues by name.
+        stop_event (threading.Event): Event used to stop every stage.
+    """
+
+    def __init__(self, stats_window=256):
+        self.stats_window = stats_window
+        self.stages = []
+        self.queues = {}
+        self.stop_event = threading.Event()
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def add_queue(self, name, maxsize=1):
+        """
+        Creates a named drop-oldest queue to connect stages.
+
+        Args:
+            name (str): Name of the queue, used in statistics.
+            maxsize (int): Maximum number of items kept in the queue.
+
+        Returns:
+            DropOldestQueue: The created queue.
+        """
+        self.queues[name] = DropOldestQueue(maxsize)
+        return self.queues[name]
+
+    def add_stage(self, name, handler, input_queue=None, output_queue=None, batch_size=1):
+        """
+        Adds a stage to the pipeline. See `PipelineStage` for the arguments.
+
+        Returns:
+            PipelineStage: The created stage.
+        """
+        stage = PipelineStage(
+            name, handler, input_queue, output_queue,
+            batch_size, self.stop_event, self.stats_window
+        )
+        self.stages.append(stage)
+        return stage
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def is_running(self):
+        return not self.stop_event.is_set()
+
+    def is_idle(self, skip_stages=()):
+        """
+        Args:
+            skip_stages (tuple of str): Names of the stages not taken into account (e.g. sources).
+
+        Returns:
+            bool: True if every queue is empty and no stage is processing an item.
+        """
+        # The items of a queue consumed by a stage are unfinished until their result is forwarded,
+        # the rest of the queues (e.g. display) are consumed outside the pipeline
+        consumed = [stage.input_queue for stage in self.stages if stage.input_queue is not None]
+        queues_idle = all(
+            q.unfinished_tasks == 0 if any(q is c for c in consumed) else q.empty()
+            for q in self.queues.values()
+        )
+        sources_idle = not any(
+            stage.busy for stage in self.stages
+            if stage.input_queue is None and stage.name not in skip_stages
+        )
+        return queues_idle and sources_idle
+
+    def stop(self, timeout=2.0):
+        """
+        Signals every stage to stop and waits for their threads to finish.
+
+        Args:
+            timeout (float): Seconds to wait for each stage.
+        """
+        self.stop_event.set()
+        for stage in self.stages:
+            if stage.is_alive():
+                stage.join(timeout)
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: Statistics of every stage, plus the depth and drop count of every queue.
+        """
+        stats = {stage.name: stage.stats.snapshot() for stage in self.stages}
+        stats["queues"] = {
+            name: {"size": q.qsize(), "dropped": q.dropped}
+            for name, q in self.queues.items()
+        }
+        return stats
+
+    def log_stats(self):
+        for stage in self.stages:
+            self.logger.info(f"[{stage.name}] {stage.stats.snapshot()}")
+        for name, q in self.queues.items():
+            self.logger.info(f"[cola {name}] tamaño={q.qsize()} descartados={q.dropped}")
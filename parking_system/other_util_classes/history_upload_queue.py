@@ -0,0 +1,184 @@
+import json
+import logging
+import os
+import threading
+
+
+class HistoryUploadQueue:
+    """
+    Queue of the verifications answered by the verifier without the backend (from its decision
+    cache, or from the allowlist while the backend is down), uploaded in batches in a background
+    thread so the history of the backend is complete. The gate is answered without waiting for it.
+
+    The events are appended to a spool file (one JSON per line), so they are not lost if the
+    verifier is restarted or the backend is down for a long time. To upload, the spool is renamed
+    to `<spool_path>.uploading` and new events go to a new spool, so adding is never blocked by an
+    upload. If an upload fails, the events not uploaded are kept and retried in the next round.
+    Lines that can't be decoded (e.g. the last one, cut by a crash while it was written) are moved
+    to `<spool_path>.invalid` instead of blocking the upload.
+
+    Args:
+        spool_path (str): File where the events are queued.
+        upload (callable): Function called with a list of events that uploads them to the backend,
+                           raising an exception if they could not be uploaded.
+        batch_size (int): Maximum events per upload.
+        interval (float): Seconds between uploads.
+
+    Attributes:
+        stats (dict): Number of events queued, uploaded and invalid, and failed uploads.
+    """
+
+    def __init__(self, spool_path, upload, batch_size=500, interval=5):
+        self.spool_path = spool_path
+        self.uploading_path = f"{spool_path}.uploading"
+        self.invalid_path = f"{spool_path}.invalid"
+        self.upload = upload
+        self.batch_size = batch_size
+        self.interval = interval
+
+        self.stats = {"queued": 0, "uploaded": 0, "invalid": 0, "upload_errors": 0}
+        self._spool = None
+        self._lock = threading.Lock()
+        # Only one upload at a time (the background thread and the final one of `stop`)
+        self._upload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        spool_dir = os.path.dirname(spool_path)
+        if spool_dir:
+            os.makedirs(spool_dir, exist_ok=True)
+
+    def add(self, event):
+        """
+        Queues an event to be uploaded.
+
+        Args:
+            event (dict): The verification, with "plate", "date" and "allowed".
+        """
+        line = json.dumps(event) + "\n"
+        with self._lock:
+            if self._spool is None:
+                self._spool = self._open_spool()
+            self._spool.write(line)
+            self._spool.flush()
+            self.stats["queued"] += 1
+
+    def start(self):
+        """
+        Uploads the queued events every `interval` seconds in a background thread.
+        """
+        def run():
+            while not self._stop.wait(self.interval):
+                try:
+                    self.flush()
+                except Exception:
+                    # The thread must keep uploading, the events stay in the spool
+                    self.logger.exception("Error al subir el historial")
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name="HistoryUpload", daemon=True)
+        self._thread.start()
+
+    def flush(self):
+        """
+        Uploads the queued events in batches, stopping at the first failed upload.
+
+        Returns:
+            bool: True if every queued event was uploaded.
+        """
+        with self._upload_lock:
+            # Events of a previous failed round are uploaded before taking the new ones
+            if not os.path.exists(self.uploading_path):
+                with self._lock:
+                    if self._spool is not None:
+                        self._spool.close()
+                        self._spool = None
+                    if not os.path.exists(self.spool_path):
+                        return True
+                    os.replace(self.spool_path, self.uploading_path)
+
+            events = self._read_events()
+
+            uploaded = 0
+            try:
+                while uploaded < len(events):
+                    batch = events[uploaded:uploaded + self.batch_size]
+                    self.upload(batch)
+                    uploaded += len(batch)
+            except Exception as e:
+                with self._lock:
+                    self.stats["uploaded"] += uploaded
+                    self.stats["upload_errors"] += 1
+                self.logger.warning(f"No se ha podido subir el historial ({len(events) - uploaded} pendientes): {e}")
+                self._rewrite(events[uploaded:])
+                return False
+
+            os.remove(self.uploading_path)
+            with self._lock:
+                self.stats["uploaded"] += uploaded
+            if uploaded:
+                self.logger.debug(f"Historial subido: {uploaded} verificaciones")
+            return True
+
+    def stop(self, timeout=10.0):
+        """
+        Stops the background thread and tries to upload the events still queued. The events that
+        can't be uploaded stay in the spool and are uploaded when the verifier starts again.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+        with self._lock:
+            if self._spool is not None:
+                self._spool.close()
+                self._spool = None
+
+    def log_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        self.logger.info(
+            f"Historial encolado={stats['queued']} subido={stats['uploaded']} ilegible={stats['invalid']} "
+            f"errores={stats['upload_errors']}"
+        )
+
+    def _open_spool(self):
+        # Called with the lock held. A line cut by a crash is ended, so the next event is not
+        # appended to it
+        spool = open(self.spool_path, "a")
+        if spool.tell() > 0:
+            with open(self.spool_path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    spool.write("\n")
+        return spool
+
+    def _read_events(self):
+        events = []
+        invalid = []
+        with open(self.uploading_path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    invalid.append(line if line.endswith("\n") else line + "\n")
+
+        if invalid:
+            with open(self.invalid_path, "a") as f:
+                f.writelines(invalid)
+            with self._lock:
+                self.stats["invalid"] += len(invalid)
+            self.logger.warning(f"{len(invalid)} líneas ilegibles del historial movidas a {self.invalid_path}")
+            # The spool is rewritten without them, in case the upload fails
+            self._rewrite(events)
+        return events
+
+    def _rewrite(self, events):
+        tmp_path = f"{self.uploading_path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.writelines(json.dumps(event) + "\n" for event in events)
+        os.replace(tmp_path, self.uploading_path)
@@ -0,0 +1,157 @@
+import logging
+import os
+import platform
+
+import tflite_runtime.interpreter as tflite
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceBackend:
+    """
+    Base class of the backends that can run the license plate detector model.
+
+    Every backend knows how to create a TFLite interpreter for its model. The model file of each
+    backend is taken from `BaseConfig.DETECTOR_MODEL_FILES`, because each one needs a different
+    build of the model (e.g. the Edge TPU one must be compiled with the Edge TPU compiler).
+
+    Args:
+        num_threads (int, optional): Number of CPU threads used by the interpreter.
+        model_filename (str, optional): Name of the model file inside the models directory.
+
+    Attributes:
+        name (str): Name of the backend, used in `BaseConfig.DETECTOR_BACKEND`.
+    """
+
+    name = None
+
+    def __init__(self, num_threads=None, model_filename=None):
+        self.num_threads = num_threads
+        self.model_filename = model_filename
+
+    def create_interpreter(self, model_path):
+        """
+        Creates the interpreter for the model. Tensors are not allocated yet.
+
+        Args:
+            model_path (str): Path to the TFLite model file.
+
+        Returns:
+            tflite.Interpreter: The interpreter.
+        """
+        raise NotImplementedError
+
+
+class EdgeTPUBackend(InferenceBackend):
+    """
+    Runs the model on a Coral Edge TPU through its delegate. The model must be compiled for it.
+    """
+
+    name = "edgetpu"
+
+    delegate_libraries = {
+        "Linux": "libedgetpu.so.1",
+        "Darwin": "libedgetpu.1.dylib",
+        "Windows": "edgetpu.dll",
+    }
+
+    def create_interpreter(self, model_path):
+        delegate = tflite.load_delegate(self.delegate_libraries.get(platform.system(), "libedgetpu.so.1"))
+        return tflite.Interpreter(
+            model_path=model_path,
+            experimental_delegates=[delegate],
+            num_threads=self.num_threads
+        )
+
+
+class CPUBackend(InferenceBackend):
+    """
+    Runs the model on the CPU with the builtin TFLite kernels, in `num_threads` threads.
+    """
+
+    name = "cpu"
+
+    op_resolver_type = tflite.OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+
+    def create_interpreter(self, model_path):
+        return tflite.Interpreter(
+            model_path=model_path,
+            num_threads=self.num_threads or os.cpu_count(),
+            experimental_op_resolver_type=self.op_resolver_type
+        )
+
+
+class XNNPACKBackend(CPUBackend):
+    """
+    Runs the model on the CPU, letting TFLite apply its default XNNPACK delegate, which is usually
+    faster than the builtin kernels for float models on x86 and ARM.
+    """
+
+    name = "xnnpack"
+
+    op_resolver_type = tflite.OpResolverType.AUTO
+
+
+class CPUInt8Backend(CPUBackend):
+    """
+    Runs the quantized int8 model (the one the Edge TPU model is compiled from) on the CPU with
+    the builtin kernels. It is the lightest option for machines without accelerator.
+    """
+
+    name = "cpu_int8"
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (EdgeTPUBackend, CPUBackend, XNNPACKBackend, CPUInt8Backend)
+}
+
+
+def get_backend(name, num_threads=None, model_files=None):
+    """
+    Creates a backend by name.
+
+    Args:
+        name (str): Name of the backend ("edgetpu", "cpu", "xnnpack" or "cpu_int8").
+        num_threads (int, optional): Number of CPU threads used by the interpreter.
+        model_files (dict, optional): Model file name of every backend.
+
+    Returns:
+        InferenceBackend: The backend.
+
+    Raises:
+        ValueError: If the backend doesn't exist.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Backend de inferencia desconocido: {name}. Opciones: {', '.join(BACKENDS)}")
+    model_filename = (model_files or {}).get(name)
+    return BACKENDS[name](num_threads=num_threads, model_filename=model_filename)
+
+
+def create_interpreter(backend_name, models_dir, num_threads=None, model_files=None, fallback_backend_name=None):
+    """
+    Creates the interpreter of the configured backend, falling back to another backend if it can't
+    be started (e.g. there is no Edge TPU connected to the machine).
+
+    Args:
+        backend_name (str): Name of the preferred backend.
+        models_dir (str or Path): Directory of the model files.
+        num_threads (int, optional): Number of CPU threads used by the interpreter.
+        model_files (dict, optional): Model file name of every backend.
+        fallback_backend_name (str, optional): Backend used if the preferred one fails.
+
+    Returns:
+        tuple: The interpreter and the backend that created it.
+    """
+    backend = get_backend(backend_name, num_threads, model_files)
+    try:
+        interpreter = backend.create_interpreter(os.path.join(models_dir, backend.model_filename))
+    except (ValueError, RuntimeError) as e:
+        if not fallback_backend_name or fallback_backend_name == backend_name:
+            raise
+        logger.warning(f"No se pudo iniciar el backend '{backend_name}' ({e}). Usando '{fallback_backend_name}'.")
+        backend = get_backend(fallback_backend_name, num_threads, model_files)
+        interpreter = backend.create_interpreter(os.path.join(models_dir, backend.model_filename))
+
+    logger.info(f"Detector usando el backend '{backend.name}' con el modelo {backend.model_filename}")
+    return interpreter, backend
@@ -2,13 +2,23 @@ import tflite_runtime.interpreter as tflite
 import numpy as np
 import cv2
 
+# Compact representation of the detections, one record per license plate
+DETECTION_DTYPE = np.dtype([
+    ('ymin', np.int32),
+    ('xmin', np.int32),
+    ('ymax', np.int32),
+    ('xmax', np.int32),
+    ('score', np.float32),
+])
+
 class LicensePlateDetector:
     """
     A class for detecting license plates in an image using a TensorFlow Lite model.
 
     This class uses a pre-trained TFLite model with Edge TPU acceleration for real-time license 
     plate detection. It handles image preprocessing, model inference, and extraction of the 
-    detected region of interest (ROI) where the license plate is located.
+    detected region of interest (ROI) where the license plate is located. The model can also run
+    on other backends (see `inference_backends`) by giving an interpreter created by them.
 
     Attributes:
         interpreter (tflite.Interpreter): The TFLite interpreter used for running the model.
@@ -20,25 +30,44 @@ class LicensePlateDetector:
         input_mean (float): The mean value used for input normalization.
         input_std (float): The standard deviation value used for input normalization.
         min_detection_confidence (float): The minimum confidence threshold for valid detections.
+        max_detections (int or None): Maximum number of license plates returned per frame.
+        nms_iou_threshold (float or None): IoU above which overlapping detections are suppressed.
+        frame_is_rgb (bool): Indicates whether the frames are already in RGB (no color conversion needed).
 
     Methods:
         preprocess_image(frame): Preprocesses the input frame for model inference.
-        detect_license_plate(frame): Detects license plates in the given frame.
+        detect_license_plates(frame): Detects every license plate in the given frame.
+        detect_license_plate(frame): Detects the most confident license plate in the given frame.
     """
 
-    def __init__(self, model_path, min_detection_confidence):
+    def __init__(
+            self, model_path, min_detection_confidence,
+            max_detections=None, nms_iou_threshold=None, frame_is_rgb=False,
+            interpreter=None
+        ):
         """
         Initializes the LicensePlateDetector with a model path and detection confidence.
 
         Args:
-            model_path (str): Path to the TFLite model file.
+            model_path (str): Path to the Edge TPU TFLite model file. Not used if `interpreter` is given.
             min_detection_confidence (float): Minimum confidence threshold for a detection to be 
                                               considered valid.
+            max_detections (int, optional): Maximum number of license plates returned per frame
+                                            (e.g. the number of lanes seen by the camera).
+            nms_iou_threshold (float, optional): If given, non-maximum suppression is applied and
+                                                 detections overlapping a more confident one above
+                                                 this IoU are discarded.
+            frame_is_rgb (bool): True if the frames are given in RGB instead of BGR (e.g. by
+                                 `Pi_WebcamCapture`), so they are not converted again.
+            interpreter (tflite.Interpreter, optional): Interpreter created by an inference backend.
+                                                        If not given, the Edge TPU is used.
         """
-        self.interpreter = tflite.Interpreter(
-            model_path=model_path,
-            experimental_delegates=[tflite.load_delegate('libedgetpu.so.1')]
-        )
+        if interpreter is None:
+            interpreter = tflite.Interpreter(
+                model_path=model_path,
+                experimental_delegates=[tflite.load_delegate('libedgetpu.so.1')]
+            )
+        self.interpreter = interpreter
         self.interpreter.allocate_tensors()
         self.input_details = self.interpreter.get_input_details()
         self.output_details = self.interpreter.get_output_details()
@@ -48,28 +77,134 @@ class LicensePlateDetector:
         self.input_mean = 127.5
         self.input_std = 127.5
         self.min_detection_confidence = min_detection_confidence
+        self.max_detections = max_detections
+        self.nms_iou_threshold = nms_iou_threshold
+        self.frame_is_rgb = frame_is_rgb
+
+        # Buffer reused on every frame. The resized frame is written in it, and then it is converted
+        # (color and normalization) straight into the input tensor of the interpreter
+        self.input_index = self.input_details[0]['index']
+        self.resized_buffer = np.empty((self.height, self.width, 3), dtype=np.uint8)
 
     def preprocess_image(self, frame):
         """
-        Preprocesses the input frame for model inference by resizing and normalizing.
+        Preprocesses the input frame for model inference by resizing, converting it to RGB and 
+        normalizing it (float models).
+
+        It doesn't allocate any array: the frame is resized into a reused buffer, and the result is
+        written directly into the input tensor of the interpreter, which is ready for `invoke()`.
+
+        Args:
+            frame (numpy.ndarray): The input image frame, in BGR format (or RGB if `frame_is_rgb`).
+        """
+        cv2.resize(frame, (self.width, self.height), dst=self.resized_buffer)
+
+        # View of the interpreter memory. It must not be kept after this method, the interpreter
+        # refuses to invoke while there are references to its internal buffers
+        input_tensor = self.interpreter.tensor(self.input_index)()[0]
+
+        if self.float_input:
+            # Reversing the channels of a view converts BGR to RGB without copying
+            image = self.resized_buffer if self.frame_is_rgb else self.resized_buffer[..., ::-1]
+            np.subtract(image, self.input_mean, out=input_tensor)
+            np.multiply(input_tensor, 1.0 / self.input_std, out=input_tensor)
+        elif self.frame_is_rgb:
+            np.copyto(input_tensor, self.resized_buffer)
+        else:
+            cv2.cvtColor(self.resized_buffer, cv2.COLOR_BGR2RGB, dst=input_tensor)
+
+    def detect_license_plates(self, frame):
+        """
+        Detects every license plate in the given image frame using the TFLite model.
+
+        The post-processing is vectorized: the scores are thresholded with a mask, and the boxes of
+        the valid detections are scaled to the frame size and clipped in a single operation.
+
+        Args:
+            frame (numpy.ndarray): The input image frame, in BGR format (or RGB if `frame_is_rgb`).
+
+        Returns:
+            tuple: A tuple containing:
+                - detections (numpy.ndarray): Structured array of `DETECTION_DTYPE` with the boxes
+                  (in pixels) and scores of the detected license plates, sorted by descending score.
+                - rois (list of numpy.ndarray): The region of interest of every detection. They are 
+                  views of `frame`, no pixels are copied.
+        """
+        imH, imW, _ = frame.shape
+
+        self.preprocess_image(frame)
+        self.interpreter.invoke()
+
+        boxes = self.interpreter.get_tensor(self.output_details[1]['index'])[0]
+        scores = self.interpreter.get_tensor(self.output_details[0]['index'])[0]
+
+        valid = np.flatnonzero(scores > self.min_detection_confidence)
+        valid = valid[np.argsort(-scores[valid], kind='stable')]
+
+        # Scale the normalized boxes to pixels and clip them to the frame
+        pixel_boxes = boxes[valid] * np.array([imH, imW, imH, imW], dtype=np.float32)
+        pixel_boxes = np.clip(
+            pixel_boxes,
+            np.array([1, 1, -np.inf, -np.inf]),
+            np.array([np.inf, np.inf, imH, imW])
+        ).astype(np.int32)
+
+        if self.nms_iou_threshold is not None and len(valid) > 1:
+            keep = self._non_max_suppression(pixel_boxes, self.nms_iou_threshold)
+            valid = valid[keep]
+            pixel_boxes = pixel_boxes[keep]
+
+        if self.max_detections is not None:
+            valid = valid[:self.max_detections]
+            pixel_boxes = pixel_boxes[:self.max_detections]
+
+        detections = np.empty(len(valid), dtype=DETECTION_DTYPE)
+        detections['ymin'] = pixel_boxes[:, 0]
+        detections['xmin'] = pixel_boxes[:, 1]
+        detections['ymax'] = pixel_boxes[:, 2]
+        detections['xmax'] = pixel_boxes[:, 3]
+        detections['score'] = scores[valid]
+
+        rois = [frame[ymin:ymax, xmin:xmax] for ymin, xmin, ymax, xmax in pixel_boxes.tolist()]
+
+        return detections, rois
+
+    @staticmethod
+    def _non_max_suppression(boxes, iou_threshold):
+        """
+        Greedy non-maximum suppression over boxes sorted by descending score.
 
         Args:
-            frame (numpy.ndarray): The input image frame in BGR format.
+            boxes (numpy.ndarray): (N, 4) array of (ymin, xmin, ymax, xmax) boxes.
+            iou_threshold (float): IoU above which a box is suppressed by a more confident one.
 
         Returns:
-            numpy.ndarray: The preprocessed image tensor, ready for model inference.
+            numpy.ndarray: Indices of the boxes that are kept.
         """
-        image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        image_resized = cv2.resize(image_rgb, (self.width, self.height))
-        input_data = np.expand_dims(image_resized, axis=0)
-        return input_data
+        boxes = boxes.astype(np.float32)
+        areas = (boxes[:, 2] - boxes[:, 0]).clip(min=0) * (boxes[:, 3] - boxes[:, 1]).clip(min=0)
+        order = np.arange(len(boxes))
+        keep = []
+
+        while order.size:
+            best, rest = order[0], order[1:]
+            keep.append(best)
+
+            inter_h = (np.minimum(boxes[best, 2], boxes[rest, 2]) - np.maximum(boxes[best, 0], boxes[rest, 0])).clip(min=0)
+            inter_w = (np.minimum(boxes[best, 3], boxes[rest, 3]) - np.maximum(boxes[best, 1], boxes[rest, 1])).clip(min=0)
+            intersection = inter_h * inter_w
+            iou = intersection / np.maximum(areas[best] + areas[rest] - intersection, 1e-6)
+
+            order = rest[iou <= iou_threshold]
+
+        return np.array(keep, dtype=np.intp)
 
     def detect_license_plate(self, frame):
         """
-        Detects license plates in the given image frame using the TFLite model.
+        Detects the most confident license plate in the given image frame using the TFLite model.
 
         Args:
-            frame (numpy.ndarray): The input image frame in BGR format.
+            frame (numpy.ndarray): The input image frame, in BGR format (or RGB if `frame_is_rgb`).
 
         Returns:
             tuple: A tuple containing:
@@ -81,33 +216,10 @@ class LicensePlateDetector:
                 - xmax (int): The right boundary of the detected bounding box.
                 - confidence (float): The confidence score of the detection.
         """
-        roi = None
-        ymin = 0
-        xmin = 0
-        xmax = 0
-        ymax = 0
-        confidence = 0.0
-
-        imH, imW, _ = frame.shape
-
-        input_data = self.preprocess_image(frame)
-
-        if self.float_input:
-            input_data = (np.float32(input_data) - self.input_mean) / self.input_std
-
-        self.interpreter.set_tensor(self.input_details[0]['index'], input_data)
-        self.interpreter.invoke()
-
-        boxes = self.interpreter.get_tensor(self.output_details[1]['index'])[0]
-        scores = self.interpreter.get_tensor(self.output_details[0]['index'])[0]
+        detections, rois = self.detect_license_plates(frame)
 
-        for i in range(len(scores)):
-            if scores[i] > self.min_detection_confidence:
-                ymin = int(max(1, (boxes[i][0] * imH)))
-                xmin = int(max(1, (boxes[i][1] * imW)))
-                ymax = int(min(imH, (boxes[i][2] * imH)))
-                xmax = int(min(imW, (boxes[i][3] * imW)))
-                roi = frame[ymin:ymax, xmin:xmax]
-                confidence = scores[i]
+        if len(detections) == 0:
+            return None, 0, 0, 0, 0, 0.0
 
-        return roi, ymin, xmin, ymax, xmax, confidence
+        best = detections[0]
+        return rois[0], int(best['ymin']), int(best['xmin']), int(best['ymax']), int(best['xmax']), float(best['score'])
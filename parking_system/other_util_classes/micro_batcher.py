@@ -0,0 +1,126 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Gathers the items submitted from several threads within a short time into a single call, so
+    one request to the backend answers many of them. Every caller blocks until the result of its
+    own item arrives.
+
+    A background thread takes the first item waiting, waits up to `max_delay` seconds for more
+    (or until `max_batch_size` items are gathered) and calls `send_batch` with all of them. While a
+    batch is being sent, the items submitted meanwhile pile up and go in the next one, so the
+    batches grow with the load and a lone item only waits `max_delay`.
+
+    Args:
+        send_batch (callable): Function called with a list of items that returns the list of their
+                               results, in the same order. If it raises an exception, it is raised
+                               to every caller of the batch.
+        max_batch_size (int): Maximum items sent in one call.
+        max_delay (float): Maximum seconds the first item of a batch waits for more items.
+
+    Attributes:
+        stats (dict): Number of batches and items sent, and size of the largest batch.
+    """
+
+    def __init__(self, send_batch, max_batch_size=32, max_delay=0.005):
+        self.send_batch = send_batch
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+
+        self.stats = {"batches": 0, "items": 0, "max_batch": 0, "errors": 0}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._running = True
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self._thread = threading.Thread(target=self._run, name="MicroBatcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item, timeout=None):
+        """
+        Adds an item to the next batch and waits for its result.
+
+        Args:
+            item: The item sent to `send_batch`.
+            timeout (float, optional): Maximum seconds to wait for the result.
+
+        Returns:
+            The result of the item returned by `send_batch`.
+
+        Raises:
+            Exception: The exception raised by `send_batch` for the batch of the item.
+            concurrent.futures.TimeoutError: If the result does not arrive within `timeout`.
+        """
+        if not self._running:
+            raise RuntimeError("MicroBatcher cerrado")
+
+        future = Future()
+        self._queue.put((item, future))
+        return future.result(timeout)
+
+    def close(self, timeout=2.0):
+        """
+        Stops the background thread once the items already submitted are sent.
+        """
+        self._running = False
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def log_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        average = stats["items"] / stats["batches"] if stats["batches"] else 0
+        self.logger.info(
+            f"Lotes enviados={stats['batches']} elementos={stats['items']} "
+            f"media por lote={average:.1f} máximo={stats['max_batch']} errores={stats['errors']}"
+        )
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            batch = [first]
+            stopping = False
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    # Items already waiting are taken even if the delay is over
+                    entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(entry)
+
+            self._send(batch)
+            if stopping:
+                return
+
+    def _send(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            results = self.send_batch(items)
+            if len(results) != len(items):
+                raise ValueError(f"{len(results)} resultados para un lote de {len(items)} elementos")
+        except Exception as e:
+            with self._lock:
+                self.stats["errors"] += 1
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["items"] += len(items)
+            self.stats["max_batch"] = max(self.stats["max_batch"], len(items))
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
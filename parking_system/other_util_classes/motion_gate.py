@@ -0,0 +1,144 @@
+import logging
+import threading
+import time
+
+import cv2
+
+
+class MotionGate:
+    """
+    Cheap change detector placed in front of the license plate detector, so the detector and
+    OCR only run while something moves in front of the camera.
+
+    Every sampled frame is cropped to the region of interest, downscaled, converted to grayscale
+    and compared with a running-average background. If enough pixels differ from the background,
+    there is motion and the gate stays active for `hold_seconds` after the last change.
+
+    Frames are sampled at `idle_fps` while the gate is inactive (only the motion check runs on
+    them) and at `active_fps` while it is active.
+
+    It is thread-safe: the capture stage asks which frames to sample and the detection stage checks them.
+
+    Args:
+        roi (tuple, optional): Region of interest as (x, y, width, height) fractions of the frame
+                               (e.g. (0, 0.5, 1, 0.5) is the bottom half). None uses the whole frame.
+        downscale_width (int): Width in pixels the region of interest is resized to before comparing.
+        pixel_threshold (int): Minimum grayscale difference for a pixel to be considered changed.
+        min_changed_fraction (float): Fraction of changed pixels that is considered motion.
+        background_alpha (float): Weight of the new frame in the running-average background.
+        hold_seconds (float): Seconds the gate stays active after the last motion.
+        idle_fps (float, optional): Frames per second sampled while inactive. None samples every frame.
+        active_fps (float, optional): Frames per second sampled while active. None samples every frame.
+
+    Attributes:
+        stats (dict): Number of frames checked, with motion, and skipped by the frame rate limit.
+    """
+
+    def __init__(
+            self, roi=None, downscale_width=160, pixel_threshold=25,
+            min_changed_fraction=0.005, background_alpha=0.05, hold_seconds=2.0,
+            idle_fps=2, active_fps=None
+        ):
+        self.roi = roi
+        self.downscale_width = downscale_width
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_fraction = min_changed_fraction
+        self.background_alpha = background_alpha
+        self.hold_seconds = hold_seconds
+        self.idle_interval = 1.0 / idle_fps if idle_fps else 0.0
+        self.active_interval = 1.0 / active_fps if active_fps else 0.0
+
+        self.background = None
+        self.last_motion_time = None
+        self.next_sample_time = 0.0
+        self.stats = {"checked": 0, "motion": 0, "skipped": 0}
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def is_active(self, now=None):
+        """
+        Returns:
+            bool: True if there has been motion in the last `hold_seconds`.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return self.last_motion_time is not None and now - self.last_motion_time < self.hold_seconds
+
+    def should_sample(self, timestamp):
+        """
+        Decides if a captured frame has to be processed, according to the idle or active frame rate.
+
+        Args:
+            timestamp (float): Capture time of the frame (time.monotonic()).
+
+        Returns:
+            bool: True if the frame has to be processed, False if it can be discarded.
+        """
+        interval = self.active_interval if self.is_active(timestamp) else self.idle_interval
+        with self._lock:
+            if timestamp < self.next_sample_time:
+                self.stats["skipped"] += 1
+                return False
+            self.next_sample_time = timestamp + interval
+            return True
+
+    def check(self, frame, keep_active=False):
+        """
+        Compares the frame with the background and updates it.
+
+        Args:
+            frame (numpy.ndarray): The frame to check.
+            keep_active (bool): If True, the gate is kept active even if there is no motion (e.g.
+                                while a vehicle is stopped in front of the gate and still being tracked).
+
+        Returns:
+            bool: True if the frame has to be passed to the detector.
+        """
+        small = self._preprocess(frame)
+        now = time.monotonic()
+
+        with self._lock:
+            self.stats["checked"] += 1
+
+            if self.background is None or self.background.shape != small.shape:
+                self.background = small.astype("float32")
+                changed_fraction = 0.0
+            else:
+                diff = cv2.absdiff(small, cv2.convertScaleAbs(self.background))
+                _, mask = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+                changed_fraction = cv2.countNonZero(mask) / mask.size
+                cv2.accumulateWeighted(small, self.background, self.background_alpha)
+
+            if changed_fraction >= self.min_changed_fraction:
+                self.stats["motion"] += 1
+                if not self._active(now):
+                    self.logger.debug(f"Movimiento detectado ({changed_fraction:.3f} de píxeles cambiados).")
+                self.last_motion_time = now
+            elif keep_active:
+                self.last_motion_time = now
+
+            return self._active(now)
+
+    def _active(self, now):
+        return self.last_motion_time is not None and now - self.last_motion_time < self.hold_seconds
+
+    def _preprocess(self, frame):
+        if self.roi is not None:
+            imH, imW = frame.shape[:2]
+            x, y, width, height = self.roi
+            frame = frame[int(y * imH):int((y + height) * imH), int(x * imW):int((x + width) * imW)]
+
+        roiH, roiW = frame.shape[:2]
+        scale = self.downscale_width / roiW
+        small = cv2.resize(frame, (self.downscale_width, max(1, int(roiH * scale))), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        # Blur so sensor noise and compression artifacts are not taken as motion
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def log_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        self.logger.info(
+            f"Frames comprobados={stats['checked']} con movimiento={stats['motion']} "
+            f"descartados por FPS={stats['skipped']} activo={self.is_active()}"
+        )
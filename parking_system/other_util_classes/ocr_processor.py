@@ -6,17 +6,29 @@ class OCRProcessor:
     """
     A class to handle OCR (Optical Character Recognition) processing for detecting and validating license plates
     using PaddleOCR.
-    
+
+    Besides the single image OCR (`apply_ocr`), it can process several ROIs at once (`apply_ocr_batch`),
+    e.g. from consecutive frames or from several detections. In that mode, the text detection stage can
+    be skipped, because the license plate detector already gives a tight crop of the plate, and all the
+    ROIs are recognized in batches of `rec_batch_num` images.
+
     Attributes:
         ocr (PaddleOCR): An instance of PaddleOCR for text detection.
+        min_confidence (float): Minimum confidence of a recognized text to be taken into account.
     """
 
-    def __init__(self, min_confidence=0.9):
+    plate_pattern = re.compile(r'^(C?\d{4}[B-DF-HJ-NP-RSTV-Z]{3})$')
+
+    def __init__(self, min_confidence=0.9, rec_batch_num=8):
         """
         Initializes the OCRProcessorPaddle with English OCR model.
+
+        Args:
+            min_confidence (float): Minimum confidence of a recognized text.
+            rec_batch_num (int): Number of images recognized in each batch by PaddleOCR.
         """
         self.min_confidence = min_confidence
-        self.ocr = PaddleOCR(use_angle_cls=True, lang='en')  # Initialize with English model
+        self.ocr = PaddleOCR(use_angle_cls=True, lang='en', rec_batch_num=rec_batch_num)  # Initialize with English model
 
     def is_valid_plate(self, plate):
         """
@@ -30,8 +42,30 @@ class OCRProcessor:
         Returns:
             bool: True if the plate matches the format, False otherwise.
         """
-        pattern = re.compile(r'^(C?\d{4}[B-DF-HJ-NP-RSTV-Z]{3})$')
-        return pattern.match(plate) is not None
+        return self.plate_pattern.match(plate) is not None
+
+    def _plate_from_texts(self, recognized_texts):
+        """
+        Builds the license plate from the texts recognized in a ROI.
+
+        Args:
+            recognized_texts (list of tuple): (text, confidence) pairs, in reading order.
+
+        Returns:
+            str or None: The license plate string if valid, otherwise None.
+        """
+        text_candidates = []
+
+        for text, confidence in recognized_texts:
+            if confidence >= self.min_confidence:
+                text_candidates.append(text.strip().replace(" ", "").upper())
+
+        concatenated_plate = ''.join(text_candidates)
+
+        if self.is_valid_plate(concatenated_plate):
+            return concatenated_plate
+
+        return None
 
     def apply_ocr(self, roi):
         """
@@ -44,21 +78,41 @@ class OCRProcessor:
             str or None: The detected license plate string if valid, otherwise None.
         """
         result = self.ocr.ocr(roi, cls=True)
-        
-        text_candidates = []
 
         if not result[0]:
             return None
 
-        for line in result[0]:
-            text, confidence = line[1][0], line[1][1]
-            if confidence >= self.min_confidence:
-                text_candidates.append(text.strip().replace(" ", "").upper())
-        
+        return self._plate_from_texts(line[1] for line in result[0])
 
-        concatenated_plate = ''.join(text_candidates)
+    def apply_ocr_batch(self, rois, recognition_only=True):
+        """
+        Applies OCR to several ROIs and attempts to extract a valid license plate string from each one.
 
-        if self.is_valid_plate(concatenated_plate):
-            return concatenated_plate
+        Args:
+            rois (list of numpy.ndarray): Image regions to apply OCR on.
+            recognition_only (bool): If True, the text detection and angle classification stages are
+                                     skipped and the ROIs are recognized as a single text line in batched
+                                     calls. If False, `apply_ocr` is applied to every ROI.
 
-        return None
+        Returns:
+            list: The license plate string (or None if not valid) for every ROI, in the same order.
+        """
+        plates = [None] * len(rois)
+
+        # Empty crops (boxes on the border of the frame) can't be recognized
+        valid_indices = [i for i, roi in enumerate(rois) if roi is not None and roi.size > 0]
+
+        if not recognition_only:
+            for i in valid_indices:
+                plates[i] = self.apply_ocr(rois[i])
+            return plates
+
+        if not valid_indices:
+            return plates
+
+        result = self.ocr.ocr([rois[i] for i in valid_indices], det=False, cls=False)
+
+        for i, recognized in zip(valid_indices, result[0]):
+            plates[i] = self._plate_from_texts([recognized])
+
+        return plates
@@ -1,13 +1,28 @@
+import logging
+import threading
+import time
+
 from picamera2 import Picamera2
 
+from parking_system.other_util_classes.webcam_capture import FrameBuffer
+
 class Pi_WebcamCapture:
-    def __init__(self):
+    def __init__(self, buffer_size=2):
         """
         Initializes the WebcamCapture object and fetches camera modes.
+
+        Args:
+            buffer_size (int): Maximum number of captured frames waiting to be taken.
         """
         self.camera = Picamera2()
         self.camera_modes = self.camera.sensor_modes
         self.active = False
+        # Channel order of the captured frames
+        self.color_order = "BGR"
+
+        self.buffer = FrameBuffer(buffer_size)
+        self.capture_thread = None
+        self.logger = logging.getLogger(self.__class__.__name__)
 
     def show_available_configurations(self):
         """
@@ -33,12 +48,14 @@ class Pi_WebcamCapture:
                 print(f"  FPS: {fps}")
                 print(f"  Crop Limits: {crop_limits}")
 
-    def start(self, configuration_index=0):
+    def start(self, configuration_index=0, rgb_frames=False):
         """
         Starts the camera using the full configuration of the selected sensor mode.
 
         Args:
             configuration_index (int): Index of the sensor configuration from available options.
+            rgb_frames (bool): If True, frames are captured in RGB order, as the detector model expects,
+                               instead of the BGR order used by OpenCV.
 
         Raises:
             ValueError: If the configuration_index is out of range.
@@ -50,37 +67,86 @@ class Pi_WebcamCapture:
         resolution = selected_mode.get("size", (640, 480))
 
         # Creamos configuración personalizada basada en la resolución seleccionada
+        # Picamera2 names the formats by the order of the pixel word: "RGB888" arrays are BGR, "BGR888" are RGB
         configuration = self.camera.create_video_configuration(
-            main={"size": resolution, "format": "RGB888"}
+            main={"size": resolution, "format": "BGR888" if rgb_frames else "RGB888"}
         )
+        self.color_order = "RGB" if rgb_frames else "BGR"
 
         self.camera.configure(configuration)
         self.camera.start()
         self.active = True
 
+        self.capture_thread = threading.Thread(target=self._capture_frames, daemon=True)
+        self.capture_thread.start()
+
         print(f"\nCamera started with configuration {configuration_index}:")
         print(f"  Resolution: {resolution}")
         print(f"  FPS: {selected_mode.get('fps', 'N/A')}")
         print(f"  Crop Limits: {selected_mode.get('crop_limits', 'N/A')}")
 
+    def _capture_frames(self):
+        """
+        Captures frames continuously in a separate thread. `capture_array` blocks until the
+        camera delivers the next frame, so the thread runs at the camera frame rate.
+
+        If capturing fails, it is retried after 0.01 seconds, doubled on every consecutive error up
+        to 1 second, so a failing camera does not spin the thread.
+        """
+        retry_delay = 0.01
+        while self.active:
+            try:
+                self.buffer.put(self.camera.capture_array())
+                retry_delay = 0.01
+            except Exception:
+                if self.active:
+                    self.logger.exception("Error capturando frame de la cámara.")
+                    time.sleep(retry_delay)
+                    retry_delay = min(retry_delay * 2, 1.0)
+        self.buffer.close()
+
+    def get_next_frame(self, timeout=None):
+        """
+        Returns the next captured frame that has not been returned yet, blocking until it arrives.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait for a new frame.
+
+        Returns:
+            CapturedFrame or None: The frame with its sequence number and timestamp, or None if
+                                   the timeout expired.
+        """
+        if not self.active:
+            raise RuntimeError("Camera is not active.")
+        return self.buffer.get_next(timeout)
+
     def get_frame(self):
         """
-        Captures a single frame from the video stream.
+        Returns the most recent frame of the video stream.
 
         Returns:
-            np.ndarray: Captured frame as a NumPy array, or None on error.
+            np.ndarray: Captured frame as a NumPy array, or None if no frame has been captured.
         """
         if not self.active:
             raise RuntimeError("Camera is not active.")
-        frame = self.camera.capture_array()
-        return frame
+        captured = self.buffer.wait_latest(timeout=1.0)
+        return captured.frame if captured is not None else None
+
+    @property
+    def dropped_frames(self):
+        return self.buffer.dropped
+
+    def log_stats(self):
+        self.logger.info(f"Frames capturados={self.buffer.seq} descartados={self.buffer.dropped}")
 
     def release(self):
         """
         Releases the camera and stops capturing.
         """
         if self.active:
-            self.camera.stop()
             self.active = False
+            # The capture thread finishes after the frame it is waiting for
+            self.capture_thread.join(timeout=1.0)
+            self.camera.stop()
             print("Camera stopped.")
 
@@ -0,0 +1,278 @@
+import itertools
+import logging
+import threading
+import time
+from collections import Counter
+
+
+def box_iou(box_a, box_b):
+    """
+    Computes the intersection over union of two boxes.
+
+    Args:
+        box_a (tuple): (ymin, xmin, ymax, xmax) of the first box.
+        box_b (tuple): (ymin, xmin, ymax, xmax) of the second box.
+
+    Returns:
+        float: The IoU of the boxes, between 0 and 1.
+    """
+    inter_h = min(box_a[2], box_b[2]) - max(box_a[0], box_b[0])
+    inter_w = min(box_a[3], box_b[3]) - max(box_a[1], box_b[1])
+    if inter_h <= 0 or inter_w <= 0:
+        return 0.0
+
+    intersection = inter_h * inter_w
+    area_a = (box_a[2] - box_a[0]) * (box_a[3] - box_a[1])
+    area_b = (box_b[2] - box_b[0]) * (box_b[3] - box_b[1])
+    return intersection / float(area_a + area_b - intersection)
+
+
+class PlateTrack:
+    """
+    A license plate followed across frames, with the OCR readings obtained from it.
+
+    The readings are voted character by character: for every plate length, each position keeps
+    a count of the characters read in it. The consensus plate is made of the most voted character
+    of every position of the most read length.
+
+    Attributes:
+        track_id (int): Unique identifier of the track.
+        box (tuple): Last (ymin, xmin, ymax, xmax) box of the plate.
+        missed_frames (int): Consecutive frames in which the plate was not detected.
+        ocr_calls (int): Number of OCR readings requested for this track (valid or not).
+        votes (dict): List of character counters for every plate length.
+        confirmed_plate (str or None): The plate confirmed by the vote, if any.
+        sent (bool): True once the confirmed plate has been sent to the verifier.
+        created_at (float): Monotonic time when the track was created.
+    """
+
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = box
+        self.missed_frames = 0
+        self.ocr_calls = 0
+        self.votes = {}
+        self.confirmed_plate = None
+        self.sent = False
+        self.created_at = time.monotonic()
+
+    def add_reading(self, plate):
+        """
+        Adds an OCR reading to the vote.
+
+        Args:
+            plate (str or None): The plate read by OCR, or None if it could not be read.
+        """
+        self.ocr_calls += 1
+        if not plate:
+            return
+
+        positions = self.votes.setdefault(len(plate), [Counter() for _ in plate])
+        for counter, char in zip(positions, plate):
+            counter[char] += 1
+
+    def consensus(self):
+        """
+        Returns:
+            tuple: The consensus plate (or None if there are no valid readings), the number of
+                   readings it is based on, and its agreement: the lowest fraction of those
+                   readings that voted for the chosen character in any position.
+        """
+        if not self.votes:
+            return None, 0, 0.0
+
+        positions = max(self.votes.values(), key=lambda counters: sum(counters[0].values()))
+        readings = sum(positions[0].values())
+
+        chars = []
+        agreement = 1.0
+        for counter in positions:
+            char, count = counter.most_common(1)[0]
+            chars.append(char)
+            agreement = min(agreement, count / readings)
+
+        return ''.join(chars), readings, agreement
+
+    def reset_votes(self):
+        self.votes = {}
+        self.ocr_calls = 0
+
+
+class PlateTracker:
+    """
+    Associates the license plates detected in consecutive frames by IoU, so every vehicle is
+    followed as a single track, and decides from the OCR votes of each track when its plate can
+    be sent to the verifier. Once a track is confirmed, no more OCR is needed for it.
+
+    It is thread-safe: detection and OCR stages can use it from different threads.
+
+    Args:
+        iou_threshold (float): Minimum IoU between a detection and the box of a track to link them.
+        max_missed_frames (int): Frames a track can go undetected before it is removed.
+        min_votes (int): Minimum number of valid readings needed to confirm a plate.
+        min_agreement (float): Minimum agreement of the vote (see `PlateTrack.consensus`).
+        max_ocr_calls (int): OCR readings after which an unconfirmed track is considered failed and
+                             its votes are reset.
+        plate_validator (callable, optional): Function that checks if a consensus plate is valid.
+
+    Attributes:
+        tracks (dict): Active tracks by ID.
+        stats (dict): Number of tracks created, confirmed and failed, and OCR calls done.
+    """
+
+    def __init__(
+            self, iou_threshold=0.3, max_missed_frames=25,
+            min_votes=3, min_agreement=0.6, max_ocr_calls=12,
+            plate_validator=None
+        ):
+        self.iou_threshold = iou_threshold
+        self.max_missed_frames = max_missed_frames
+        self.min_votes = min_votes
+        self.min_agreement = min_agreement
+        self.max_ocr_calls = max_ocr_calls
+        self.plate_validator = plate_validator
+
+        self.tracks = {}
+        self.stats = {"tracks": 0, "confirmed": 0, "failed": 0, "ocr_calls": 0}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    def update(self, boxes):
+        """
+        Links the boxes detected in a frame to the active tracks, creating new tracks for the
+        unmatched boxes and removing the tracks that have not been seen for too long.
+
+        Args:
+            boxes (list of tuple): (ymin, xmin, ymax, xmax) boxes detected in the frame.
+
+        Returns:
+            list of PlateTrack: The track of every box, in the same order as `boxes`.
+        """
+        with self._lock:
+            # Greedy association, the pairs with highest IoU are linked first
+            pairs = sorted(
+                (
+                    (box_iou(track.box, box), track_id, box_index)
+                    for track_id, track in self.tracks.items()
+                    for box_index, box in enumerate(boxes)
+                ),
+                reverse=True
+            )
+
+            matched = [None] * len(boxes)
+            used_tracks = set()
+            for iou, track_id, box_index in pairs:
+                if iou < self.iou_threshold:
+                    break
+                if track_id in used_tracks or matched[box_index] is not None:
+                    continue
+                matched[box_index] = self.tracks[track_id]
+                used_tracks.add(track_id)
+
+            for box_index, box in enumerate(boxes):
+                track = matched[box_index]
+                if track is None:
+                    track = PlateTrack(next(self._ids), box)
+                    self.tracks[track.track_id] = track
+                    self.stats["tracks"] += 1
+                    matched[box_index] = track
+                    self.logger.debug(f"Nueva pista {track.track_id}: {box}")
+                else:
+                    track.box = box
+                    track.missed_frames = 0
+
+            for track_id, track in list(self.tracks.items()):
+                if track_id in used_tracks or track in matched:
+                    continue
+                track.missed_frames += 1
+                if track.missed_frames > self.max_missed_frames:
+                    del self.tracks[track_id]
+                    self.logger.debug(
+                        f"Pista {track_id} finalizada: matrícula={track.confirmed_plate}, "
+                        f"lecturas OCR={track.ocr_calls}"
+                    )
+
+            return matched
+
+    def has_tracks(self):
+        with self._lock:
+            return bool(self.tracks)
+
+    def needs_ocr(self, track):
+        """
+        Returns:
+            bool: True if the plate of the track has not been confirmed yet.
+        """
+        return track.confirmed_plate is None
+
+    def add_reading(self, track_id, plate):
+        """
+        Adds an OCR reading to the vote of a track.
+
+        Args:
+            track_id (int): ID of the track the reading belongs to.
+            plate (str or None): The plate read, or None if it could not be read.
+
+        Returns:
+            str: "confirmed" if this reading confirmed the plate of the track, "failed" if the track
+                 reached the maximum OCR readings without a confident vote (its votes are reset), or
+                 None otherwise (also if the track no longer exists or was already confirmed).
+        """
+        with self._lock:
+            track = self.tracks.get(track_id)
+            if track is None or track.confirmed_plate is not None:
+                return None
+
+            track.add_reading(plate)
+            self.stats["ocr_calls"] += 1
+
+            consensus, readings, agreement = track.consensus()
+            if (consensus and readings >= self.min_votes and agreement >= self.min_agreement
+                    and (self.plate_validator is None or self.plate_validator(consensus))):
+                track.confirmed_plate = consensus
+                self.stats["confirmed"] += 1
+                self.logger.info(
+                    f"Pista {track_id} confirmada: {consensus} "
+                    f"({readings} votos, acuerdo {agreement:.2f}, {track.ocr_calls} lecturas OCR)"
+                )
+                return "confirmed"
+
+            if track.ocr_calls >= self.max_ocr_calls:
+                self.stats["failed"] += 1
+                self.logger.info(f"Pista {track_id} sin lectura fiable tras {track.ocr_calls} lecturas OCR.")
+                track.reset_votes()
+                return "failed"
+
+            return None
+
+    def reopen(self, track_id):
+        """
+        Discards the confirmed plate of a track (e.g. because it could not be verified), so OCR
+        is applied to it again and its plate is voted from scratch.
+
+        Args:
+            track_id (int): ID of the track.
+        """
+        with self._lock:
+            track = self.tracks.get(track_id)
+            if track is not None:
+                track.confirmed_plate = None
+                track.sent = False
+                track.reset_votes()
+
+    def take_confirmed(self):
+        """
+        Returns the tracks whose plate has been confirmed but not sent yet, marking them as sent.
+
+        Returns:
+            list of PlateTrack: The confirmed tracks to send to the verifier.
+        """
+        with self._lock:
+            confirmed = [
+                track for track in self.tracks.values()
+                if track.confirmed_plate is not None and not track.sent
+            ]
+            for track in confirmed:
+                track.sent = True
+            return confirmed
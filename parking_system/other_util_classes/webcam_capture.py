@@ -1,51 +1,155 @@
 import cv2
+import logging
 import threading
 import time
+from collections import deque, namedtuple
+
+# A captured frame with its sequence number (starting at 1) and capture time (time.monotonic())
+CapturedFrame = namedtuple("CapturedFrame", ["frame", "seq", "timestamp"])
+
+
+class FrameBuffer:
+    """
+    Small ring buffer between a capture thread and its consumer.
+
+    The capture thread puts every frame it reads and the consumer blocks on a condition variable
+    until a frame it has not seen yet is available, so every frame is delivered once and no CPU is
+    spent polling or processing the same frame again. If the consumer is slower than the camera,
+    the oldest frames not taken yet are discarded and counted.
+
+    Args:
+        size (int): Maximum number of frames kept waiting for the consumer.
+
+    Attributes:
+        seq (int): Sequence number of the last captured frame.
+        dropped (int): Number of frames discarded before being taken by the consumer.
+        latest (CapturedFrame): The last captured frame, None until the first one.
+    """
+
+    def __init__(self, size=2):
+        self.frames = deque(maxlen=size)
+        self.condition = threading.Condition()
+        self.seq = 0
+        self.dropped = 0
+        self.latest = None
+        self.closed = False
+
+    def put(self, frame):
+        """
+        Adds a captured frame and wakes up the consumer.
+
+        Args:
+            frame (numpy.ndarray): The captured frame.
+        """
+        with self.condition:
+            self.seq += 1
+            captured = CapturedFrame(frame, self.seq, time.monotonic())
+            if len(self.frames) == self.frames.maxlen:
+                self.dropped += 1
+            self.frames.append(captured)
+            self.latest = captured
+            self.condition.notify_all()
+
+    def get_next(self, timeout=None):
+        """
+        Returns the oldest frame not delivered yet, waiting for a new one if there is none.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait. None waits until a frame arrives.
+
+        Returns:
+            CapturedFrame or None: The frame, or None if the timeout expired or the buffer was closed.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.frames or self.closed, timeout)
+            return self.frames.popleft() if self.frames else None
+
+    def wait_latest(self, timeout=None):
+        """
+        Returns the last captured frame, waiting for the first one if nothing has been captured yet.
+        It does not consume the frame.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait. None waits until a frame arrives.
+
+        Returns:
+            CapturedFrame or None: The frame, or None if nothing has been captured.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.latest is not None or self.closed, timeout)
+            return self.latest
+
+    def close(self):
+        """
+        Wakes up every waiting consumer, which will receive None from then on once the buffer is empty.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
 
 class WebcamCapture:
     """
-    A class for capturing video frames from a webcam with buffering to ensure
-    that frames are captured only when needed.
+    A class for capturing video frames from a webcam in a background thread. Frames are handed
+    to the consumer through a `FrameBuffer`, so `get_next_frame` returns each frame exactly once.
     """
 
-    def __init__(self, source=0):
+    def __init__(self, source=0, buffer_size=2):
         """
         Initializes the WebcamCapture with the specified video source.
 
         Args:
-            source (int or str): The video source index or path. The default value of 0 corresponds 
-                                 to the default system webcam. If a string is provided, it should 
+            source (int or str): The video source index or path. The default value of 0 corresponds
+                                 to the default system webcam. If a string is provided, it should
                                  be a path to a video file or stream URL.
+            buffer_size (int): Maximum number of captured frames waiting to be taken.
         """
         self.cap = cv2.VideoCapture(source)
         if not self.cap.isOpened():
             raise RuntimeError("Failed to open video source")
-        
-        # Buffer to store the most recent frame
-        self.frame = None
-        self.lock = threading.Lock()
+
+        # Channel order of the captured frames
+        self.color_order = "BGR"
+
+        self.buffer = FrameBuffer(buffer_size)
         self.running = True
+        self.logger = logging.getLogger(self.__class__.__name__)
 
         # Start the capture thread
-        self.capture_thread = threading.Thread(target=self._capture_frames)
+        self.capture_thread = threading.Thread(target=self._capture_frames, daemon=True)
         self.capture_thread.start()
 
     def _capture_frames(self):
         """
-        Captures frames from the webcam continuously in a separate thread to ensure
-        that the latest frame is always available for processing.
+        Captures frames from the webcam continuously in a separate thread. `read` blocks until
+        the camera delivers the next frame, so the thread runs at the camera frame rate.
         """
         while self.running:
             ret, frame = self.cap.read()
             if ret:
-                with self.lock:
-                    self.frame = frame
-            time.sleep(0.01)  # Adjust this sleep time to control capture rate
+                self.buffer.put(frame)
+            else:
+                # The source has no frame available (e.g. a stream reconnecting), avoid spinning
+                time.sleep(0.01)
+        self.buffer.close()
+
+    def get_next_frame(self, timeout=None):
+        """
+        Returns the next captured frame that has not been returned yet, blocking until it arrives.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait for a new frame.
+
+        Returns:
+            CapturedFrame or None: The frame with its sequence number and timestamp, or None if
+                                   the timeout expired.
+        """
+        return self.buffer.get_next(timeout)
 
     def get_frame(self, process_frame=None):
         """
-        Returns the most recent frame from the webcam. If a frame is being processed,
-        waits for the frame to be available.
+        Returns the most recent frame from the webcam. If no frame has been captured yet,
+        waits up to one second for the first one.
 
         Args:
             process_frame (function, optional): A function to process the captured frame (e.g., convert to grayscale).
@@ -53,17 +157,24 @@ class WebcamCapture:
         Returns:
             frame (numpy.ndarray): The captured (and optionally processed) frame from the webcam.
         """
-        with self.lock:
-            frame = self.frame
+        captured = self.buffer.wait_latest(timeout=1.0)
 
-        if frame is None:
+        if captured is None:
             raise RuntimeError("No frame captured yet")
 
+        frame = captured.frame
         if process_frame:
             frame = process_frame(frame)
 
         return frame
 
+    @property
+    def dropped_frames(self):
+        return self.buffer.dropped
+
+    def log_stats(self):
+        self.logger.info(f"Frames capturados={self.buffer.seq} descartados={self.buffer.dropped}")
+
     def release(self):
         """
         Releases the webcam resource and closes any OpenCV windows.
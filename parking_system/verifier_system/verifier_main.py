@@ -1,8 +1,11 @@
 import sys
 import os
 import json
+import logging
 import requests
+import threading
 import traceback
+from datetime import datetime, timezone
 
 # Add the project root directory to the sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
@@ -10,9 +13,111 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')
 from logging_module.logger_setup import setup_logger
 from parking_system.base_config import BaseConfig
 from parking_system.communication.amqp_msg import AMQP_Msg_Disp
+from parking_system.other_util_classes.decision_cache import DecisionCache
+from parking_system.other_util_classes.history_upload_queue import HistoryUploadQueue
+from parking_system.other_util_classes.micro_batcher import MicroBatcher
 
 
+logger = logging.getLogger(__name__)
+
 url = BaseConfig.API_URL
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# Created in main if BaseConfig.DECISION_CACHE_ENABLED
+decision_cache = None
+history_queue = None
+# Created in main if BaseConfig.VERIFY_BATCH_ENABLED
+verify_batcher = None
+
+# One HTTP session per handler thread: the connections to the backend are kept alive and reused
+session_local = threading.local()
+
+def get_session():
+    """
+    Returns the HTTP session of the current thread, created on first use.
+
+    Returns:
+        requests.Session: Session with the API key header and a keep-alive connection pool.
+    """
+    session = getattr(session_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.headers["API-KEY"] = BaseConfig.API_KEY
+        session_local.session = session
+    return session
+
+def fetch_allowlist(etag):
+    """
+    Pulls the allowed plates from the backend.
+
+    Args:
+        etag (str or None): ETag of the allowlist the verifier already has.
+
+    Returns:
+        tuple or None: The plates and the ETag of the allowlist, or None if it has not changed.
+    """
+    headers = {"If-None-Match": etag} if etag else {}
+    response = get_session().get(BaseConfig.ALLOWLIST_URL, headers=headers, timeout=BaseConfig.API_TIMEOUT)
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+    return response.json()["plates"], response.headers.get("ETag")
+
+def upload_history(events):
+    """
+    Uploads to the backend history the verifications answered without calling it.
+
+    Args:
+        events (list of dict): The verifications, with plate, date and allowed.
+    """
+    response = get_session().post(BaseConfig.HISTORY_UPLOAD_URL, json={"events": events}, timeout=BaseConfig.API_TIMEOUT)
+    response.raise_for_status()
+
+def send_verify_batch(verifications):
+    """
+    Verifies several plates with a single call to the backend.
+
+    Args:
+        verifications (list of dict): The messages received, with plate and date.
+
+    Returns:
+        list of dict: The result of every verification, in the same order.
+    """
+    response = get_session().post(BaseConfig.VERIFY_BATCH_URL, json={"verifications": verifications}, timeout=BaseConfig.API_TIMEOUT)
+    response.raise_for_status()
+    return response.json()["results"]
+
+def verify_with_backend(msg_json):
+    """
+    Verifies a plate with the backend, in a batch with the plates received at the same time by the
+    other handler threads if the micro-batching is enabled.
+
+    Returns:
+        dict: The response of the backend, with plate and allowed.
+
+    Raises:
+        requests.RequestException: If the backend could not be reached or answered with an error.
+    """
+    if verify_batcher is not None:
+        result = verify_batcher.submit(msg_json)
+        if "error" in result:
+            raise ValueError(f"Verificación rechazada por el backend: {result['error']}")
+        return result
+
+    response = get_session().post(url, json=msg_json, timeout=BaseConfig.API_TIMEOUT)
+    # Lanza excepción si el código de estado no indica éxito (2xx)
+    response.raise_for_status()
+    return response.json()
+
+def offline_decision(msg_json, error):
+    """
+    Answers from the allowlist when the backend does not answer, queuing the verification so it
+    is added to the history when the backend is back.
+    """
+    allowed = decision_cache.fallback(msg_json["plate"])
+    history_queue.add({"plate": msg_json["plate"], "date": msg_json["date"], "allowed": allowed})
+    logger.warning(f"Backend no disponible ({error}), matrícula {msg_json['plate']} verificada con la lista local: {allowed}")
+    return json.dumps({"plate": msg_json["plate"], "allowed": allowed, "offline": True})
 
 def verifier_msg_handler(message):
     """
@@ -22,6 +127,11 @@ def verifier_msg_handler(message):
     timestamp, verifies if the plate is allowed, and returns a JSON-formatted response 
     containing the original data along with the verification result.
 
+    With the decision cache enabled, a plate verified recently is answered without calling the
+    backend, and if the backend does not answer (connection error, timeout or 5xx) the plate is
+    checked against the local allowlist. In both cases the verification is queued to be uploaded
+    to the backend history.
+
     Args:
         message (bytes): The received message as a byte string in JSON format.
 
@@ -32,24 +142,58 @@ def verifier_msg_handler(message):
     msg_json = json.loads(message.decode("utf-8"))
     print(msg_json)
 
-    headers = {
-        "API-KEY": BaseConfig.API_KEY  # Asegúrate de definir esto en tu config
-    }
+    if decision_cache is not None:
+        msg_json.setdefault("date", datetime.now(timezone.utc).strftime(DATE_FORMAT))
+        allowed = decision_cache.get(msg_json["plate"])
+        if allowed is not None:
+            history_queue.add({"plate": msg_json["plate"], "date": msg_json["date"], "allowed": allowed})
+            return json.dumps({"plate": msg_json["plate"], "allowed": allowed})
 
-    response = requests.post(url, json=msg_json, headers=headers)
+    try:
+        result = verify_with_backend(msg_json)
+    except requests.RequestException as e:
+        # Without the decision cache, or if the backend rejected the request (4xx), the message fails
+        if decision_cache is None or (e.response is not None and e.response.status_code < 500):
+            raise
+        return offline_decision(msg_json, e)
 
-    # Lanza excepción si el código de estado no indica éxito (2xx)
-    if not response.ok:
-        raise Exception(f"API call failed with status code {response.status_code}: {response.text}")
+    if decision_cache is not None:
+        decision_cache.put(msg_json["plate"], result["allowed"])
 
-    return json.dumps(response.json())
+    return json.dumps(result)
 
 
 def main():
+    global decision_cache, history_queue, verify_batcher
 
+    verifier_msg_dispatcher = None
     try:
         setup_logger()
 
+        if BaseConfig.DECISION_CACHE_ENABLED:
+            decision_cache = DecisionCache(
+                positive_ttl=BaseConfig.DECISION_POSITIVE_TTL,
+                negative_ttl=BaseConfig.DECISION_NEGATIVE_TTL,
+                max_size=BaseConfig.DECISION_CACHE_MAX_SIZE,
+                snapshot_path=BaseConfig.ALLOWLIST_SNAPSHOT_PATH
+            )
+            decision_cache.start_sync(fetch_allowlist, BaseConfig.ALLOWLIST_SYNC_INTERVAL)
+
+            history_queue = HistoryUploadQueue(
+                spool_path=BaseConfig.HISTORY_UPLOAD_SPOOL,
+                upload=upload_history,
+                batch_size=BaseConfig.HISTORY_UPLOAD_BATCH_SIZE,
+                interval=BaseConfig.HISTORY_UPLOAD_INTERVAL
+            )
+            history_queue.start()
+
+        if BaseConfig.VERIFY_BATCH_ENABLED:
+            verify_batcher = MicroBatcher(
+                send_batch=send_verify_batch,
+                max_batch_size=BaseConfig.VERIFY_BATCH_MAX_SIZE,
+                max_delay=BaseConfig.VERIFY_BATCH_MAX_DELAY
+            )
+
         verifier_msg_dispatcher = AMQP_Msg_Disp(
             hostname=BaseConfig.AMQP_BROKER_URL,
             port=BaseConfig.AMQP_BROKER_PORT,
@@ -57,7 +201,15 @@ def main():
             receive_queue_name=BaseConfig.VERIFIER_QUEUE_NAME,
             msg_handler=verifier_msg_handler,
             reply_to_received_message=True,
-            stop_consuming_after_received_message=False
+            stop_consuming_after_received_message=False,
+            prefetch_count=BaseConfig.VERIFIER_PREFETCH,
+            handler_workers=BaseConfig.VERIFIER_WORKERS,
+            publisher_confirms=BaseConfig.AMQP_PUBLISHER_CONFIRMS,
+            publish_batch_size=BaseConfig.AMQP_PUBLISH_BATCH_SIZE,
+            publish_batch_interval=BaseConfig.AMQP_PUBLISH_BATCH_INTERVAL,
+            publish_buffer_size=BaseConfig.AMQP_PUBLISH_BUFFER_SIZE,
+            publish_timeout=BaseConfig.AMQP_PUBLISH_TIMEOUT,
+            persistent_queues=BaseConfig.AMQP_PERSISTENT_QUEUES
         )
         
         verifier_msg_dispatcher.wait_and_receive_msg()
@@ -71,7 +223,18 @@ def main():
 
     finally:
         # Release resources and close the application
-        verifier_msg_dispatcher.close()  # Close the RabbitMQ connection when finished
+        if verifier_msg_dispatcher is not None:
+            verifier_msg_dispatcher.close()  # Close the RabbitMQ connection when finished
+        if verify_batcher is not None:
+            verify_batcher.close()
+            verify_batcher.log_stats()
+        if decision_cache is not None:
+            decision_cache.stop()
+            decision_cache.log_stats()
+        if history_queue is not None:
+            # Last attempt to upload the queued verifications, the rest are kept in the spool
+            history_queue.stop()
+            history_queue.log_stats()
 
 if __name__ == "__main__":
     main()